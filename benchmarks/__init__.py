@@ -0,0 +1 @@
+from .fake import FakeChatModel, create_fake_tools
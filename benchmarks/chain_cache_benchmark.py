@@ -0,0 +1,90 @@
+'''
+链缓存微基准。
+使用桩 LLM 测量每轮对话中创建并调用意图分类链，对话链，反思分类链的开销，对比无缓存（每轮重建）与有缓存。
+运行：python -m benchmarks.chain_cache_benchmark
+'''
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.agent_api.core.graph.assist import assist
+from src.agent_api.core.graph.assist.assist import (
+    clear_chain_cache,
+    create_chat_chain,
+    create_intent_classifier_chain,
+    create_introspection_classifier_chain,
+)
+from src.agent_api.core.graph.type import IntentClassification, IntrospectionClassification
+
+TURNS = 2000
+
+
+def create_stub_llm():
+    '''创建桩 LLM。根据提示内容直接返回固定回复，不产生任何网络开销'''
+
+    def respond(prompt_value):
+        text = prompt_value.to_string()
+        if '"intent"' in text:
+            return AIMessage(f'{{"intent": "{IntentClassification.ReactGraphAdapterNode.value}"}}')
+        if '"introspection"' in text:
+            return AIMessage(f'{{"introspection": "{IntrospectionClassification.AddFinalResponseNode.value}"}}')
+        return AIMessage('你好！')
+
+    return RunnableLambda(respond)
+
+
+def clear_template_cache():
+    '''清空提示模板缓存，模拟缓存前每轮重建提示模板与输出解析'''
+    assist._create_chat_prompt_template.cache_clear()
+    assist._create_intent_classifier_prompt_template.cache_clear()
+    assist._create_introspection_classifier_prompt_template.cache_clear()
+
+
+async def run_turn(llm, messages):
+    '''运行一轮。依次创建并调用意图分类链，对话链，反思分类链'''
+    intent_chain = await create_intent_classifier_chain(llm)
+    await intent_chain.ainvoke({'messages': messages})
+    chat_chain = await create_chat_chain(llm)
+    response = await chat_chain.ainvoke(
+        {
+            'system_prompt': '你是助手',
+            'user_name': '用户',
+            'ai_name': '助手',
+            'chat_language': '中文',
+            'context_summary': '',  # 没有更早对话的摘要
+            'messages': messages,
+        }
+    )
+    introspection_chain = await create_introspection_classifier_chain(llm)
+    await introspection_chain.ainvoke({'messages': messages, 'response_draft': response})
+
+
+async def measure(is_cached):
+    '''测量。返回每轮平均耗时（毫秒）'''
+    llm = create_stub_llm()
+    messages = [HumanMessage('你好')]
+    clear_chain_cache()
+    clear_template_cache()
+    start = time.perf_counter()
+    for _ in range(TURNS):
+        if not is_cached:
+            clear_chain_cache()
+            clear_template_cache()
+        await run_turn(llm, messages)
+    return (time.perf_counter() - start) / TURNS * 1000
+
+
+async def main():
+    uncached = await measure(False)
+    cached = await measure(True)
+    print(f'每轮耗时（{TURNS} 轮，桩 LLM）')
+    print(f'  无缓存：{uncached:.3f} ms')
+    print(f'  有缓存：{cached:.3f} ms')
+    print(f'  节省：{uncached - cached:.3f} ms（{(1 - cached / uncached) * 100:.1f}%）')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import StructuredTool
+from pydantic import PrivateAttr
+
+from src.agent_api.core.graph.type import IntentClassification, IntrospectionClassification
+
+
+class FakeChatModel(BaseChatModel):
+    '''
+    脚本化的假 LLM。不访问任何模型服务，按配置模拟首 Token 延迟，Token 速率和工具调用模式。
+    意图分类和反思分类提示返回合法的 JSON，对话摘要提示返回固定摘要，对话提示按 tool_call_pattern 依次输出工具调用，最后输出回复。
+    '''
+
+    latency: float = 0.0  # 首 Token 延迟（秒）
+    tokens_per_second: float = 0.0  # Token 速率，0 表示不限速
+    response_tokens: int = 20  # 回复 Token 数
+    tool_call_pattern: list[list[str]] = []  # 工具调用模式，第 i 个元素为第 i 步 ReAct 同时调用的工具名
+    introspection_rejections: int = 0  # 每轮反思驳回草稿的次数
+    _introspection_counts: dict[tuple, int] = PrivateAttr(default_factory=dict)  # (会话, 用户消息 ID) -> 已反思次数
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat-model'
+
+    def bind_tools(self, tools, **kwargs):
+        '''绑定工具。工具调用由 tool_call_pattern 决定，直接返回自身'''
+        return self
+
+    def _script(self, messages: list[BaseMessage], run_manager=None) -> tuple[AIMessage, int]:
+        '''脚本。根据输入消息决定输出消息和输出 Token 数'''
+        text = '\n'.join(m.text() for m in messages)
+        if '"intent"' in text:
+            return AIMessage(json.dumps({'intent': IntentClassification.ReactGraphAdapterNode.value})), 8
+        if '滚动摘要' in text:
+            return AIMessage('summary'), 4
+        if '"introspection"' in text:
+            thread_id = run_manager.metadata.get('thread_id', '') if run_manager else ''
+            human_message_ids = re.findall(r"HumanMessage\(.*?id='([^']+)'\)", text)  # 反思提示中的消息为 repr
+            turn_key = (thread_id, human_message_ids[-1] if human_message_ids else '')  # 最新用户消息 ID，每轮不同
+            rejected = self._introspection_counts.get(turn_key, 0)
+            self._introspection_counts[turn_key] = rejected + 1
+            if rejected < self.introspection_rejections:
+                introspection = IntrospectionClassification.IntentClassifierEntryNode
+            else:
+                introspection = IntrospectionClassification.AddFinalResponseNode
+            return AIMessage(json.dumps({'introspection': introspection.value, 'critique': ''})), 12
+
+        step = 0  # 最新用户消息之后已完成的工具调用步数
+        for m in reversed(messages):
+            if isinstance(m, HumanMessage):
+                break
+            if isinstance(m, AIMessage) and m.tool_calls:
+                step += 1
+        if step < len(self.tool_call_pattern):
+            tool_calls = [
+                {'name': name, 'args': {'query': 'benchmark'}, 'id': f'call_{uuid.uuid4().hex[:12]}'}
+                for name in self.tool_call_pattern[step]
+            ]
+            return AIMessage('', tool_calls=tool_calls), 10 * len(tool_calls)
+        return AIMessage(' '.join(['token'] * self.response_tokens)), self.response_tokens
+
+    def _duration(self, tokens: int) -> float:
+        '''模拟耗时。首 Token 延迟 + 生成耗时'''
+        return self.latency + (tokens / self.tokens_per_second if self.tokens_per_second else 0.0)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, tokens = self._script(messages, run_manager)
+        time.sleep(self._duration(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, tokens = self._script(messages, run_manager)
+        await asyncio.sleep(self._duration(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        message, tokens = self._script(messages, run_manager)
+        await asyncio.sleep(self.latency)
+        if message.tool_calls:
+            tool_call_chunks = [
+                {'name': c['name'], 'args': json.dumps(c['args']), 'id': c['id'], 'index': i}
+                for i, c in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(message=AIMessageChunk(content='', tool_call_chunks=tool_call_chunks))
+            return
+
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        words = message.content.split(' ')
+        for i, word in enumerate(words):
+            if interval:
+                await asyncio.sleep(interval)
+            token = word if i == len(words) - 1 else word + ' '
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))  # 调用方负责触发 on_llm_new_token 回调
+
+
+def create_fake_tools(latency: float = 0.0, names=('get_current_time', 'search', 'calculator')) -> list:
+    '''创建假工具。每个工具等待 latency 秒后返回固定结果'''
+
+    def create_tool(name):
+        async def run(query: str = '') -> str:
+            await asyncio.sleep(latency)
+            return f'{name} result for {query}'
+
+        return StructuredTool.from_function(coroutine=run, name=name, description=f'假工具 {name}')
+
+    return [create_tool(name) for name in names]
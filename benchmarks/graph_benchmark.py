@@ -0,0 +1,211 @@
+'''
+图基准与压测。
+使用 create_main_graph_builder 构建真实的主图，以假 LLM 和假工具替代模型服务，测量：
+每轮延迟分位数，每个节点的耗时与框架开销，检查点写入耗时，N 个会话并发时的吞吐量。
+运行：python -m benchmarks.graph_benchmark --threads 8 --turns 5 --latency 0.05 --tool-pattern "search,calculator"
+'''
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+from src.agent_api.core import Config
+from src.agent_api.core.graph import create_main_graph_builder
+from src.agent_api.core.graph.node import chat_node
+from src.agent_api.core.metrics import (
+    InstrumentedAsyncSqliteSaver,
+    InstrumentedDeltaAsyncSqliteSaver,
+    InstrumentedInMemorySaver,
+    MetricsCallbackHandler,
+    MetricsRegistry,
+    percentile,
+)
+
+from .fake import FakeChatModel, create_fake_tools
+
+
+# ---------- 统计 ----------
+def format_distribution(values):
+    '''格式化分布，单位毫秒'''
+    if not values:
+        return '无数据'
+    ms = [v * 1000 for v in values]
+    return (
+        f'n={len(ms):<5} mean={sum(ms) / len(ms):8.2f}  p50={percentile(ms, 50):8.2f}  '
+        f'p90={percentile(ms, 90):8.2f}  p99={percentile(ms, 99):8.2f}  max={max(ms):8.2f}'
+    )
+
+
+# ---------- 运行 ----------
+async def run_turn(graph, thread_id, text, config, stream_mode, callbacks, is_new_chat=True):
+    '''运行一轮。输入与 Agent._run_turn 相同，只传入新消息，人设字段只在会话第一轮传入，返回本轮耗时'''
+    run_config = {'configurable': {'thread_id': thread_id}, 'callbacks': callbacks}
+    start = time.perf_counter()
+    persona_state = (
+        {key: config.state[key] for key in ('system_prompt', 'user_name', 'ai_name', 'chat_language')}
+        if is_new_chat
+        else {}
+    )
+    current_state = {
+        'messages': [HumanMessage(text)],
+        **persona_state,
+        'response_draft': None,
+        'turn_started_at': time.time(),
+        'introspection_count': 0,
+        'introspection': None,
+        'introspection_critique': None,
+        'introspection_budget_exhausted': False,
+    }
+    async for _ in graph.astream(current_state, run_config, stream_mode=stream_mode, subgraphs=True):
+        pass
+    return time.perf_counter() - start
+
+
+async def run_thread(graph, turns, config, stream_mode, callbacks):
+    '''运行一个会话。顺序运行多轮，返回每轮耗时'''
+    thread_id = str(uuid.uuid4())
+    return [
+        await run_turn(graph, thread_id, f'第 {i} 轮问题', config, stream_mode, callbacks, is_new_chat=i == 0)
+        for i in range(turns)
+    ]
+
+
+async def benchmark(args):
+    '''基准。构建图，并发运行会话，打印报告'''
+    config = Config()
+    llm = FakeChatModel(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        tool_call_pattern=[step.split(',') for step in args.tool_pattern.split(';') if step],
+        introspection_rejections=args.introspection_rejections,
+    )
+    tools = create_fake_tools(args.tool_latency)
+    graph_builder = await create_main_graph_builder(
+        chat_node,
+        llm.bind_tools(tools),
+        tools,
+        intent_confidence_threshold=config.intent_confidence_threshold,
+        max_introspection_count=args.max_introspection_count,
+        max_turn_seconds=config.max_turn_seconds,
+        is_reuse_draft=config.is_reuse_draft,
+        max_concurrent_tool_calls=args.max_concurrent_tool_calls,
+        tool_timeout_seconds=args.tool_timeout,
+        tool_turn_timeout_seconds=config.tool_turn_timeout_seconds,
+        context_token_budget=args.context_token_budget,
+        context_keep_tokens=args.context_token_budget // 2,
+        intent_context_token_budget=config.intent_context_token_budget,
+        introspection_context_token_budget=config.introspection_context_token_budget,
+        summary_llm=llm,
+    )
+    stream_mode = ['updates', 'messages'] if args.stream_tokens else ['updates']
+    metrics = MetricsRegistry(max_samples=args.threads * args.turns * 100)  # 保留全部样本，分位数精确
+    callbacks = [MetricsCallbackHandler(metrics)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'benchmark.db')
+        if args.checkpointer == 'sqlite':
+            saver_class = (
+                InstrumentedDeltaAsyncSqliteSaver if args.checkpoint_mode == 'delta' else InstrumentedAsyncSqliteSaver
+            )
+            async with saver_class.from_conn_string(db_path) as saver:
+                saver.metrics = metrics
+                graph = graph_builder.compile(checkpointer=saver)
+                wall, turn_durations = await run_threads(graph, args, config, stream_mode, callbacks)
+                db_size = sum(
+                    os.path.getsize(path) for path in (db_path, f'{db_path}-wal') if os.path.exists(path)
+                )  # 包括尚未合并到主文件的 WAL 日志
+        else:
+            saver = InstrumentedInMemorySaver(metrics=metrics)
+            graph = graph_builder.compile(checkpointer=saver)
+            wall, turn_durations = await run_threads(graph, args, config, stream_mode, callbacks)
+            db_size = None
+
+    snapshot = metrics.snapshot()
+    histograms = {}  # 指标名 -> [(标签值，样本)]
+    for h in snapshot['histograms']:
+        label = ','.join(str(v) for v in h['labels'].values())
+        histograms.setdefault(h['name'], []).append((label, metrics.samples(h['name'], **h['labels'])))
+
+    def print_histograms(title, name):
+        print(f'\n{title} (ms)')
+        for label, samples in histograms.get(name, []):
+            print(f'  {label or "-":<38}{format_distribution(samples)}')
+
+    total_turns = len(turn_durations)
+    print(
+        f'配置：{args.threads} 个并发会话 x {args.turns} 轮，首 Token 延迟 {args.latency}s，'
+        f'Token 速率 {args.tokens_per_second or "不限"}，工具模式 "{args.tool_pattern}"，检查点 {args.checkpointer}'
+        f'{f" ({args.checkpoint_mode})" if args.checkpointer == "sqlite" else ""}'
+    )
+    print(f'\n吞吐量：{total_turns / wall:.2f} 轮/秒（总耗时 {wall:.2f}s）')
+    print(f'\n每轮延迟 (ms)\n  {format_distribution(turn_durations)}')
+    print_histograms('节点耗时', 'agent_node_duration_seconds')
+    print_histograms('LLM 调用，按节点', 'agent_llm_duration_seconds')
+    print_histograms('LLM 首 Token 延迟，按节点', 'agent_llm_time_to_first_token_seconds')
+    print_histograms('工具调用', 'agent_tool_duration_seconds')
+    print_histograms('检查点写入', 'agent_checkpoint_write_duration_seconds')
+    if db_size is not None:
+        print(f'  数据库大小：{db_size / 1024:.1f} KiB')
+
+    model_time = sum(sum(samples) for _, samples in histograms.get('agent_llm_duration_seconds', [])) + sum(
+        metrics.samples('agent_node_duration_seconds', node='tool_node')
+    )  # 同一条 AIMessage 中的工具调用并发执行，按 tool_node 的耗时计，而不是逐个工具调用相加
+    overhead = sum(turn_durations) - model_time
+    print(
+        f'\n框架开销：每轮 {overhead / total_turns * 1000:.2f} ms'
+        f'（轮总耗时 {sum(turn_durations):.2f}s - LLM 与工具耗时 {model_time:.2f}s，并发时 LLM 与工具耗时会相互重叠）'
+    )
+    if args.metrics_dump_path:
+        metrics.dump(args.metrics_dump_path, 'json' if args.metrics_dump_path.endswith('.json') else 'prometheus')
+
+
+async def run_threads(graph, args, config, stream_mode, callbacks):
+    '''并发运行会话。返回总耗时和所有轮的耗时'''
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[run_thread(graph, args.turns, config, stream_mode, callbacks) for _ in range(args.threads)]
+    )
+    return time.perf_counter() - start, [d for durations in results for d in durations]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='图基准与压测')
+    parser.add_argument('--threads', type=int, default=1, help='并发会话数')
+    parser.add_argument('--turns', type=int, default=10, help='每个会话的轮数')
+    parser.add_argument('--latency', type=float, default=0.0, help='LLM 首 Token 延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='LLM Token 速率，0 表示不限速')
+    parser.add_argument('--response-tokens', type=int, default=20, help='回复 Token 数')
+    parser.add_argument(
+        '--tool-pattern',
+        default='',
+        help='工具调用模式，步骤之间用 ; 分隔，同一步的工具用 , 分隔，如 "search,calculator;get_current_time"',
+    )
+    parser.add_argument('--tool-latency', type=float, default=0.0, help='工具耗时（秒）')
+    parser.add_argument(
+        '--max-concurrent-tool-calls', type=int, default=4, help='同一条 AIMessage 中工具调用的最大并发数'
+    )
+    parser.add_argument('--tool-timeout', type=float, default=30.0, help='单次工具调用超时（秒）')
+    parser.add_argument(
+        '--context-token-budget', type=int, default=3000, help='chat_node 上下文 Token 预算，压缩后保留一半'
+    )
+    parser.add_argument('--introspection-rejections', type=int, default=0, help='每轮反思驳回草稿的次数')
+    parser.add_argument('--max-introspection-count', type=int, default=2, help='每轮最大反思次数')
+    parser.add_argument('--checkpointer', choices=['sqlite', 'memory'], default='sqlite', help='检查点保存器')
+    parser.add_argument('--checkpoint-mode', choices=['delta', 'snapshot'], default='delta', help='SQLite 检查点模式')
+    parser.add_argument(
+        '--metrics-dump-path', default=None, help='导出指标的文件路径，.json 结尾导出 JSON，否则导出 Prometheus 文本'
+    )
+    parser.add_argument(
+        '--stream-tokens', action='store_true', help='以 messages 模式流式运行，与 Agent 开启逐 Token 输出时相同'
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(benchmark(parse_args()))
@@ -1,16 +1,47 @@
+import argparse
 import sys
 
-from PySide6.QtWidgets import QApplication
-
-from src.agent_api.core import Config
-from src.agent_api.gui import MainWindow
+from src.agent_api.utils import StartupProfiler
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='智能体桌面客户端')
+    parser.add_argument('--profile-startup', action='store_true', help='输出每个模块的导入耗时和各启动阶段耗时')
+    args, qt_args = parser.parse_known_args()  # 其余参数交给 QApplication
+
+    profiler = None
+    if args.profile_startup:
+        profiler = StartupProfiler()
+        profiler.install()
+
+    from PySide6.QtCore import Qt, QTimer  # 在启动耗时分析器之后导入，才能记录导入耗时
+    from PySide6.QtWidgets import QApplication
+
+    from src.agent_api.core import Config
+    from src.agent_api.gui import MainWindow
+
+    if profiler:
+        profiler.mark('导入完成')
+
     config = Config()
 
-    app = (
-        QApplication()
+    app = QApplication(
+        sys.argv[:1] + qt_args
     )  # QApplication 图形应用的强制性控制核心，初始化底层资源，启动事件循环，驱动程序的响应，运行，退出
+    if profiler:
+        profiler.mark('QApplication 创建完成')
     main_window = MainWindow(config)
+    if profiler:
+        profiler.mark('MainWindow 创建完成')
     main_window.show()  # show() 将控件在屏幕上显示
+
+    if profiler:
+
+        def report():
+            profiler.mark('图准备完成')
+            profiler.uninstall()
+            profiler.report()
+
+        QTimer.singleShot(0, lambda: profiler.mark('窗口显示完成'))  # 事件循环开始处理事件时窗口已显示
+        main_window.mcp_host.graph_ready_signal.connect(report, type=Qt.ConnectionType.SingleShotConnection)
+
     sys.exit(app.exec())  # exit() 终止程序运行 exec() 启动并管理应用程序的事件循环
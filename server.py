@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+
+from src.agent_api.core import Config
+from src.agent_api.server import AgentServer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='无界面智能体服务器，WebSocket 地址为 ws://<host>:<port>/ws')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--platform', default='ollama', help='启动时激活的 LLM 平台')
+    parser.add_argument('--model', default='qwen2.5:3b', help='启动时激活的 LLM')
+    parser.add_argument('--db-path', default=None, help='SQLite 检查点与对话历史数据库路径')
+    args = parser.parse_args()
+
+    config = Config()
+    if args.db_path:
+        config.sqlite_db_path = args.db_path
+
+    try:
+        asyncio.run(AgentServer(config, args.host, args.port, args.platform, args.model).serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -1,2 +1,10 @@
-from .backend import Backend
 from .Config import Config
+
+
+def __getattr__(name):
+    '''模块属性延迟加载。Backend 依赖 PySide6，只在访问时导入，无界面运行时不需要安装 PySide6'''
+    if name == 'Backend':
+        from .backend import Backend
+
+        return Backend
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
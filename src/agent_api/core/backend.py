@@ -28,10 +28,15 @@ class Backend(QObject):
 
     ai_message_chunk_signal = Signal(str)  # AI Message Chunk 信号
     ai_message_chunk_finish_signal = Signal()  # AI Message Chunk 结束信号
-    graph_state_update_signal = Signal(str)  # 图状态更新信号
+    ai_message_chunk_reset_signal = Signal()  # AI Message Chunk 重置信号，已输出的草稿被驳回或为工具调用前的内容
+    graph_state_update_signal = Signal(object)  # 图状态更新信号，结构化的图状态事件，由面板显示时再格式化
+    metrics_update_signal = Signal(dict)  # 指标更新信号
 
-    load_chat_signal = Signal(list)  # 加载对话信号
-    update_chat_history_signal = Signal(list)  # 更新对话历史信号
+    load_chat_signal = Signal(list, int)  # 加载对话信号，(最后一页消息, 第一条的序号)
+    prepend_chat_signal = Signal(list, int)  # 加载更早对话信号，(上一页消息, 第一条的序号)
+    update_chat_history_signal = Signal(list, bool)  # 更新对话历史信号，(第一页, 是否还有更多)
+    append_chat_history_signal = Signal(list, bool)  # 追加对话历史信号，(下一页, 是否还有更多)
+    chat_history_item_changed_signal = Signal(dict)  # 对话历史条目变化信号，新建或更新的会话
 
     def __init__(self, config):
         super().__init__()
@@ -154,16 +159,24 @@ class Backend(QObject):
     # ---------- 运行 ----------
     @Slot(str)
     def user_message_input(self, input):
-        '''槽函数，User Message 输入。'''
+        '''槽函数，User Message 输入。绑定发送时的会话，其他会话的输出不会显示到当前会话'''
         if self._event_loop and self._event_loop.is_running():
+            thread_id = self._agent.current_thread_id
             callbacks = {
-                'ai_message_chunk_signal': self._create_signal_emit_callback(self.ai_message_chunk_signal),
+                'ai_message_chunk_signal': self._create_signal_emit_callback(self.ai_message_chunk_signal, thread_id),
                 'ai_message_chunk_finish_signal': self._create_signal_emit_callback(
-                    self.ai_message_chunk_finish_signal
+                    self.ai_message_chunk_finish_signal, thread_id
+                ),
+                'ai_message_chunk_reset_signal': self._create_signal_emit_callback(
+                    self.ai_message_chunk_reset_signal, thread_id
+                ),
+                'graph_state_update_signal': self._create_signal_emit_callback(
+                    self.graph_state_update_signal, thread_id
                 ),
-                'graph_state_update_signal': self._create_signal_emit_callback(self.graph_state_update_signal),
             }
-            asyncio.run_coroutine_threadsafe(self._agent.user_message_input(input, callbacks), self._event_loop)
+            asyncio.run_coroutine_threadsafe(
+                self._agent.user_message_input(input, callbacks, thread_id), self._event_loop
+            )
 
     # ---------- 对话历史 ----------
     @Slot()
@@ -171,7 +184,7 @@ class Backend(QObject):
         '''槽函数，新建对话。'''
         logger.debug('<new_chat> 新建对话')
         self._agent.current_thread_id = str(uuid.uuid4())
-        self.load_chat_signal.emit([])  # ！！！！！这里要弄懂
+        self.load_chat_signal.emit([], 0)  # ！！！！！这里要弄懂
 
     @Slot(str)
     def load_chat(self, thread_id):
@@ -180,6 +193,15 @@ class Backend(QObject):
         if self._event_loop and self._event_loop.is_running():
             asyncio.run_coroutine_threadsafe(self._agent.load_chat(thread_id), self._event_loop)
 
+    @Slot(int)
+    def load_older_chat_messages(self, before):
+        '''槽函数，加载当前对话中序号 before 之前的消息。'''
+        logger.debug('<load_older_chat_messages> 加载更早的对话消息')
+        if self._event_loop and self._event_loop.is_running():
+            asyncio.run_coroutine_threadsafe(
+                self._agent.load_older_chat_messages(self._agent.current_thread_id, before), self._event_loop
+            )
+
     @Slot()
     def update_chat_history(self):
         '''槽函数，更新对话历史列表。'''
@@ -187,12 +209,23 @@ class Backend(QObject):
         if self._event_loop and self._event_loop.is_running():
             asyncio.run_coroutine_threadsafe(self._agent.update_chat_history(), self._event_loop)
 
+    @Slot(str, str)
+    def load_more_chat_history(self, updated_at, thread_id):
+        '''槽函数，加载更多对话历史。从已加载的最后一条之后继续'''
+        logger.debug('<load_more_chat_history> 加载更多历史列表')
+        if self._event_loop and self._event_loop.is_running():
+            asyncio.run_coroutine_threadsafe(
+                self._agent.load_more_chat_history((updated_at, thread_id)), self._event_loop
+            )
+
     # ---------- 辅助 ----------
-    def _create_signal_emit_callback(self, signal: Signal):
-        '''创建信号发射回调。'''
+    def _create_signal_emit_callback(self, signal: Signal, thread_id=None):
+        '''创建信号发射回调。指定会话时，只有该会话为前端当前显示的会话才发射信号'''
 
         async def signal_emit(*args):
             '''信号发射。'''
+            if thread_id is not None and thread_id != self._agent.current_thread_id:
+                return
             event_loop = asyncio.get_running_loop()
             event_loop.call_soon_threadsafe(signal.emit, *args)
 
@@ -215,10 +248,26 @@ class Backend(QObject):
         '''输入未准备监听'''
         self.input_unready_signal.emit()
 
-    def load_chat_signal_monitor(self, chat_history: list):
+    def load_chat_signal_monitor(self, chat_history: list, start: int):
         '''加载对话监听'''
-        self.load_chat_signal.emit(chat_history)
+        self.load_chat_signal.emit(chat_history, start)
+
+    def prepend_chat_signal_monitor(self, chat_history: list, start: int):
+        '''加载更早对话监听'''
+        self.prepend_chat_signal.emit(chat_history, start)
 
-    def update_chat_history_list_signal_monitor(self, chat_history_list: list):
+    def metrics_update_signal_monitor(self, metrics_snapshot: dict):
+        '''指标更新监听'''
+        self.metrics_update_signal.emit(metrics_snapshot)
+
+    def update_chat_history_list_signal_monitor(self, chat_history_list: list, has_more: bool):
         '''跟新对话历史列表监听'''
-        self.update_chat_history_signal.emit(chat_history_list)
+        self.update_chat_history_signal.emit(chat_history_list, has_more)
+
+    def append_chat_history_list_signal_monitor(self, chat_history_list: list, has_more: bool):
+        '''追加对话历史列表监听'''
+        self.append_chat_history_signal.emit(chat_history_list, has_more)
+
+    def chat_history_item_changed_signal_monitor(self, chat_history_item: dict):
+        '''对话历史条目变化监听'''
+        self.chat_history_item_changed_signal.emit(chat_history_item)
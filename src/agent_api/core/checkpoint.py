@@ -0,0 +1,289 @@
+import json
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import get_checkpoint_metadata
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+
+class DeltaAsyncSqliteSaver(AsyncSqliteSaver):
+    '''增量异步 SQLite 文件检查点保存器。
+
+    AsyncSqliteSaver 每一步都把完整的 channel_values（包括整个 messages 列表）序列化进一行检查点，会话越长每步写入越多，总写入量随轮数平方增长。
+    本保存器的检查点行不再内联 channel_values：
+    - 普通通道按 (通道, 版本) 存入 checkpoint_blobs，只在通道版本变化时写入；
+    - messages 通道只存消息引用列表 [(消息 ID, 写入版本)]，每条消息按 (消息 ID, 写入版本) 存入 checkpoint_messages，只写入新增或被替换的消息；
+      引用列表只是在上一版本后追加时，只存追加部分和上一版本号，每 max_reference_chain 个版本存一次完整列表。
+    通道值，消息和检查点行在同一个事务中写入。
+    读取时按 channel_versions 还原 channel_values，只查询检查点引用的引用链和消息版本；旧格式（内联 channel_values）的检查点可直接读取，下次写入时补存。
+    '''
+
+    delta_channels = ('messages',)  # 按消息增量保存的通道
+    max_reference_chain = 32  # 追加式引用列表的最大链长，读取时最多回溯该数量的版本
+    max_cached_namespaces = 256  # 记录已保存状态的 (会话, 命名空间) 数，超出时淘汰最久未用的
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (thread_id, checkpoint_ns) -> (已保存的 {(通道, 版本)}, {消息 ID: (消息, 写入版本)}, {通道: (版本, 引用列表, 链长)})
+        self._persisted = OrderedDict()
+        self._is_delta_setup = False
+
+    async def setup(self) -> None:
+        '''初始化数据库。在检查点表之外创建通道值表和消息表'''
+        await super().setup()
+        if self._is_delta_setup:
+            return
+        async with self.lock:
+            if self._is_delta_setup:
+                return
+            async with self.conn.executescript(
+                '''
+                    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        channel TEXT NOT NULL,
+                        version TEXT NOT NULL,
+                        type TEXT NOT NULL,
+                        blob BLOB,
+                        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+                    );
+                    CREATE TABLE IF NOT EXISTS checkpoint_messages (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        message_id TEXT NOT NULL,
+                        version TEXT NOT NULL,
+                        type TEXT NOT NULL,
+                        blob BLOB,
+                        PRIMARY KEY (thread_id, checkpoint_ns, message_id, version)
+                    );
+                '''
+            ):
+                await self.conn.commit()
+            self._is_delta_setup = True
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        '''保存检查点。在同一个事务中写入变化的通道值，新增消息和不含 channel_values 的检查点行'''
+        await self.setup()
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        persisted_blobs, persisted_messages, persisted_references = self._get_persisted(thread_id, checkpoint_ns)
+        new_blobs, new_messages, new_references = set(), {}, {}  # 写入成功后再记录为已保存
+
+        channel_values = checkpoint['channel_values']
+        blob_rows, message_rows = [], []
+        for channel, version in checkpoint['channel_versions'].items():
+            version = str(version)
+            if (channel, version) in persisted_blobs:
+                continue  # 通道未变化且已保存
+            value = channel_values.get(channel)
+            if channel not in channel_values:
+                blob_rows.append((thread_id, checkpoint_ns, channel, version, 'empty', None))
+            elif channel in self.delta_channels and self._is_message_list(value):
+                references = []
+                for message in value:
+                    persisted = new_messages.get(message.id) or persisted_messages.get(message.id)
+                    if persisted is None or (persisted[0] is not message and persisted[0] != message):
+                        type_, blob = self.serde.dumps_typed(message)
+                        message_rows.append((thread_id, checkpoint_ns, message.id, version, type_, blob))
+                        persisted = (message, version)
+                        new_messages[message.id] = persisted
+                    references.append([message.id, persisted[1]])
+                base = persisted_references.get(channel)
+                if base and base[2] < self.max_reference_chain and references[: len(base[1])] == base[1]:
+                    type_, data = 'message_refs_delta', {'base': base[0], 'append': references[len(base[1]) :]}
+                    new_references[channel] = (version, references, base[2] + 1)
+                else:
+                    type_, data = 'message_refs', references
+                    new_references[channel] = (version, references, 0)
+                blob_rows.append((thread_id, checkpoint_ns, channel, version, type_, json.dumps(data).encode()))
+            else:
+                type_, blob = self.serde.dumps_typed(value)
+                blob_rows.append((thread_id, checkpoint_ns, channel, version, type_, blob))
+            new_blobs.add((channel, version))
+
+        type_, serialized_checkpoint = self.serde.dumps_typed({**checkpoint, 'channel_values': {}})
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+        async with self.lock:  # 其他协程共用同一个连接，持有锁直到提交，事务中不会混入其他写入
+            try:
+                if message_rows:
+                    await self.conn.executemany(
+                        'INSERT OR REPLACE INTO checkpoint_messages '
+                        '(thread_id, checkpoint_ns, message_id, version, type, blob) VALUES (?, ?, ?, ?, ?, ?)',
+                        message_rows,
+                    )
+                if blob_rows:
+                    await self.conn.executemany(
+                        'INSERT OR REPLACE INTO checkpoint_blobs '
+                        '(thread_id, checkpoint_ns, channel, version, type, blob) VALUES (?, ?, ?, ?, ?, ?)',
+                        blob_rows,
+                    )
+                await self.conn.execute(
+                    'INSERT OR REPLACE INTO checkpoints '
+                    '(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint['id'],
+                        config['configurable'].get('checkpoint_id'),
+                        type_,
+                        serialized_checkpoint,
+                        serialized_metadata,
+                    ),
+                )  # 与 super().aput() 写入的检查点行相同
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
+        persisted_blobs.update(new_blobs)
+        persisted_messages.update(new_messages)
+        persisted_references.update(new_references)
+        return {
+            'configurable': {
+                'thread_id': config['configurable']['thread_id'],
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+            }
+        }
+
+    async def aget_tuple(self, config):
+        '''读取检查点。按 channel_versions 还原 channel_values'''
+        checkpoint_tuple = await super().aget_tuple(config)
+        if checkpoint_tuple is not None:
+            await self._load_channel_values(checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        '''列出检查点。super().alist() 迭代期间持有锁，先取出全部检查点再还原 channel_values'''
+        checkpoint_tuples = [
+            checkpoint_tuple
+            async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit)
+        ]
+        for checkpoint_tuple in checkpoint_tuples:
+            await self._load_channel_values(checkpoint_tuple)
+            yield checkpoint_tuple
+
+    async def adelete_thread(self, thread_id):
+        '''删除会话的全部检查点，通道值和消息。'''
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute('DELETE FROM checkpoint_blobs WHERE thread_id = ?', (str(thread_id),))
+            await self.conn.execute('DELETE FROM checkpoint_messages WHERE thread_id = ?', (str(thread_id),))
+            await self.conn.commit()
+        for key in [key for key in self._persisted if key[0] == str(thread_id)]:
+            self._persisted.pop(key, None)
+
+    async def _load_channel_values(self, checkpoint_tuple):
+        '''还原 channel_values。只查询检查点行中缺失的通道，引用链上的引用列表和被引用的消息版本，旧格式检查点无需查询'''
+        checkpoint = checkpoint_tuple.checkpoint
+        channel_values = checkpoint['channel_values']
+        missing = {
+            channel: str(version)
+            for channel, version in checkpoint['channel_versions'].items()
+            if channel not in channel_values
+        }
+        if not missing:
+            return
+
+        thread_id = str(checkpoint_tuple.config['configurable']['thread_id'])
+        checkpoint_ns = checkpoint_tuple.config['configurable'].get('checkpoint_ns', '')
+        persisted_blobs, persisted_messages, persisted_references = self._get_persisted(thread_id, checkpoint_ns)
+        conditions = ' OR '.join(['(channel = ? AND version = ?)'] * len(missing))
+        parameters = [item for pair in missing.items() for item in pair]
+        async with self.lock:
+            async with self.conn.execute(
+                'SELECT channel, version, type, blob FROM checkpoint_blobs '
+                f'WHERE thread_id = ? AND checkpoint_ns = ? AND ({conditions})',
+                (thread_id, checkpoint_ns, *parameters),
+            ) as cursor:
+                blob_rows = await cursor.fetchall()
+
+            references = {}
+            for channel, version, type_, blob in blob_rows:
+                persisted_blobs.add((channel, version))
+                if type_ == 'message_refs':
+                    references[channel] = (version, json.loads(blob), 0)
+                elif type_ == 'message_refs_delta':
+                    async with self.conn.execute(
+                        '''
+                        WITH RECURSIVE chain (version, type, blob) AS (
+                            SELECT version, type, blob FROM checkpoint_blobs
+                            WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+                            UNION ALL
+                            SELECT b.version, b.type, b.blob FROM chain JOIN checkpoint_blobs AS b
+                            ON b.thread_id = ? AND b.checkpoint_ns = ? AND b.channel = ?
+                            AND b.version = json_extract(CAST(chain.blob AS TEXT), '$.base')
+                            WHERE chain.type = 'message_refs_delta'
+                        )
+                        SELECT version, type, blob FROM chain
+                        ''',
+                        (thread_id, checkpoint_ns, channel, version, thread_id, checkpoint_ns, channel),
+                    ) as cursor:  # 沿 base 回溯到完整列表，最多 max_reference_chain + 1 行
+                        reference_rows = {row[0]: (row[1], row[2]) async for row in cursor}
+                    references[channel] = (version, *self._resolve_references(reference_rows, version))
+                elif type_ != 'empty':
+                    channel_values[channel] = self.serde.loads_typed((type_, blob))
+
+            if references:
+                message_references = list(
+                    {
+                        tuple(reference)
+                        for _, channel_references, _ in references.values()
+                        for reference in channel_references
+                    }
+                )
+                async with self.conn.execute(
+                    '''
+                    SELECT m.message_id, m.version, m.type, m.blob
+                    FROM json_each(?) AS r CROSS JOIN checkpoint_messages AS m
+                    ON m.thread_id = ? AND m.checkpoint_ns = ?
+                    AND m.message_id = json_extract(r.value, '$[0]') AND m.version = json_extract(r.value, '$[1]')
+                    ''',
+                    (json.dumps(message_references), thread_id, checkpoint_ns),
+                ) as cursor:  # 只按主键读取被引用的 (消息 ID, 写入版本)，CROSS JOIN 固定引用列表为外层循环
+                    message_rows = {
+                        (message_id, version): (type_, blob) async for message_id, version, type_, blob in cursor
+                    }
+
+        for channel, (reference_version, channel_references, chain) in references.items():
+            messages = []
+            for message_id, version in channel_references:
+                message = self.serde.loads_typed(message_rows[(message_id, version)])
+                persisted_messages[message_id] = (message, version)  # 图继续运行时复用这些对象，不重复写入
+                messages.append(message)
+            channel_values[channel] = messages
+            persisted_references[channel] = (reference_version, channel_references, chain)
+
+    @staticmethod
+    def _resolve_references(reference_rows, version):
+        '''还原追加式引用列表。从指定版本回溯到完整列表，再依次追加，返回 (引用列表, 链长)'''
+        appends = []
+        while True:
+            type_, blob = reference_rows[version]
+            data = json.loads(blob)
+            if type_ == 'message_refs':
+                references = data
+                break
+            appends.append(data['append'])
+            version = data['base']
+        for append in reversed(appends):
+            references += append
+        return references, len(appends)
+
+    def _get_persisted(self, thread_id, checkpoint_ns):
+        '''获取 (会话, 命名空间) 的已保存状态。'''
+        key = (thread_id, checkpoint_ns)
+        persisted = self._persisted.get(key)
+        if persisted is None:
+            persisted = (set(), {}, {})
+            self._persisted[key] = persisted
+            while len(self._persisted) > self.max_cached_namespaces:
+                self._persisted.popitem(last=False)
+        else:
+            self._persisted.move_to_end(key)
+        return persisted
+
+    @staticmethod
+    def _is_message_list(value):
+        '''判断是否为带 ID 的消息列表。没有 ID 的消息无法按消息增量保存'''
+        return isinstance(value, list) and all(isinstance(m, BaseMessage) and m.id for m in value)
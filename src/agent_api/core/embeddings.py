@@ -0,0 +1,98 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_embedding_text(text):
+    '''规范化嵌入文本。合并空白，去掉首尾空白，统一大小写，只有空白或大小写不同的查询共用缓存'''
+    return ' '.join(text.split()).casefold()
+
+
+class CachedEmbeddings(Embeddings):
+    '''嵌入缓存。最近最少使用的先淘汰
+
+    - 查询按规范化文本缓存：记忆检索每轮都用最新的用户消息查询，重复或相近的查询不再调用嵌入模型；
+    - 文档按内容哈希缓存，不保存原文：反思更新记忆时未变化的字段不再嵌入，同一批中相同的文本只嵌入一次，
+      未命中的文本每 batch_size 条一次调用嵌入模型
+    '''
+
+    def __init__(self, embeddings: Embeddings, max_size=1024, batch_size=32, metrics=None):
+        self.embeddings = embeddings
+        self._max_size = max_size  # 缓存的查询和文档数，为 0 时不缓存
+        self._batch_size = batch_size  # 每次调用嵌入模型的最多文档数
+        self._metrics = metrics
+        self._cache = OrderedDict()  # 规范化查询文本或 ('document', 内容哈希) -> 向量
+        self._lock = threading.Lock()  # 事件循环和反思工作线程都会查询
+
+    def embed_documents(self, texts):
+        vectors, missing = self._get_documents(texts)
+        for start in range(0, len(missing), self._batch_size):
+            batch = missing[start : start + self._batch_size]
+            vectors.update(zip(batch, self.embeddings.embed_documents(batch)))
+        self._put_documents(missing, vectors)
+        return [vectors[text] for text in texts]
+
+    async def aembed_documents(self, texts):
+        vectors, missing = self._get_documents(texts)
+        for start in range(0, len(missing), self._batch_size):
+            batch = missing[start : start + self._batch_size]
+            vectors.update(zip(batch, await self.embeddings.aembed_documents(batch)))
+        self._put_documents(missing, vectors)
+        return [vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        key = normalize_embedding_text(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)  # 规范化文本只作为缓存键，嵌入原文
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        key = normalize_embedding_text(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)  # 规范化文本只作为缓存键，嵌入原文
+            self._put(key, vector)
+        return vector
+
+    def _get_documents(self, texts):
+        '''查找文档嵌入。返回 ({文本: 向量}, 去重后未命中的文本)'''
+        vectors, missing = {}, []
+        for text in dict.fromkeys(texts):
+            vector = self._get(self._document_key(text), kind='document')
+            if vector is None:
+                missing.append(text)
+            else:
+                vectors[text] = vector
+        return vectors, missing
+
+    def _put_documents(self, texts, vectors):
+        for text in texts:
+            self._put(self._document_key(text), vectors[text])
+
+    @staticmethod
+    def _document_key(text):
+        return ('document', hashlib.sha256(text.encode()).hexdigest())
+
+    def _get(self, key, kind='query'):
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+        if self._metrics is not None:
+            self._metrics.increment(
+                'agent_embedding_cache_requests_total', kind=kind, result='miss' if vector is None else 'hit'
+            )
+        return vector
+
+    def _put(self, key, vector):
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
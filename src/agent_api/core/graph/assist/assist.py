@@ -1,18 +1,179 @@
+import math
 import os
+from functools import cache, wraps
 
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, get_buffer_string, trim_messages
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
-from langchain_core.prompts import ChatMessagePromptTemplate, ChatPromptTemplate
+from langchain_core.prompts import ChatMessagePromptTemplate, ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.base import RunnableSequence
-from langchain_deepseek import ChatDeepSeek
-from langchain_ollama import ChatOllama
 
 from ..type import Intent, IntentClassification, Introspection, IntrospectionClassification
 
+# ---------- 链缓存相关 ----------
+_chain_cache: dict[tuple[str, int], tuple[BaseChatModel, RunnableSequence]] = {}  # (链名, LLM 标识) -> (LLM, 链)
+
+
+def cache_chain_by_llm(create_chain):
+    '''装饰器，按 LLM 缓存链。同一个 LLM 只创建一次链，LLM 切换时通过 clear_chain_cache() 失效'''
+
+    @wraps(create_chain)  # wraps() 保留被装饰函数的名字，文档等元信息
+    async def wrapper(llm: BaseChatModel) -> RunnableSequence:
+        key = (create_chain.__name__, id(llm))  # 缓存中持有 LLM 的强引用，保证 id() 在失效前不会被复用
+        cached = _chain_cache.get(key)
+        if cached is None:
+            cached = (llm, await create_chain(llm))
+            _chain_cache[key] = cached
+        return cached[1]
+
+    return wrapper
+
+
+def clear_chain_cache() -> None:
+    '''清空链缓存。在 LLM 或工具绑定变化时调用'''
+    _chain_cache.clear()
+
+
+# ---------- 通用相关 ----------
+@cache  # cache() 缓存无参函数的返回值，提示模板与 LLM 无关，只需创建一次
+def _create_chat_prompt_template() -> ChatPromptTemplate:
+    '''辅助，创建对话提示模板。'''
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                'system',
+                '{system_prompt}\n用户的名字叫：{user_name}，你的名字叫：{ai_name}\n请使用{chat_language}进行对话！{context_summary}',
+            ),
+            MessagesPlaceholder(variable_name='messages'),
+        ]
+    )  # 对话提示模板
+
+
+@cache_chain_by_llm
+async def create_chat_chain(llm: BaseChatModel) -> RunnableSequence:
+    '''辅助，创建对话链。传入 LLM，整合对话提示模板为链并返回'''
+    return _create_chat_prompt_template() | llm
+
+
+# ---------- 上下文相关 ----------
+def _is_cjk(char: str) -> bool:
+    '''辅助，判断是否为中日韩字符。'''
+    return '\u2e80' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uf900' <= char <= '\ufaff'
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    '''辅助，估算消息 Token 数。中日韩字符按每字 1 个 Token，其余字符按每 4 个字符 1 个 Token，每条消息另加 4 个 Token 的格式开销，无需加载分词器'''
+    tokens = 0
+    for message in messages:
+        text = message.text()
+        if getattr(message, 'tool_calls', None):
+            text += str(message.tool_calls)
+        cjk = sum(1 for char in text if _is_cjk(char))
+        tokens += cjk + math.ceil((len(text) - cjk) / 4) + 4
+    return tokens
+
+
+def select_recent_messages(messages: list[BaseMessage], max_tokens: int | None) -> list[BaseMessage]:
+    '''辅助，选择最近消息窗口。从后往前保留不超过 max_tokens 的消息，窗口从 HumanMessage 开始；最新一条 HumanMessage 之后的消息超出预算时仍全部保留'''
+    if not max_tokens or estimate_tokens(messages) <= max_tokens:
+        return list(messages)
+    window = trim_messages(
+        messages, max_tokens=max_tokens, token_counter=estimate_tokens, strategy='last', start_on='human'
+    )
+    if window:
+        return window
+    latest_human_index = next(
+        (i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), 0
+    )
+    return list(messages[latest_human_index:])
+
+
+def find_compaction_boundary(messages: list[BaseMessage], start: int, keep_tokens: int) -> int:
+    '''辅助，寻找压缩边界。返回索引 i，messages[start:i] 折叠进摘要，messages[i:] 不超过 keep_tokens 且从 HumanMessage 开始，最新一条 HumanMessage 始终保留'''
+    boundary = len(messages)
+    tokens = 0
+    for i in range(len(messages) - 1, start - 1, -1):
+        tokens += estimate_tokens([messages[i]])
+        if tokens > keep_tokens:
+            break
+        if isinstance(messages[i], HumanMessage):
+            boundary = i
+    if boundary == len(messages):  # 最新一轮本身超出预算，只保留最新一条 HumanMessage 之后的消息
+        boundary = next(
+            (i for i in range(len(messages) - 1, start - 1, -1) if isinstance(messages[i], HumanMessage)), start
+        )
+    return boundary
+
+
+def format_context_summary(summary: str) -> str:
+    '''辅助，格式化上下文摘要。摘要为空时返回空字符串，否则返回附加到系统提示词中的摘要段落'''
+    return f'\n以下是更早对话的摘要：<<<{summary}>>>' if summary else ''
+
+
+@cache
+def _create_summary_prompt_template() -> ChatPromptTemplate:
+    '''辅助，创建对话摘要提示模板。'''
+    message_prompt_template = ChatMessagePromptTemplate.from_template(
+        '''
+            你负责维护一段长对话的滚动摘要。请将新消息合并进已有摘要，输出更新后的完整对话摘要。
+            保留用户的身份，偏好，提到的事实，做出的决定，未完成的任务和工具调用得到的关键结果；省略寒暄和重复内容。
+            只输出摘要正文，不超过 300 字。
+            已有摘要：<<<{summary}>>>
+            新消息：<<<{messages}>>>
+        ''',
+        role='system',
+    )
+    return ChatPromptTemplate.from_messages([message_prompt_template])
+
+
+@cache_chain_by_llm
+async def create_summary_chain(llm: BaseChatModel) -> RunnableSequence:
+    '''辅助，创建对话摘要链。传入 LLM，填充已有摘要和待折叠的消息，输出更新后的摘要文本'''
+    return _create_summary_prompt_template() | llm | StrOutputParser()
+
+
+def format_messages_for_summary(messages: list[BaseMessage]) -> str:
+    '''辅助，将消息格式化为摘要输入文本。'''
+    return get_buffer_string(messages, human_prefix='User', ai_prefix='AI')
+
 
 # ---------- 主图相关 ----------
-async def create_intent_classifier_chain(llm: BaseChatModel) -> RunnableSequence:
-    '''辅助，创建意图分类器链，创建意图路由器链。传入 LLM，创建 Pydantic 输出解析和对话提示模板，引导 LLM 进行意图分类，整合为链并返回'''
+def _char_bigrams(text: str) -> set[str]:
+    '''辅助，提取字符二元组。对中文无需分词，去除空白并转为小写'''
+    text = ''.join(text.lower().split())
+    return {text[i : i + 2] for i in range(len(text) - 1)} or ({text} if text else set())
+
+
+def classify_intent_by_exemplars(
+    text: str, exemplars: dict[IntentClassification, list[str]]
+) -> tuple[IntentClassification | None, float]:
+    '''辅助，本地意图分类器。计算文本与各意图范例的字符二元组余弦相似度，返回最相似的意图和置信度（与次优意图的相似度差）'''
+    text_bigrams = _char_bigrams(text)
+    if not text_bigrams:
+        return None, 0.0
+
+    scores = []
+    for intent, intent_exemplars in exemplars.items():
+        best_score = 0.0
+        for exemplar in intent_exemplars:
+            exemplar_bigrams = _char_bigrams(exemplar)
+            if exemplar_bigrams:
+                score = len(text_bigrams & exemplar_bigrams) / math.sqrt(len(text_bigrams) * len(exemplar_bigrams))
+                best_score = max(best_score, score)
+        scores.append((best_score, intent))
+    if not scores:
+        return None, 0.0
+
+    scores.sort(key=lambda s: s[0], reverse=True)
+    best_score, best_intent = scores[0]
+    second_score = scores[1][0] if len(scores) > 1 else 0.0
+    return best_intent, best_score - second_score
+
+
+@cache
+def _create_intent_classifier_prompt_template() -> tuple[ChatPromptTemplate, PydanticOutputParser]:
+    '''辅助，创建意图分类器提示模板和 Pydantic 输出解析。'''
     parser = PydanticOutputParser(
         pydantic_object=Intent
     )  # PydanticOutputParser() 将 LLM 的非结构化输出解析为结构化的 Pydantic 对象
@@ -28,18 +189,25 @@ async def create_intent_classifier_chain(llm: BaseChatModel) -> RunnableSequence
         },
         role='system',
     )  # get_format_instructions() 生成系统提示词，指导 LLM 按照指定的 Pydantic 对象输出 JSON 数据
-    prompt_template = ChatPromptTemplate.from_messages([message_prompt_template])
+    return ChatPromptTemplate.from_messages([message_prompt_template]), parser
+
+
+@cache_chain_by_llm
+async def create_intent_classifier_chain(llm: BaseChatModel) -> RunnableSequence:
+    '''辅助，创建意图分类器链，创建意图路由器链。传入 LLM，创建 Pydantic 输出解析和对话提示模板，引导 LLM 进行意图分类，整合为链并返回'''
+    prompt_template, parser = _create_intent_classifier_prompt_template()
     return prompt_template | llm | parser
 
 
-async def create_introspection_classifier_chain(llm: BaseChatModel) -> RunnableSequence:
-    '''辅助，创建反思分类器链，创建反思路由器链。传入 LLM，创建 Pydantic 输出解析和对话提示模板，引导 LLM 进行反思分类，整合为链并返回'''
+@cache
+def _create_introspection_classifier_prompt_template() -> tuple[ChatPromptTemplate, PydanticOutputParser]:
+    '''辅助，创建反思分类器提示模板和 Pydantic 输出解析。'''
     parser = PydanticOutputParser(pydantic_object=Introspection)
     message_prompt_template = ChatMessagePromptTemplate.from_template(
         '''
             阅读最新的几条消息，分析用户的意图和要求，结合回复内容，请判断回复内容是否能满足用户的意图和要求，根据情况返回以下选项之一：<<<{introspection_classification}>>>
             如果回复内容能满足用户的意图和要求，请返回<<<{IntrospectionClassification_AddFinalResponseNode}>>>;
-            如果回复内容能不能满足用户的意图和要求，请返回<<<{IntrospectionClassification_IntentClassifierEntryNode}>>>;
+            如果回复内容能不能满足用户的意图和要求，请返回<<<{IntrospectionClassification_IntentClassifierEntryNode}>>>，并在 critique 中说明不足之处与改进建议;
             {format_instruction}
             消息：<<<{messages}>>>
             回复内容：<<<{response_draft}>>>
@@ -52,13 +220,38 @@ async def create_introspection_classifier_chain(llm: BaseChatModel) -> RunnableS
         },
         role='system',
     )
-    prompt_template = ChatPromptTemplate.from_messages([message_prompt_template])
+    return ChatPromptTemplate.from_messages([message_prompt_template]), parser
+
+
+@cache_chain_by_llm
+async def create_introspection_classifier_chain(llm: BaseChatModel) -> RunnableSequence:
+    '''辅助，创建反思分类器链，创建反思路由器链。传入 LLM，创建 Pydantic 输出解析和对话提示模板，引导 LLM 进行反思分类，整合为链并返回'''
+    prompt_template, parser = _create_introspection_classifier_prompt_template()
     return prompt_template | llm | parser
 
 
+# ---------- 记忆相关 ----------
+def format_episode_memories(items) -> str:
+    '''辅助，格式化情景记忆。检索结果为空时返回空字符串，否则返回附加到系统提示词中的情景记忆段落'''
+    episodes = []
+    for item in items:
+        content = item.value.get('content')
+        if not isinstance(content, dict):  # 不是情景记忆记录
+            continue
+        episodes.append(
+            f'经历 {len(episodes) + 1}：\n情景：{content.get("observation", "")}\n思考：{content.get("thought", "")}'
+            f'\n行动：{content.get("action", "")}\n结果：{content.get("result", "")}'
+        )
+    if not episodes:
+        return ''
+    return '\n以下是与当前对话相似的过往经历，可作为参考：<<<\n' + '\n'.join(episodes) + '\n>>>'
+
+
 # ---------- LLM 相关 ----------
 async def connect_ollama_llm(model, base_url, temperature, num_predict):
     '''连接 Ollama 平台的 LLM'''
+    from langchain_ollama import ChatOllama  # 平台 SDK 只在连接时导入，未使用的平台不导入
+
     params = {'model': model}
     params['base_url'] = base_url if base_url else r'http://localhost:11434'
     if temperature:
@@ -71,6 +264,8 @@ async def connect_ollama_llm(model, base_url, temperature, num_predict):
 
 async def connect_deepseek_llm(model, api_key, temperature, max_tokens):
     '''连接 DeepSeek 平台的 LLM'''
+    from langchain_deepseek import ChatDeepSeek
+
     params = {'model': model}
     params['api_key'] = api_key if api_key else os.getenv('DEEPSEEK_API_KEY')
     if temperature:
@@ -1,145 +1,743 @@
+import asyncio
 import json
+import logging
 import time
-import typing
 import uuid
-from concurrent.futures import Future
-from typing import Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
 
 from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import var_child_runnable_config
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.constants import CONFIG_KEY_STORE
 from langgraph.store.base import BaseStore
-from langgraph.store.postgres import PostgresStore
-from langmem.reflection import LocalReflectionExecutor
-from psycopg import Connection
-from psycopg_pool import ConnectionPool
+
+from ...local_memory_store import LocalVectorStore
+
+if TYPE_CHECKING:  # 只有 postgres 记忆仓库需要 psycopg，本地记忆仓库不导入
+    from psycopg_pool import AsyncConnectionPool
+
+    from ...memory_store import EventLoopBoundStore
+
+logger = logging.getLogger(__name__)  # 根日志记录器由 agent 模块配置
 
 PENDING_REFLECTION_TASKS_NAMESPACE = 'pending_reflection_tasks'
-SENTINEL = object()
+
+
+def _is_event_loop_bound_store(store: BaseStore) -> bool:
+    '''辅助，是否为绑定记忆仓库事件循环的 postgres 记忆仓库。未安装 psycopg 时不可能是，返回 False'''
+    try:
+        from ...memory_store import EventLoopBoundStore
+    except ImportError:
+        return False
+    return isinstance(store, EventLoopBoundStore)
+
+
+class PostgresReflectionQueue:
+    '''待办反思任务队列，postgres 表。每个 (用户, 会话) 一行，execute_at 建索引
+
+    - 入队：批量 upsert，同一会话重复提交时覆盖任务并清除认领；未认领的任务合并，执行时间推迟但不晚于第一次提交时的截止时间 deadline；
+    - 认领：SELECT ... FOR UPDATE SKIP LOCKED 取到期任务，同时把 execute_at 推迟一个可见性超时并写入认领令牌，
+      多个进程并发认领不会取到同一行，认领后崩溃的任务超时后重新可见；
+    - 确认：按 (键, 认领令牌) 批量删除，运行期间被重新提交的任务令牌已清除，不会被误删
+    '''
+
+    def __init__(self, store: 'EventLoopBoundStore'):
+        self.store = store
+
+    @staticmethod
+    async def setup(connection_pool: 'AsyncConnectionPool') -> None:
+        '''创建队列表。旧版本的 (key, value) 表原地迁移，execute_at 从 value 中回填'''
+        async with connection_pool.connection() as conn:
+            await conn.execute(
+                f'''
+                CREATE TABLE IF NOT EXISTS {PENDING_REFLECTION_TASKS_NAMESPACE} (
+                    key TEXT PRIMARY KEY,
+                    value JSONB NOT NULL
+                )
+                '''
+            )
+            await conn.execute(
+                f'''
+                ALTER TABLE {PENDING_REFLECTION_TASKS_NAMESPACE}
+                    ADD COLUMN IF NOT EXISTS execute_at DOUBLE PRECISION,
+                    ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+                    ADD COLUMN IF NOT EXISTS claim_token TEXT,
+                    ADD COLUMN IF NOT EXISTS deadline DOUBLE PRECISION
+                '''
+            )
+            await conn.execute(
+                f'''
+                UPDATE {PENDING_REFLECTION_TASKS_NAMESPACE}
+                SET execute_at = COALESCE((value->>'execute_at')::DOUBLE PRECISION, 0)
+                WHERE execute_at IS NULL
+                '''
+            )
+            await conn.execute(
+                f'''
+                CREATE INDEX IF NOT EXISTS {PENDING_REFLECTION_TASKS_NAMESPACE}_execute_at_idx
+                ON {PENDING_REFLECTION_TASKS_NAMESPACE} (execute_at)
+                '''
+            )
+
+    async def enqueue(self, tasks: list[tuple[str, dict, float, float]]) -> None:
+        '''批量入队。tasks 为 [(键, 任务, 执行时间戳, 截止时间戳)]，已有未认领任务时执行时间和截止时间都不晚于原截止时间'''
+        rows = [(key, json.dumps(task), execute_at, deadline) for key, task, execute_at, deadline in tasks]
+        await self._run(
+            f'''
+            INSERT INTO {PENDING_REFLECTION_TASKS_NAMESPACE} AS t (key, value, execute_at, deadline, attempts, claim_token)
+            VALUES (%s, %s, %s, %s, 0, NULL)
+            ON CONFLICT (key) DO UPDATE
+            SET value = EXCLUDED.value,
+                execute_at = CASE WHEN t.claim_token IS NULL THEN LEAST(EXCLUDED.execute_at, t.deadline)
+                                  ELSE EXCLUDED.execute_at END,
+                deadline = CASE WHEN t.claim_token IS NULL THEN LEAST(EXCLUDED.deadline, t.deadline)
+                                ELSE EXCLUDED.deadline END,
+                attempts = 0,
+                claim_token = NULL
+            ''',
+            rows,
+            is_many=True,
+        )
+
+    async def claim(
+        self, limit: int, visibility_timeout_seconds: float, exclude_keys: list[str]
+    ) -> list[tuple[str, dict, int, str, float]]:
+        '''认领到期任务。返回 [(键, 任务, 已尝试次数, 认领令牌, 到期时间戳)]，exclude_keys 为本进程正在运行的任务'''
+        now = time.time()
+        claim_token = uuid.uuid4().hex
+        rows = await self._run(
+            f'''
+            WITH due AS (
+                SELECT key, execute_at FROM {PENDING_REFLECTION_TASKS_NAMESPACE}
+                WHERE execute_at <= %s AND key <> ALL(%s::TEXT[])
+                ORDER BY execute_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE {PENDING_REFLECTION_TASKS_NAMESPACE} AS t
+            SET execute_at = %s, attempts = t.attempts + 1, claim_token = %s
+            FROM due
+            WHERE t.key = due.key
+            RETURNING t.key, t.value, t.attempts, due.execute_at AS due_at
+            ''',
+            (now, exclude_keys, limit, now + visibility_timeout_seconds, claim_token),
+            is_fetch=True,
+        )
+        return [(row['key'], row['value'], row['attempts'], claim_token, row['due_at']) for row in rows]
+
+    async def ack(self, claims: list[tuple[str, str]]) -> None:
+        '''批量确认。claims 为 [(键, 认领令牌)]，删除任务'''
+        await self._run(
+            f'''
+            DELETE FROM {PENDING_REFLECTION_TASKS_NAMESPACE} AS t
+            USING unnest(%s::TEXT[], %s::TEXT[]) AS c(key, claim_token)
+            WHERE t.key = c.key AND t.claim_token = c.claim_token
+            ''',
+            ([key for key, _ in claims], [claim_token for _, claim_token in claims]),
+        )
+
+    async def release(self, claims: list[tuple[str, str]]) -> None:
+        '''批量释放。claims 为 [(键, 认领令牌)]，已认领但未运行的任务立即重新可见，不计入尝试次数'''
+        await self._run(
+            f'''
+            UPDATE {PENDING_REFLECTION_TASKS_NAMESPACE} AS t
+            SET execute_at = %s, attempts = GREATEST(t.attempts - 1, 0), claim_token = NULL
+            FROM unnest(%s::TEXT[], %s::TEXT[]) AS c(key, claim_token)
+            WHERE t.key = c.key AND t.claim_token = c.claim_token
+            ''',
+            (time.time(), [key for key, _ in claims], [claim_token for _, claim_token in claims]),
+        )
+
+    async def stats(self, max_depth: int) -> tuple[int, float | None]:
+        '''队列统计。返回 (任务数, 最早的未认领到期任务的到期时间戳)'''
+        rows = await self._run(
+            f'''
+            SELECT count(*) AS depth, min(execute_at) FILTER (WHERE execute_at <= %s) AS oldest_due_at
+            FROM {PENDING_REFLECTION_TASKS_NAMESPACE}
+            ''',
+            (time.time(),),
+            is_fetch=True,
+        )
+        return rows[0]['depth'], rows[0]['oldest_due_at']
+
+    async def _run(self, sql: str, params, *, is_fetch: bool = False, is_many: bool = False) -> list | None:
+        '''通过异步连接池执行 SQL。在记忆仓库事件循环中运行'''
+
+        async def execute():
+            async with self.store.conn.connection() as conn:
+                async with conn.cursor() as cur:
+                    if is_many:
+                        await cur.executemany(sql, params)  # executemany() 使用管道模式，一次往返发送全部语句
+                        return None
+                    await cur.execute(sql, params)
+                    return await cur.fetchall() if is_fetch else None
+
+        return await self.store.run(execute())
+
+
+class SqliteReflectionQueue:
+    '''待办反思任务队列，本地记忆仓库元数据库中的表。语义与 PostgresReflectionQueue 相同，execute_at 建索引
+
+    过滤，排序和数量限制都在 SQL 中完成，认领只读取到期的任务，不随队列长度变慢；
+    认领在 BEGIN IMMEDIATE 事务中先查询再更新，多个进程打开同一目录时也不会取到同一行
+    '''
+
+    def __init__(self, store: LocalVectorStore):
+        self.store = store
+        self._is_setup = False
+
+    @staticmethod
+    def setup(conn) -> None:
+        '''创建队列表。旧版本存在记忆仓库命名空间中的任务移入队列表'''
+        conn.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS {PENDING_REFLECTION_TASKS_NAMESPACE} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                execute_at REAL NOT NULL,
+                deadline REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claim_token TEXT
+            )
+            '''
+        )
+        conn.execute(
+            f'''
+            CREATE INDEX IF NOT EXISTS {PENDING_REFLECTION_TASKS_NAMESPACE}_execute_at_idx
+            ON {PENDING_REFLECTION_TASKS_NAMESPACE} (execute_at)
+            '''
+        )
+        conn.execute(
+            f'''
+            INSERT OR IGNORE INTO {PENDING_REFLECTION_TASKS_NAMESPACE}
+                (key, value, execute_at, deadline, attempts, claim_token)
+            SELECT key,
+                   json_remove(value, '$.execute_at', '$.deadline', '$.attempts', '$.claim_token'),
+                   json_extract(value, '$.execute_at'),
+                   COALESCE(json_extract(value, '$.deadline'), json_extract(value, '$.execute_at')),
+                   COALESCE(json_extract(value, '$.attempts'), 0),
+                   json_extract(value, '$.claim_token')
+            FROM store WHERE prefix = ?
+            ''',
+            (PENDING_REFLECTION_TASKS_NAMESPACE,),
+        )
+        conn.execute('DELETE FROM store WHERE prefix = ?', (PENDING_REFLECTION_TASKS_NAMESPACE,))
+
+    async def enqueue(self, tasks: list[tuple[str, dict, float, float]]) -> None:
+        rows = [(key, json.dumps(task), execute_at, deadline) for key, task, execute_at, deadline in tasks]
+        await self._run(
+            lambda conn: conn.executemany(
+                f'''
+                INSERT INTO {PENDING_REFLECTION_TASKS_NAMESPACE} (key, value, execute_at, deadline, attempts, claim_token)
+                VALUES (?, ?, ?, ?, 0, NULL)
+                ON CONFLICT (key) DO UPDATE
+                SET value = excluded.value,
+                    execute_at = CASE WHEN claim_token IS NULL THEN min(excluded.execute_at, deadline)
+                                      ELSE excluded.execute_at END,
+                    deadline = CASE WHEN claim_token IS NULL THEN min(excluded.deadline, deadline)
+                                    ELSE excluded.deadline END,
+                    attempts = 0,
+                    claim_token = NULL
+                ''',
+                rows,
+            )
+        )
+
+    async def claim(
+        self, limit: int, visibility_timeout_seconds: float, exclude_keys: list[str]
+    ) -> list[tuple[str, dict, int, str, float]]:
+        now = time.time()
+        claim_token = uuid.uuid4().hex
+
+        def claim_due(conn):
+            if not conn.in_transaction:  # 第一次运行时建表已开始事务
+                conn.execute('BEGIN IMMEDIATE')  # 先取得写锁，查询和更新之间其他进程不能认领
+            rows = conn.execute(
+                f'''
+                SELECT key, value, attempts, execute_at FROM {PENDING_REFLECTION_TASKS_NAMESPACE}
+                WHERE execute_at <= ? AND key NOT IN (SELECT value FROM json_each(?))
+                ORDER BY execute_at
+                LIMIT ?
+                ''',
+                (now, json.dumps(exclude_keys), limit),
+            ).fetchall()
+            conn.executemany(
+                f'''
+                UPDATE {PENDING_REFLECTION_TASKS_NAMESPACE}
+                SET execute_at = ?, attempts = attempts + 1, claim_token = ?
+                WHERE key = ?
+                ''',
+                [(now + visibility_timeout_seconds, claim_token, key) for key, _, _, _ in rows],
+            )
+            return rows
+
+        rows = await self._run(claim_due)
+        return [
+            (key, json.loads(value), attempts + 1, claim_token, execute_at)
+            for key, value, attempts, execute_at in rows
+        ]
+
+    async def ack(self, claims: list[tuple[str, str]]) -> None:
+        await self._run(
+            lambda conn: conn.executemany(
+                f'DELETE FROM {PENDING_REFLECTION_TASKS_NAMESPACE} WHERE key = ? AND claim_token = ?', claims
+            )
+        )
+
+    async def release(self, claims: list[tuple[str, str]]) -> None:
+        now = time.time()
+        await self._run(
+            lambda conn: conn.executemany(
+                f'''
+                UPDATE {PENDING_REFLECTION_TASKS_NAMESPACE}
+                SET execute_at = ?, attempts = max(attempts - 1, 0), claim_token = NULL
+                WHERE key = ? AND claim_token = ?
+                ''',
+                [(now, key, claim_token) for key, claim_token in claims],
+            )
+        )
+
+    async def stats(self, max_depth: int) -> tuple[int, float | None]:
+        now = time.time()
+        return await self._run(
+            lambda conn: conn.execute(
+                f'''
+                SELECT count(*), min(CASE WHEN execute_at <= ? THEN execute_at END)
+                FROM {PENDING_REFLECTION_TASKS_NAMESPACE}
+                ''',
+                (now,),
+            ).fetchone()
+        )
+
+    async def _run(self, fn):
+        '''在本地记忆仓库的元数据库中运行 fn(连接)。第一次运行时创建队列表'''
+
+        def run(conn):
+            if not self._is_setup:
+                self.setup(conn)
+                self._is_setup = True
+            return fn(conn)
+
+        return await self.store.arun(run)
+
+
+class StoreReflectionQueue:
+    '''待办反思任务队列，记忆仓库命名空间。用于其他记忆仓库，语义与 PostgresReflectionQueue 相同，认领不是原子操作，只适用于单进程'''
+
+    namespace = (PENDING_REFLECTION_TASKS_NAMESPACE,)
+    queue_fields = ('execute_at', 'deadline', 'attempts', 'claim_token')  # 队列项中的队列字段，认领时不返回
+    search_page_size = 100
+
+    def __init__(self, store: BaseStore):
+        self.store = store
+
+    async def enqueue(self, tasks: list[tuple[str, dict, float, float]]) -> None:
+        for key, task, execute_at, deadline in tasks:
+            item = await self.store.aget(self.namespace, key)
+            if item and item.value['claim_token'] is None and item.value.get('deadline') is not None:
+                execute_at = min(execute_at, item.value['deadline'])
+                deadline = min(deadline, item.value['deadline'])
+            value = {**task, 'execute_at': execute_at, 'deadline': deadline, 'attempts': 0, 'claim_token': None}
+            await self.store.aput(self.namespace, key, value, index=False)  # 队列项不需要向量索引
+
+    async def claim(
+        self, limit: int, visibility_timeout_seconds: float, exclude_keys: list[str]
+    ) -> list[tuple[str, dict, int, str, float]]:
+        '''记忆仓库搜索不能按执行时间排序，读取全部到期任务后取最早的 limit 个'''
+        now = time.time()
+        claim_token = uuid.uuid4().hex
+        items = await self._search_all(filter={'execute_at': {'$lte': now}})
+        items = sorted(
+            (item for item in items if item.key not in exclude_keys), key=lambda item: item.value['execute_at']
+        )
+        claims = []
+        for item in items[:limit]:
+            value = {
+                **item.value,
+                'execute_at': now + visibility_timeout_seconds,
+                'attempts': item.value['attempts'] + 1,
+                'claim_token': claim_token,
+            }
+            await self.store.aput(self.namespace, item.key, value, index=False)
+            task = {k: v for k, v in item.value.items() if k not in self.queue_fields}
+            claims.append((item.key, task, value['attempts'], claim_token, item.value['execute_at']))
+        return claims
+
+    async def ack(self, claims: list[tuple[str, str]]) -> None:
+        for key, claim_token in claims:
+            item = await self.store.aget(self.namespace, key)
+            if item and item.value['claim_token'] == claim_token:
+                await self.store.adelete(self.namespace, key)
+
+    async def release(self, claims: list[tuple[str, str]]) -> None:
+        for key, claim_token in claims:
+            item = await self.store.aget(self.namespace, key)
+            if item and item.value['claim_token'] == claim_token:
+                value = {
+                    **item.value,
+                    'execute_at': time.time(),
+                    'attempts': max(item.value['attempts'] - 1, 0),
+                    'claim_token': None,
+                }
+                await self.store.aput(self.namespace, key, value, index=False)
+
+    async def stats(self, max_depth: int) -> tuple[int, float | None]:
+        '''任务数最多数到 max_depth'''
+        now = time.time()
+        items = await self.store.asearch(self.namespace, limit=max_depth)
+        due = [item.value['execute_at'] for item in items if item.value['execute_at'] <= now]
+        return len(items), min(due, default=None)
+
+    async def _search_all(self, filter: dict) -> list:
+        '''按页读取全部匹配的队列项。'''
+        items = []
+        while True:
+            page = await self.store.asearch(
+                self.namespace, filter=filter, limit=self.search_page_size, offset=len(items)
+            )
+            items.extend(page)
+            if len(page) < self.search_page_size:
+                return items
+
+
+class ReflectionWorkerPool:
+    '''反思工作线程池。worker_count 个工作线程同步运行反思，替换 LocalReflectionExecutor 的单个工作线程
+
+    只负责运行；排队，合并，重试和限流由 PersistenceExecutor 通过待办任务队列完成。
+    可替换为其他实现，提供 worker_count，submit(payload, config) -> Future 和 shutdown() 即可
+    '''
+
+    def __init__(self, reflector: Runnable, worker_count: int = 1):
+        if getattr(reflector, 'namespace', None) is None:
+            raise ValueError('reflector 必须有 namespace 属性')
+        self.reflector = reflector
+        self.worker_count = worker_count
+        self._executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='reflection')
+
+    def submit(self, payload: dict[str, Any], config: RunnableConfig) -> Future:
+        '''提交反思。在工作线程中运行，返回 concurrent.futures.Future'''
+        return self._executor.submit(self._run, payload, config)
+
+    def _run(self, payload: dict[str, Any], config: RunnableConfig):
+        token = var_child_runnable_config.set(config)  # 与 LocalReflectionExecutor 相同，反思从运行配置中取得记忆仓库
+        try:
+            return self.reflector.invoke(payload)
+        finally:
+            var_child_runnable_config.reset(token)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
 
 
 class PersistenceExecutor:
-    '''持久化执行器。LocalReflectionExecutor 包装器，持久化待办反思任务并提供重启恢复，增强 LocalReflectionExecutor'''
+    '''持久化执行器。待办反思任务持久化在队列中，到期后认领并交给反思工作线程池运行
+
+    提交只写入队列；后台轮询认领到期任务，本进程同时运行的任务不超过工作线程数，重启时不需要把全部待办任务读入内存。
+    反思优先级低于交互轮次：pause() 后不再认领新任务，已在运行的反思继续运行；队列中的任务达到 max_queue_depth 时拒绝新提交。
+    按检查点安排的任务只保存 (会话, 检查点 ID) 指针，运行时才从检查点保存器读取消息；同一会话在防抖窗口内重复安排只推迟执行时间。
+    运行成功或尝试次数用尽后批量确认，进程崩溃时已认领的任务在可见性超时后重新可见。
+    记忆仓库为 postgres 异步记忆仓库时，队列通过同一个异步连接池，在记忆仓库事件循环中读写 pending_reflection_tasks 表；
+    为本地记忆仓库时，队列为其 SQLite 元数据库中的 pending_reflection_tasks 表；
+    反思在工作线程中同步运行，记忆仓库的同步方法把查询提交回事件循环，全部数据库 IO 都经过异步连接池
+    '''
 
-    def __init__(self, reflector: Runnable, store: BaseStore):
-        self._inner_executor = LocalReflectionExecutor(reflector, store=None)
+    def __init__(
+        self,
+        reflector: Runnable,
+        store: BaseStore,
+        *,
+        checkpointer: BaseCheckpointSaver | None = None,
+        debounce_seconds: float = 120.0,
+        max_delay_seconds: float = 900.0,
+        poll_seconds: float = 1.0,
+        claim_batch_size: int = 16,
+        visibility_timeout_seconds: float = 600.0,
+        max_attempts: int = 3,
+        ack_flush_seconds: float = 0.5,
+        worker_count: int = 1,
+        max_queue_depth: int = 1000,
+        close_timeout_seconds: float = 10.0,
+        worker_pool: ReflectionWorkerPool | None = None,
+        metrics=None,
+    ):
+        self._worker_pool = worker_pool or ReflectionWorkerPool(reflector, worker_count)
+        self._reflector = reflector
         self.store = store
+        if isinstance(store, LocalVectorStore):
+            self._queue = SqliteReflectionQueue(store)
+        elif _is_event_loop_bound_store(store):
+            self._queue = PostgresReflectionQueue(store)
+        else:
+            self._queue = StoreReflectionQueue(store)
+        self._checkpointer = checkpointer  # 按检查点安排的任务运行时从中读取消息
+        self._debounce_seconds = debounce_seconds  # 按检查点安排的任务在最后一次安排后等待的时长
+        self._max_delay_seconds = max_delay_seconds  # 同一会话的任务从第一次提交起最多推迟的时长
+        self._poll_seconds = poll_seconds  # 没有到期任务时的轮询间隔，提交立即执行的任务时提前唤醒
+        self._claim_batch_size = claim_batch_size  # 每次最多认领的任务数，本进程同时持有的已认领任务还不超过工作线程数
+        self._visibility_timeout_seconds = visibility_timeout_seconds  # 认领后超过该时长未确认，任务重新可见
+        self._max_attempts = max_attempts  # 最大尝试次数，用尽后丢弃任务
+        self._ack_flush_seconds = ack_flush_seconds  # 确认攒批的等待时间
+        self._max_queue_depth = max_queue_depth  # 队列中任务数上限，达到时拒绝提交，为 0 时不限制
+        self._close_timeout_seconds = close_timeout_seconds  # 关闭时等待正在运行的反思的时长
+        self._metrics = metrics
 
-        self._resume_pending_reflection_tasks()
+        self._loop = asyncio.get_running_loop()  # 在事件循环中创建，工作线程的完成回调把确认提交回该事件循环
+        self._claims = {}  # 本进程已认领的任务，键 -> (认领令牌, Future)
+        self._pending_acks = []  # 待确认的 (键, 认领令牌)
+        self._ack_task = None
+        self._poll_task = None
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()  # 没有交互轮次进行时置位，清除时暂停认领
+        self._idle.set()
+        self._queue_depth = 0  # 队列中的任务数，轮询时刷新，提交时累加
+        self._closed = False
 
     @staticmethod
-    def setup(connection: Connection) -> None:
+    async def asetup(connection_pool: 'AsyncConnectionPool') -> None:
         '''为 PersistenceExecutor 创建所需数据库表'''
-        CREATE_TABLE_SQL = f'''
-        CREATE TABLE IF NOT EXISTS {PENDING_REFLECTION_TASKS_NAMESPACE} (
-            key TEXT PRIMARY KEY,
-            value JSONB NOT NULL
-        );
-        '''
         try:
-            with connection.cursor() as cur:
-                cur.execute(CREATE_TABLE_SQL)
-        except Exception as e:
-            print(f'<setup> 创建表失败！！！！！\n{e}')
+            await PostgresReflectionQueue.setup(connection_pool)
+        except Exception:
+            logger.error('<PersistenceExecutor.asetup> 创建待办反思任务表失败')
             raise
 
-    def _resume_pending_reflection_tasks(self) -> None:
-        '''恢复待办反思任务。从 store 中加载所有保存的待办反思任务并重新提交到内存队列'''
-        try:
-            task_item = []
-            current_offset = 0
-            while True:
-                page_item = self.store.search(PENDING_REFLECTION_TASKS_NAMESPACE, offset=current_offset)
-                if page_item:
-                    task_item.extend(page_item)
-                    current_offset += 10
-                else:
-                    break
-        except Exception as e:
-            print(f'<_resume_pending_reflection_tasks> 无法获取 store 中的待办反思任务！！！！！\n{e}')
-
-        if not task_item:
-            return
+    def start(self) -> None:
+        '''开始轮询队列。重启前的待办任务到期后按批认领，不在启动时全部读入'''
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll())
+
+    def pause(self) -> None:
+        '''暂停认领。交互轮次开始时调用，正在运行的反思继续运行'''
+        self._idle.clear()
+
+    def resume(self) -> None:
+        '''恢复认领。交互轮次全部结束时调用'''
+        self._idle.set()
+
+    async def aclose(self) -> None:
+        '''停止轮询，等待正在运行的反思，提交待确认的任务，释放未完成的任务，停止工作线程
+
+        已认领但还未运行的任务取消；正在运行的反思最多等待 close_timeout_seconds，结束的随其他待确认任务一起确认，
+        超时仍在运行的与取消的一起释放回队列，下次启动重新运行，不必等到可见性超时
+        '''
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+        self._worker_pool.shutdown(wait=False, cancel_futures=True)
+        running = [asyncio.wrap_future(future) for _, future in self._claims.values() if not future.done()]
+        if running:
+            await asyncio.wait(running, timeout=self._close_timeout_seconds)
+            await asyncio.sleep(0)  # 完成回调先于 wrap_future 提交，此时已在运行 _on_task_done
+        self._closed = True  # 此后结束的反思不再确认，其任务已释放
+        if self._ack_task is not None:
+            await self._ack_task  # 已取出的确认在该任务中提交，不能取消
+            self._ack_task = None
+        await self._flush_acks()
+        timed_out = [key for key, (_, future) in self._claims.items() if not future.done()]
+        if timed_out:
+            logger.warning(
+                f'<PersistenceExecutor.aclose> 等待正在运行的反思超时，释放其任务，下次启动重新运行：{timed_out}'
+            )
+        unfinished = [(key, claim_token) for key, (claim_token, _) in self._claims.items()]
+        self._claims.clear()
+        if unfinished:
+            try:
+                await self._queue.release(unfinished)
+            except Exception:
+                logger.warning(
+                    '<PersistenceExecutor.aclose> 释放已认领的待办反思任务失败，可见性超时后重新可见', exc_info=True
+                )
+
+    async def aschedule(self, config: RunnableConfig, checkpoint_id: str) -> None:
+        '''按检查点安排反思任务。config 中的 thread_id 和 checkpoint_id 指向要反思的检查点，队列中只保存该指针
 
+        防抖窗口内同一会话再次安排时只更新指针并推迟执行时间，最迟不超过第一次安排后 max_delay_seconds
+        '''
+        await self._enqueue([({'checkpoint_id': checkpoint_id, 'config': config}, config, self._debounce_seconds)])
+
+    async def asubmit_many(self, tasks: list[tuple[dict[str, Any], RunnableConfig, float]]) -> None:
+        '''批量提交反思任务。tasks 为 [(payload, config, after_seconds)]，一次写入队列'''
+        await self._enqueue(
+            [
+                ({'payload': payload, 'config': config}, config, after_seconds)
+                for payload, config, after_seconds in tasks
+            ]
+        )
+
+    async def asubmit(self, payload: dict[str, Any], /, config: RunnableConfig, *, after_seconds: float = 0) -> None:
+        '''提交反思任务。写入队列，同一会话重复提交时合并为一个任务，到期后由后台轮询认领运行'''
+        await self.asubmit_many([(payload, config, after_seconds)])
+
+    def submit(self, payload: dict[str, Any], /, config: RunnableConfig, *, after_seconds: float = 0) -> None:
+        '''提交反思任务。供事件循环之外的线程调用，等待写入队列'''
+        asyncio.run_coroutine_threadsafe(
+            self.asubmit(payload, config, after_seconds=after_seconds), self._loop
+        ).result()
+
+    async def _enqueue(self, tasks: list[tuple[dict, RunnableConfig, float]]) -> None:
+        '''写入队列。tasks 为 [(任务, config, after_seconds)]，按 (用户, 会话) 合并；有立即执行的任务时唤醒轮询
+
+        队列已满时抛出 RuntimeError，提交方稍后重试或放弃，避免反思积压无限增长
+        '''
+        if self._max_queue_depth and self._queue_depth >= self._max_queue_depth:
+            if self._metrics is not None:
+                self._metrics.increment('agent_reflection_tasks_rejected_total', len(tasks))
+            raise RuntimeError(f'待办反思任务队列已满（{self._queue_depth}/{self._max_queue_depth}）')
         now = time.time()
-        for item in task_item:
+        rows = []
+        for task, config, after_seconds in tasks:
+            user_id = config['configurable']['langgraph_user_id']
+            thread_id = config['configurable']['thread_id']
+            deadline = now + max(after_seconds, self._max_delay_seconds)
+            rows.append((f'{user_id}: {thread_id}', task, now + after_seconds, deadline))
+        await self._queue.enqueue(rows)
+        self._queue_depth += len(rows)  # 合并到已有任务时多计，下次轮询校正
+        if any(after_seconds <= 0 for _, _, after_seconds in tasks):
+            self._wakeup.set()
+
+    async def _poll(self) -> None:
+        '''轮询队列。有空闲工作线程时认领到期任务，认领满时不等待，继续认领；交互轮次进行中不认领'''
+        while True:
+            await self._idle.wait()
+            claimed = []
+            capacity = min(self._claim_batch_size, self._worker_pool.worker_count - len(self._claims))
+            if capacity > 0:
+                try:
+                    claimed = await self._queue.claim(capacity, self._visibility_timeout_seconds, list(self._claims))
+                except Exception:
+                    logger.warning('<PersistenceExecutor._poll> 认领待办反思任务失败', exc_info=True)
+            now = time.time()
+            for _, _, _, _, due_at in claimed:
+                if self._metrics is not None:
+                    self._metrics.observe('agent_reflection_queue_lag_seconds', max(now - due_at, 0.0))
+            await asyncio.gather(
+                *(
+                    self._run_claimed(key, task, attempts, claim_token)
+                    for key, task, attempts, claim_token, _ in claimed
+                )
+            )
+            if claimed and len(claimed) == capacity:
+                continue
+            await self._refresh_stats()
+            self._wakeup.clear()
             try:
-                task_data = item.value
-                payload = task_data['payload']
-                config = task_data['config']
-                thread_id = config['configurable']['thread_id']
-                execute_at = task_data['execute_at']
-                remaining_time = max(0, execute_at - now)
-                self.submit(payload, config, after_seconds=remaining_time, thread_id=thread_id)
-            except Exception as e:
-                print(f'<_resume_pending_reflection_tasks> 恢复待办反思任务失败！！！！！\n{e}')
-
-    def submit(
-        self,
-        payload: dict[str, Any],
-        /,
-        config: RunnableConfig | None = None,
-        *,
-        after_seconds: int = 0,
-        thread_id: Optional[typing.Union[str, uuid.UUID]] = SENTINEL,
-    ) -> Future:
-        user_id = config['configurable']['langgraph_user_id']
-        thread_id = config['configurable']['thread_id']
-        composite_id = f'{user_id}: {thread_id}'
-        execute_at = time.time() + after_seconds
-        task_data = {'payload': payload, 'config': config, 'execute_at': execute_at}
+                await asyncio.wait_for(self._wakeup.wait(), self._poll_seconds)
+            except TimeoutError:
+                pass
 
+    async def _refresh_stats(self) -> None:
+        '''刷新队列任务数，记录队列深度和最早到期任务的等待时长'''
         try:
-            if (
-                isinstance(self.store, PostgresStore)
-                and isinstance(self.store.conn, ConnectionPool)
-                and hasattr(self.store.conn, '_pool')
-            ):
-                with self.store.conn.connection() as conn:
-                    with conn.cursor() as cur:
-                        PUT_SQL = f'''INSERT INTO {PENDING_REFLECTION_TASKS_NAMESPACE} (key, value) VALUES (%s, %s) ON conflict (key) DO UPDATE SET value = EXCLUDED.value;'''
-                        cur.execute(PUT_SQL, (composite_id, json.dumps(task_data)))
-            else:
-                self.store.put(PENDING_REFLECTION_TASKS_NAMESPACE, composite_id, task_data)
-        except Exception as e:
-            print(f'<submit> 持久化待办反思任务失败！！！！！\n{e}')
-            raise
+            depth, oldest_due_at = await self._queue.stats(self._max_queue_depth or 10000)
+        except Exception:
+            logger.warning('<PersistenceExecutor._refresh_stats> 统计待办反思任务失败', exc_info=True)
+            return
+        self._queue_depth = depth
+        if self._metrics is not None:
+            self._metrics.observe('agent_reflection_queue_depth', depth)
+            if oldest_due_at is not None:
+                self._metrics.observe(
+                    'agent_reflection_queue_oldest_due_seconds', max(time.time() - oldest_due_at, 0.0)
+                )
+
+    async def _run_claimed(self, key: str, task: dict, attempts: int, claim_token: str) -> None:
+        '''读取已认领任务的消息，交给反思工作线程池立即运行。成功或尝试次数用尽时确认'''
+        try:
+            payload = await self._load_payload(task)
+        except Exception:
+            logger.warning(f'<PersistenceExecutor> 读取反思任务 {key} 的消息失败', exc_info=True)
+            self._on_task_done(key, claim_token, attempts >= self._max_attempts)
+            return
+        if payload is None:  # 检查点已随会话删除，没有可反思的消息
+            self._on_task_done(key, claim_token, True)
+            return
+
+        config = task['config']
+        config_for_runtime = {**config, 'configurable': {**config['configurable'], CONFIG_KEY_STORE: self.store}}
+        started_at = time.perf_counter()
+        future = self._worker_pool.submit(payload, config_for_runtime)
+        self._claims[key] = (claim_token, future)
 
-        config_for_runtime = config.copy()
-        config_for_runtime['configurable'][CONFIG_KEY_STORE] = self.store
-        future = self._inner_executor.submit(
-            payload, config_for_runtime, after_seconds=after_seconds, thread_id=thread_id
+        def _on_done(fut):
+            if fut.cancelled():  # 关闭时取消，由 aclose() 释放
+                return
+            error = fut.exception()  # exception() 取出 Future 抛出的异常
+            if error is not None:
+                logger.warning(f'<PersistenceExecutor> 反思任务 {key} 第 {attempts} 次运行失败：{error!r}')
+            is_ack = error is None or attempts >= self._max_attempts  # 失败且未用尽时不确认，可见性超时后重试
+            if self._metrics is not None:
+                result = 'success' if error is None else 'dropped' if is_ack else 'retry'
+                self._metrics.observe('agent_reflection_duration_seconds', time.perf_counter() - started_at)
+                self._metrics.increment('agent_reflection_tasks_total', result=result)
+            try:
+                self._loop.call_soon_threadsafe(self._on_task_done, key, claim_token, is_ack)
+            except RuntimeError:  # 事件循环已关闭，任务已由 aclose() 释放
+                logger.debug(f'<PersistenceExecutor> 反思任务 {key} 在事件循环关闭后结束，不再确认')
+
+        future.add_done_callback(_on_done)
+
+    async def _load_payload(self, task: dict) -> dict[str, Any] | None:
+        '''取出任务的反思输入。直接提交的任务保存了 payload；按检查点安排的任务读取该检查点的全部消息，检查点不存在时返回 None'''
+        if 'payload' in task:
+            return task['payload']
+        if self._checkpointer is None:
+            raise RuntimeError('按检查点安排的反思任务需要检查点保存器')
+        checkpoint_tuple = await self._checkpointer.aget_tuple(
+            {
+                'configurable': {
+                    'thread_id': task['config']['configurable']['thread_id'],
+                    'checkpoint_ns': '',
+                    'checkpoint_id': task['checkpoint_id'],
+                }
+            }
         )
+        if checkpoint_tuple is None:
+            return None
+        messages = checkpoint_tuple.checkpoint['channel_values'].get('messages')
+        return {'messages': messages} if messages else None
 
-        def _clean_on_done(fut: Future):
-            if (
-                not fut.cancelled() and fut.exception() is None
-            ):  # cancelled() 判断 Future 是否已被取消 exception() 取出 Future 抛出的异常
-                try:
-                    if (
-                        isinstance(self.store, PostgresStore)
-                        and isinstance(self.store.conn, ConnectionPool)
-                        and hasattr(self.store.conn, '_pool')
-                    ):
-                        with self.store.conn.connection() as conn:
-                            with conn.cursor() as cur:
-                                DELETE_SQL = f'''DELETE FROM {PENDING_REFLECTION_TASKS_NAMESPACE} WHERE key = %s;'''
-                                cur.execute(DELETE_SQL, (composite_id,))
-                    else:
-                        self.store.delete(PENDING_REFLECTION_TASKS_NAMESPACE, composite_id)
-                except Exception as e:
-                    print(f'<submit> 清理待办反思任务失败！！！！！\n{e}')
-
-        future.add_done_callback(_clean_on_done)
-        return future
-
-    def search(self, *args, **kwargs):
-        return self._inner_executor.search(*args, **kwargs)
-
-    async def asearch(self, *args, **kwargs):
-        return await self._inner_executor.asearch(*args, **kwargs)
+    def _on_task_done(self, key: str, claim_token: str, is_ack: bool) -> None:
+        '''任务结束。在事件循环中运行，攒批确认并唤醒轮询认领下一批'''
+        if self._closed:
+            return
+        if self._claims.get(key, (None,))[0] == claim_token:
+            self._claims.pop(key)
+        if is_ack:
+            self._pending_acks.append((key, claim_token))
+            if self._ack_task is None or self._ack_task.done():
+                self._ack_task = asyncio.create_task(self._flush_acks(self._ack_flush_seconds))
+        self._wakeup.set()
+
+    async def _flush_acks(self, delay: float = 0) -> None:
+        '''批量确认。等待 delay 秒攒批后一次删除'''
+        if delay:
+            await asyncio.sleep(delay)
+        acks, self._pending_acks = self._pending_acks, []
+        if not acks:
+            return
+        try:
+            await self._queue.ack(acks)
+        except Exception:
+            logger.warning('<PersistenceExecutor._flush_acks> 确认待办反思任务失败，任务将重新运行', exc_info=True)
+
+    def search(self, query: str | None = None, *, filter=None, limit: int = 10, offset: int = 0):
+        '''搜索反思写入的记忆。与 LocalReflectionExecutor.search() 相同'''
+        items = self.store.search(self._reflector.namespace(), query=query, filter=filter, limit=limit, offset=offset)
+        return [item.dict() for item in items]
+
+    async def asearch(self, query: str | None = None, *, filter=None, limit: int = 10, offset: int = 0):
+        items = await self.store.asearch(
+            self._reflector.namespace(), query=query, filter=filter, limit=limit, offset=offset
+        )
+        return [item.dict() for item in items]
 
     def shutdown(self, *args, **kwargs):
-        self._inner_executor.shutdown(*args, **kwargs)
+        self._worker_pool.shutdown(*args, **kwargs)
 
     def __enter__(self):
         return
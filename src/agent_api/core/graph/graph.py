@@ -1,56 +1,160 @@
 from functools import partial
 
+from langchain_core.messages import HumanMessage
 from langgraph.graph import END, START, StateGraph
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import tools_condition
 
+from .assist.assist import classify_intent_by_exemplars
 from .node import (
     add_final_response_node,
+    context_compaction_node,
     intent_classifier_entry_node,
     intent_classifier_node,
     introspection_classifier_entry_node,
     introspection_node,
+    memory_retrieval_node,
     react_graph_adapter_node,
+    tool_node,
 )
 from .state import MainState, ReActState
-from .type import IntentClassification, IntrospectionClassification
+from .type import INTENT_EXEMPLARS, IntentClassification, IntrospectionClassification
 
 
-async def create_react_graph(chat_node, llm, tools):
-    '''图，创建 ReAct 图。结构：ReAct结构。连接：对话，工具'''
+def create_intent_router(llm, confidence_threshold=None, context_token_budget=None, routes=None, exemplars=None):
+    '''路由，创建意图路由器。只有一条路由时直接返回，不调用 LLM；多条路由时先用本地范例分类器，置信度不足再回退到 LLM 意图分类器，LLM 只读取不超过 Token 预算的最近消息。
+    confidence_threshold 为空，或有路由没有范例（无法参与比较，置信度不可信）时不使用本地范例分类器。routes 默认为全部意图类别，exemplars 默认为 INTENT_EXEMPLARS'''
+    routes = list(IntentClassification) if routes is None else list(routes)
+    exemplars = INTENT_EXEMPLARS if exemplars is None else exemplars
+    is_exemplar_routing = confidence_threshold is not None and all(exemplars.get(route) for route in routes)
+
+    async def intent_router(state) -> IntentClassification:
+        if len(routes) == 1:  # 路由唯一，无需分类
+            return routes[0]
+
+        latest_human_message = next((m for m in reversed(state.messages) if isinstance(m, HumanMessage)), None)
+        if is_exemplar_routing and latest_human_message:
+            intent, confidence = classify_intent_by_exemplars(latest_human_message.text(), exemplars)
+            if intent is not None and confidence >= confidence_threshold:
+                return intent
+        return await intent_classifier_node(state, llm=llm, context_token_budget=context_token_budget)
+
+    return intent_router
+
+
+async def create_react_graph(
+    chat_node,
+    llm,
+    tools,
+    max_concurrent_tool_calls=4,
+    tool_timeout_seconds=30.0,
+    tool_turn_timeout_seconds=None,
+    context_token_budget=None,
+):
+    '''图，创建 ReAct 图。结构：ReAct结构。连接：对话，工具。同一条 AIMessage 中的工具调用并发执行，受并发数，单次超时和本轮截止时间约束'''
     react_graph_builder = StateGraph(ReActState)
-    react_graph_builder.add_node('chat_node', partial(chat_node, llm=llm))  # partial() 固定函数的部分参数，返回偏函数
-    tool_node = ToolNode(tools)  # ！！！！！需要考虑 tools 为空的情况，可能需要写一个判断或分支路线
-    react_graph_builder.add_node('tool_node', tool_node)
+    react_graph_builder.add_node(
+        'chat_node', partial(chat_node, llm=llm, context_token_budget=context_token_budget)
+    )  # partial() 固定函数的部分参数，返回偏函数
+    react_graph_builder.add_node(
+        'tool_node',
+        partial(
+            tool_node,
+            tools=tools,
+            max_concurrent_tool_calls=max_concurrent_tool_calls,
+            tool_timeout_seconds=tool_timeout_seconds,
+            tool_turn_timeout_seconds=tool_turn_timeout_seconds,
+        ),
+    )  # 工具不存在时返回错误 ToolMessage，tools 为空也可运行
 
     react_graph_builder.add_edge(START, 'chat_node')
     react_graph_builder.add_conditional_edges(
         'chat_node', tools_condition, {'tools': 'tool_node', '__end__': END}
     )  # tools_condition 工具调用条件
     react_graph_builder.add_edge('tool_node', 'chat_node')
-    return react_graph_builder.compile()
+    return react_graph_builder.compile(checkpointer=False)
 
 
-async def create_main_graph_builder(chat_node, llm, tools):
-    '''图，创建主图构建器。结构：意图分类路由 + 反思路由。连接：意图分类器入口，ReAct 图适配器，反思分类器入口，添加最终回复'''
+async def create_main_graph_builder(
+    chat_node,
+    llm,
+    tools,
+    intent_confidence_threshold=None,
+    max_introspection_count=2,
+    max_turn_seconds=120.0,
+    is_reuse_draft=True,
+    max_concurrent_tool_calls=4,
+    tool_timeout_seconds=30.0,
+    tool_turn_timeout_seconds=None,
+    context_token_budget=3000,
+    context_keep_tokens=1500,
+    intent_context_token_budget=500,
+    introspection_context_token_budget=1500,
+    memory_top_k=3,
+    memory_retrieval_timeout_seconds=None,
+    summary_llm=None,
+):
+    '''图，创建主图构建器。结构：上下文压缩，意图分类路由和情景记忆检索并发 + 反思路由。连接：上下文压缩，意图分类器入口，情景记忆检索，ReAct 图适配器，反思分类器入口，添加最终回复。反思路由受本轮反思次数和耗时预算约束，工具调用受并发数和超时约束，各节点按各自的 Token 预算读取上下文。
+    summary_llm 为上下文压缩使用的未绑定工具的 LLM，为空时使用 llm'''
     main_graph_builder = StateGraph(MainState)
+    main_graph_builder.add_node(
+        'context_compaction_node',
+        partial(
+            context_compaction_node,
+            llm=summary_llm or llm,
+            context_token_budget=context_token_budget,
+            context_keep_tokens=context_keep_tokens,
+        ),
+    )
     main_graph_builder.add_node('intent_classifier_entry_node', intent_classifier_entry_node)
+    main_graph_builder.add_node(
+        'memory_retrieval_node',
+        partial(memory_retrieval_node, top_k=memory_top_k, timeout_seconds=memory_retrieval_timeout_seconds),
+    )  # 记忆仓库由 compile(store=...) 注入
     main_graph_builder.add_node(
         'react_graph_adapter_node',
-        partial(react_graph_adapter_node, react_graph=await create_react_graph(chat_node, llm, tools)),
+        partial(
+            react_graph_adapter_node,
+            react_graph=await create_react_graph(
+                chat_node,
+                llm,
+                tools,
+                max_concurrent_tool_calls=max_concurrent_tool_calls,
+                tool_timeout_seconds=tool_timeout_seconds,
+                tool_turn_timeout_seconds=tool_turn_timeout_seconds,
+                context_token_budget=context_token_budget,
+            ),
+            is_reuse_draft=is_reuse_draft,
+            max_turn_seconds=max_turn_seconds,
+        ),
+    )
+    main_graph_builder.add_node(
+        'introspection_classifier_entry_node',
+        partial(
+            introspection_classifier_entry_node,
+            llm=llm,
+            max_introspection_count=max_introspection_count,
+            max_turn_seconds=max_turn_seconds,
+            context_token_budget=introspection_context_token_budget,
+        ),
     )
-    main_graph_builder.add_node('introspection_classifier_entry_node', introspection_classifier_entry_node)
     main_graph_builder.add_node('add_final_response_node', add_final_response_node)
 
+    main_graph_builder.add_edge(START, 'context_compaction_node')
     main_graph_builder.add_edge(START, 'intent_classifier_entry_node')
+    main_graph_builder.add_edge(
+        START, 'memory_retrieval_node'
+    )  # 三者在同一步中并发运行，摘要的 LLM 调用不阻塞意图分类，同一步结束后 ReAct 图适配器只运行一次
+    main_graph_builder.add_edge('context_compaction_node', 'react_graph_adapter_node')
+    main_graph_builder.add_edge('memory_retrieval_node', 'react_graph_adapter_node')
     main_graph_builder.add_conditional_edges(
         'intent_classifier_entry_node',
-        partial(intent_classifier_node, llm=llm),
+        create_intent_router(llm, intent_confidence_threshold, intent_context_token_budget),
         {IntentClassification.ReactGraphAdapterNode: 'react_graph_adapter_node'},
     )
     main_graph_builder.add_edge('react_graph_adapter_node', 'introspection_classifier_entry_node')
     main_graph_builder.add_conditional_edges(
         'introspection_classifier_entry_node',
-        partial(introspection_node, llm=llm),
+        introspection_node,
         {
             IntrospectionClassification.IntentClassifierEntryNode: 'intent_classifier_entry_node',
             IntrospectionClassification.AddFinalResponseNode: 'add_final_response_node',
@@ -61,4 +165,3 @@ async def create_main_graph_builder(chat_node, llm, tools):
 
 
 # ！！！！！考虑意图分类提示词是否需要更改，是否需要添加错误处理或重新处理的判断，或再次处理的判断
-# ！！！！！如果有多个分支，当反思认为草稿无法完成任务时，然后转移到意图分类，那么此时，草稿中的内容应该清空还是传递给意图分类的子图
@@ -1,79 +1,236 @@
-from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import asyncio
+import logging
+import time
 
-from .assist.assist import create_intent_classifier_chain, create_introspection_classifier_chain
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore
+
+from .assist.assist import (
+    create_chat_chain,
+    create_intent_classifier_chain,
+    create_introspection_classifier_chain,
+    create_summary_chain,
+    estimate_tokens,
+    find_compaction_boundary,
+    format_context_summary,
+    format_episode_memories,
+    format_messages_for_summary,
+    select_recent_messages,
+)
 from .type import IntentClassification, IntrospectionClassification
 
+logger = logging.getLogger(__name__)  # 根日志记录器由 agent 模块配置
+
 
 # ---------- 通用相关 ----------
-async def chat_node(state, llm: BaseChatModel) -> dict:
-    '''节点，对话。传入 LLM 并定义对话提示模板，整合为链，填充对话提示模板并调用 LLM 给出回复，返回 AIMessage 或 ToolMessage'''
-    chat_prompt_template = ChatPromptTemplate.from_messages(
-        [
-            (
-                'system',
-                '{system_prompt}\n用户的名字叫：{user_name}，你的名字叫：{ai_name}\n请使用{chat_language}进行对话！',
-            ),
-            MessagesPlaceholder(variable_name='messages'),
-        ]
-    )  # 对话提示模板
-    chain = chat_prompt_template | llm
+async def chat_node(state, llm: BaseChatModel, context_token_budget: int | None = None) -> dict:
+    '''节点，对话。传入 LLM 获取缓存的对话链，填充对话提示模板（附带更早对话的摘要和不超过 Token 预算的最近消息）并调用 LLM 给出回复，返回 AIMessage 或 ToolMessage'''
+    chain = await create_chat_chain(llm)
     response = await chain.ainvoke(
         {
             'system_prompt': state.system_prompt,
             'user_name': state.user_name,
             'ai_name': state.ai_name,
             'chat_language': state.chat_language,
-            'messages': state.messages,
+            'context_summary': format_context_summary(state.context_summary),
+            'messages': select_recent_messages(state.messages, context_token_budget),
         }
     )
     return {'messages': response}
 
 
+# ---------- ReAct 图相关 ----------
+async def tool_node(
+    state,
+    config: RunnableConfig,
+    tools: list,
+    max_concurrent_tool_calls: int,
+    tool_timeout_seconds: float,
+    tool_turn_timeout_seconds: float | None,
+) -> dict:
+    '''节点，工具。并发执行最后一条 AIMessage 中的所有工具调用，并发数受信号量限制；每个调用受单次超时和本轮截止时间约束，超时的调用被取消并返回错误 ToolMessage，每个 ToolMessage 的 response_metadata 记录耗时'''
+    tools_by_name = {tool.name: tool for tool in tools}
+    semaphore = asyncio.Semaphore(max_concurrent_tool_calls)
+    deadline = (
+        state.turn_started_at + tool_turn_timeout_seconds
+        if tool_turn_timeout_seconds and state.turn_started_at
+        else None
+    )  # 本轮工具调用截止时间戳
+
+    async def run_tool_call(tool_call):
+        name, tool_call_id = tool_call['name'], tool_call['id']
+        async with semaphore:
+            timeout = tool_timeout_seconds
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.time())
+            started_at = time.perf_counter()
+            call_timeout = asyncio.timeout(max(timeout, 0.0))  # 超时后取消工具调用
+            try:
+                if name not in tools_by_name:
+                    raise ValueError(f'工具 {name} 不存在，可用工具：{", ".join(tools_by_name)}')
+                async with call_timeout:
+                    message = await tools_by_name[name].ainvoke({**tool_call, 'type': 'tool_call'}, config)
+            except Exception as error:
+                if isinstance(error, TimeoutError) and call_timeout.expired():  # 工具自身抛出的超时按工具错误返回
+                    content = f'Error: 工具 {name} 超时（{max(timeout, 0.0):.1f} 秒），已取消'
+                else:
+                    content = f'Error: {error!r}\n Please fix your mistakes.'
+                message = ToolMessage(content=content, name=name, tool_call_id=tool_call_id, status='error')
+            message.response_metadata['duration_seconds'] = time.perf_counter() - started_at
+            return message
+
+    tool_calls = state.messages[-1].tool_calls
+    return {'messages': list(await asyncio.gather(*(run_tool_call(tool_call) for tool_call in tool_calls)))}
+
+
 # ---------- 主图相关 ----------
+async def context_compaction_node(
+    state, llm: BaseChatModel, context_token_budget: int, context_keep_tokens: int
+) -> dict:
+    '''节点，上下文压缩。未摘要的消息超出 Token 预算时，将较早的消息增量折叠进滚动摘要，只保留不超过 context_keep_tokens 的最近消息；摘要和已摘要消息数记录在主图状态中，随检查点保存。
+    LLM 不应绑定工具，否则可能以工具调用回答而没有摘要文本；摘要为空时保持原状，不丢弃已折叠的历史'''
+    unsummarized_messages = state.messages[state.summarized_message_count :]
+    if estimate_tokens(unsummarized_messages) <= context_token_budget:
+        return {}
+
+    boundary = find_compaction_boundary(state.messages, state.summarized_message_count, context_keep_tokens)
+    if boundary <= state.summarized_message_count:
+        return {}
+    try:
+        chain = await create_summary_chain(llm)
+        summary = await chain.ainvoke(
+            {
+                'summary': state.context_summary or '无',
+                'messages': format_messages_for_summary(state.messages[state.summarized_message_count : boundary]),
+            }
+        )
+    except:  # 摘要失败时保持原状，各节点仍按 Token 预算截取最近消息
+        return {}
+    if not summary.strip():
+        return {}
+    return {'context_summary': summary.strip(), 'summarized_message_count': boundary}
+
+
+async def memory_retrieval_node(
+    state, config: RunnableConfig, store: BaseStore | None = None, top_k: int = 3, timeout_seconds: float | None = None
+) -> dict:
+    '''节点，情景记忆检索。用最新的用户消息在 ('memories', 用户 ID) 中检索最相似的 top_k 条情景记忆，格式化后记录在主图状态中；与意图分类在同一步中并发运行，记忆仓库未就绪，检索超时或失败时不附加记忆'''
+    latest_human_message = next((m for m in reversed(state.messages) if isinstance(m, HumanMessage)), None)
+    user_id = config.get('configurable', {}).get('langgraph_user_id')
+    if store is None or top_k <= 0 or latest_human_message is None or user_id is None:
+        return {'episode_memories': ''}
+    try:
+        items = await asyncio.wait_for(
+            store.asearch(('memories', user_id), query=latest_human_message.text(), limit=top_k), timeout_seconds
+        )
+    except TimeoutError:
+        logger.warning(f'<memory_retrieval_node> 情景记忆检索超过 {timeout_seconds} 秒，本轮不附加记忆')
+        return {'episode_memories': ''}
+    except Exception:  # 取消不在此捕获，被取消的轮次照常停止
+        logger.warning('<memory_retrieval_node> 情景记忆检索失败，本轮不附加记忆', exc_info=True)
+        return {'episode_memories': ''}
+    return {'episode_memories': format_episode_memories(items)}
+
+
 async def intent_classifier_entry_node(state) -> dict:
     '''节点，意图分类器入口，意图路由器入口。'''
     return {}
 
 
-async def intent_classifier_node(state, llm: BaseChatModel) -> IntentClassification:
-    '''伪节点，意图分类器，意图路由器。传入 LLM，创建意图分类链，填充 messages，返回意图类别'''
+async def intent_classifier_node(
+    state, llm: BaseChatModel, context_token_budget: int | None = None
+) -> IntentClassification:
+    '''伪节点，意图分类器，意图路由器。传入 LLM，创建意图分类链，填充不超过 Token 预算的最近消息，返回意图类别'''
     try:
         chain = await create_intent_classifier_chain(llm)
-        classification = await chain.ainvoke({'messages': state.messages})
+        classification = await chain.ainvoke(
+            {'messages': select_recent_messages(state.messages, context_token_budget)}
+        )
         return classification.intent
     except:
         return IntentClassification.ReactGraphAdapterNode
 
 
-async def react_graph_adapter_node(state, react_graph) -> dict:
-    '''节点，ReAct 图适配器。从主图状态适配 ReAct 图状态，运行 ReAct 图得到回复，返回到回复草稿'''
+async def react_graph_adapter_node(
+    state, react_graph, is_reuse_draft=False, max_turn_seconds: float | None = None
+) -> dict:
+    '''节点，ReAct 图适配器。从主图状态适配 ReAct 图状态，运行 ReAct 图得到回复，返回到回复草稿。只传入摘要和未摘要的消息。检索到的情景记忆附加到系统提示词中，复用草稿时，将被驳回的草稿和反思意见也附加到系统提示词中。反思驳回后的重试受本轮剩余耗时约束，超时时保留上一版草稿'''
     # ！！！！！是否需要确保每次调用 ReAct 之前，显示设置图状态各项均为空，然后传入新的状态
-    react_state = await react_graph.ainvoke(
-        {
-            'system_prompt': state.system_prompt,
-            'user_name': state.user_name,
-            'ai_name': state.ai_name,
-            'chat_language': state.chat_language,
-            'messages': state.messages,
-        }
-    )
+    system_prompt = state.system_prompt + state.episode_memories
+    is_retry = (
+        state.introspection == IntrospectionClassification.IntentClassifierEntryNode and state.response_draft
+    )  # 反思驳回后的重试，已有上一版草稿可以兜底
+    if is_reuse_draft and is_retry:  # 在上一版草稿的基础上改进，而不是从头开始
+        critique = state.introspection_critique or '无'
+        system_prompt += (
+            f'\n你的上一版回复未能满足用户的意图和要求。\n上一版回复：<<<{state.response_draft.content}>>>'
+            f'\n反思意见：<<<{critique}>>>\n请在上一版回复的基础上改进。'
+        )
+    timeout = None  # 第一版草稿没有兜底，只受工具调用截止时间约束
+    if is_retry and max_turn_seconds is not None and state.turn_started_at:
+        timeout = state.turn_started_at + max_turn_seconds - time.time()
+        if timeout <= 0:
+            return {'introspection_budget_exhausted': True}
+    try:
+        async with asyncio.timeout(timeout) as turn_timeout:  # 超时后取消 ReAct 图
+            react_state = await react_graph.ainvoke(
+                {
+                    'system_prompt': system_prompt,
+                    'user_name': state.user_name,
+                    'ai_name': state.ai_name,
+                    'chat_language': state.chat_language,
+                    'context_summary': state.context_summary,
+                    'messages': state.messages[state.summarized_message_count :],  # 已折叠进摘要的消息不再传入
+                    'turn_started_at': state.turn_started_at,
+                }
+            )
+    except TimeoutError:
+        if not turn_timeout.expired():  # ReAct 图内部抛出的超时，不是本轮耗时预算耗尽
+            raise
+        return {'introspection_budget_exhausted': True}  # 保留上一版草稿，反思分类器入口随后直接接受
     return {'response_draft': react_state.get('messages')[-1]}  # ！！！！！为什么使用的是 get
 
 
-async def introspection_classifier_entry_node(state) -> dict:
-    '''空节点，反思分类器入口，反思路由器入口。'''
-    return {}
-
+async def introspection_classifier_entry_node(
+    state,
+    llm: BaseChatModel,
+    max_introspection_count: int,
+    max_turn_seconds: float,
+    context_token_budget: int | None = None,
+) -> dict:
+    '''节点，反思分类器入口。检查本轮反思预算（次数，耗时），在预算内运行反思链，记录反思类别，反思意见和反思次数；预算耗尽时直接接受草稿'''
+    introspection_count = state.introspection_count + 1
+    elapsed = time.time() - state.turn_started_at if state.turn_started_at else 0.0
+    if introspection_count > max_introspection_count or elapsed >= max_turn_seconds:  # 预算耗尽，不再调用 LLM
+        return {
+            'introspection': IntrospectionClassification.AddFinalResponseNode,
+            'introspection_count': introspection_count - 1,
+            'introspection_budget_exhausted': True,
+        }
 
-async def introspection_node(state, llm: BaseChatModel) -> IntrospectionClassification:
-    '''伪节点，反思分类器，反思路由器。传入 LLM，创建反思链，填充 messages 和 response_draft，返回反思类别'''
     try:
         chain = await create_introspection_classifier_chain(llm)
-        classification = await chain.ainvoke({'messages': state.messages, 'response_draft': state.response_draft})
-        return classification.introspection
+        classification = await chain.ainvoke(
+            {
+                'messages': select_recent_messages(state.messages, context_token_budget),
+                'response_draft': state.response_draft,
+            }
+        )
+        introspection, critique = classification.introspection, classification.critique
     except:
-        return IntrospectionClassification.AddFinalResponseNode
+        introspection, critique = IntrospectionClassification.AddFinalResponseNode, None
+    return {
+        'introspection': introspection,
+        'introspection_critique': critique,
+        'introspection_count': introspection_count,
+    }
+
+
+async def introspection_node(state) -> IntrospectionClassification:
+    '''伪节点，反思路由器。读取反思分类器入口记录的反思类别并返回'''
+    return state.introspection or IntrospectionClassification.AddFinalResponseNode
 
 
 async def add_final_response_node(state) -> dict:
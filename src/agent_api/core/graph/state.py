@@ -4,6 +4,8 @@ from langchain_core.messages import AIMessage, BaseMessage
 from langgraph.graph.message import add_messages
 from pydantic import BaseModel
 
+from .type import IntrospectionClassification
+
 
 class MainState(BaseModel):
     '''图状态，主图状态，共享数据结构'''
@@ -18,6 +20,20 @@ class MainState(BaseModel):
     # add_messages 追加合并两个消息列表或通过 ID 更新现有消息
     response_draft: AIMessage | None  # 回复草稿
 
+    # 上下文压缩，随检查点保存，跨轮累积
+    context_summary: str = ''  # 滚动摘要，messages[:summarized_message_count] 的摘要
+    summarized_message_count: int = 0  # 已折叠进摘要的消息数
+
+    # 情景记忆，每轮对话由记忆检索节点更新
+    episode_memories: str = ''  # 与最新用户消息相似的情景记忆，附加到系统提示词中
+
+    # 反思预算，每轮对话开始时重置
+    turn_started_at: float | None = None  # 本轮开始时间戳
+    introspection_count: int = 0  # 本轮已反思次数
+    introspection: IntrospectionClassification | None = None  # 最近一次反思类别
+    introspection_critique: str | None = None  # 最近一次反思意见
+    introspection_budget_exhausted: bool = False  # 本轮反思预算是否耗尽
+
 
 class ReActState(BaseModel):
     '''图状态，ReAct 图状态，共享数据结构'''
@@ -27,3 +43,5 @@ class ReActState(BaseModel):
     ai_name: str  # AI 名
     chat_language: str  # 对话语言
     messages: Annotated[list[BaseMessage], add_messages]  # 上下文
+    context_summary: str = ''  # 更早对话的摘要
+    turn_started_at: float | None = None  # 本轮开始时间戳，用于本轮工具调用截止时间
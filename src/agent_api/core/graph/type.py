@@ -9,6 +9,17 @@ class IntentClassification(str, Enum):
     ReactGraphAdapterNode = 'react_graph_adapter_node'
 
 
+INTENT_EXEMPLARS: dict[IntentClassification, list[str]] = {
+    IntentClassification.ReactGraphAdapterNode: [
+        '你好，我们聊聊天吧',
+        '帮我查一下现在的时间',
+        '今天的天气怎么样',
+        '帮我搜索一下相关资料',
+        '解释一下这个问题',
+    ]
+}  # 意图范例，本地意图分类器通过与范例的相似度进行快速分类，新增意图类别时需要补充范例
+
+
 class Intent(BaseModel):  # BaseModel 数据模型基类，把外部数据通过类型注解，校验，生成强类型对象，并可序列化回去
     '''数据模型，意图'''
 
@@ -26,6 +37,9 @@ class Introspection(BaseModel):
     '''数据模型，反思'''
 
     introspection: IntrospectionClassification
+    critique: str = Field(
+        default='', description='回复内容不能满足用户的意图和要求时，说明不足之处与改进建议，否则为空'
+    )
 
 
 # --------- 记忆相关 ----------
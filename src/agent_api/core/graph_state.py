@@ -0,0 +1,36 @@
+import time
+
+
+def create_graph_state_event(node_path, node_name, output, duration_seconds, kind='node'):
+    '''创建图状态事件。只保存节点输出的引用，格式化推迟到面板显示时'''
+    return {
+        'kind': kind,  # 'node' 节点更新，'turn' 本轮统计
+        'node': node_name,
+        'path': node_path,
+        'timestamp': time.time(),
+        'duration_seconds': duration_seconds,  # 节点更新：距上一次更新的时间，近似节点耗时；本轮统计：本轮耗时
+        'output': output,
+    }
+
+
+def format_graph_state_event(event):
+    '''格式化图状态事件。'''
+    output = event['output']
+    if event['kind'] == 'turn':
+        is_budget_exhausted = '是' if output['introspection_budget_exhausted'] else '否'
+        return (
+            f'-------------------- 本轮统计 --------------------\n'
+            f'反思次数：{output["introspection_count"]}/{output["max_introspection_count"]}\n'
+            f'耗时：{event["duration_seconds"]:.2f}/{output["max_turn_seconds"]} 秒\n'
+            f'预算耗尽：{is_budget_exhausted}'
+        )
+
+    node_message = (
+        f'-------------------- {event["path"]} ({event["duration_seconds"] * 1000:.0f} ms) --------------------\n'
+    )
+    if output is None:
+        return node_message + '---------- None ----------'
+    for value in output.values():
+        for i in value if isinstance(value, list) else [value]:
+            node_message += f'{type(i).__name__}({i!r})\n'  # 类名加 repr，显示消息的全部字段
+    return node_message.rstrip('\n')
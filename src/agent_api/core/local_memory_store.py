@@ -0,0 +1,510 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from langgraph.store.base import BaseStore, GetOp, Item, ListNamespacesOp, PutOp, SearchItem, SearchOp
+from langgraph.store.base.embed import ensure_embeddings, get_text_at_path, tokenize_path
+
+from .metrics import InstrumentedStoreMixin
+
+
+# ---------- 过滤相关 ----------
+def _compare_values(item_value, filter_value) -> bool:
+    '''辅助，比较条目值与过滤值。与 InMemoryStore 和 postgres 记忆仓库的 JSONB 语义相同：嵌套字典逐键比较，$ 开头的键为运算符'''
+    if isinstance(filter_value, dict):
+        if any(key.startswith('$') for key in filter_value):
+            return all(_apply_operator(item_value, operator, value) for operator, value in filter_value.items())
+        if not isinstance(item_value, dict):
+            return False
+        return all(_compare_values(item_value.get(key), value) for key, value in filter_value.items())
+    if isinstance(filter_value, (list, tuple)):
+        return (
+            isinstance(item_value, (list, tuple))
+            and len(item_value) == len(filter_value)
+            and all(_compare_values(i, f) for i, f in zip(item_value, filter_value))
+        )
+    return item_value == filter_value
+
+
+def _apply_operator(value, operator: str, operand) -> bool:
+    '''辅助，应用比较运算符。'''
+    if operator == '$eq':
+        return value == operand
+    if operator == '$ne':
+        return value != operand
+    if operator == '$gt':
+        return float(value) > float(operand)
+    if operator == '$gte':
+        return float(value) >= float(operand)
+    if operator == '$lt':
+        return float(value) < float(operand)
+    if operator == '$lte':
+        return float(value) <= float(operand)
+    raise ValueError(f'不支持的运算符：{operator}')
+
+
+def _does_match(match_condition, namespace: tuple[str, ...]) -> bool:
+    '''辅助，命名空间是否满足匹配条件。前缀或后缀匹配，'*' 匹配任意一段'''
+    path = match_condition.path
+    if len(namespace) < len(path):
+        return False
+    if match_condition.match_type == 'prefix':
+        pairs = zip(namespace, path)
+    elif match_condition.match_type == 'suffix':
+        pairs = zip(reversed(namespace), reversed(path))
+    else:
+        raise ValueError(f'不支持的匹配类型：{match_condition.match_type}')
+    return all(p == '*' or n == p for n, p in pairs)
+
+
+class LocalVectorStore(BaseStore):
+    '''本地记忆仓库。实现 BaseStore 接口，不需要 postgres 服务，用于单机桌面部署和无外部服务的测试
+
+    - 条目和向量行号存在 SQLite 文件 metadata.db 中；
+    - 向量存在内存映射的 float32 矩阵文件 vectors.f32 中，每个 (条目, 字段) 一行，删除后空出的行由后续写入复用；
+    - 近似最近邻检索使用 IVF 倒排索引：向量数达到 ivf_min_vectors 后用球面 k-means 训练 sqrt(n) 个聚类中心，
+      检索只计算最近的 ivf_probe_count 个聚类中的向量，向量数翻倍时重新训练；候选向量少于 ivf_min_vectors 时精确检索。
+    同一批次中的全部写入一次调用嵌入模型。同步方法可在任意线程中调用，异步方法在线程中读写文件，不阻塞事件循环
+    '''
+
+    supports_ttl = False
+    metadata_file_name = 'metadata.db'
+    vector_file_name = 'vectors.f32'
+    centroid_file_name = 'centroids.npy'
+    min_capacity = 1024  # 向量矩阵文件的最少行数，写满时容量翻倍
+
+    def __init__(self, path, *, index, ivf_min_vectors=4096, ivf_probe_count=8):
+        self.path = path
+        self.index_config = index
+        self.embeddings = ensure_embeddings(index['embed'])
+        self.dims = index['dims']
+        self.distance_type = index.get('distance_type', 'cosine')  # 'cosine'，'inner_product'，'l2'
+        self._fields = [
+            (field, '$' if field == '$' else tokenize_path(field)) for field in index.get('fields') or ['$']
+        ]
+        self._ivf_min_vectors = ivf_min_vectors
+        self._ivf_probe_count = ivf_probe_count
+        self._lock = threading.RLock()  # 事件循环的线程和反思工作线程都会读写
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, self.metadata_file_name), check_same_thread=False)
+        self._conn.executescript(
+            '''
+                CREATE TABLE IF NOT EXISTS store (
+                    prefix TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (prefix, key)
+                );
+                CREATE TABLE IF NOT EXISTS store_vectors (
+                    row INTEGER PRIMARY KEY,
+                    prefix TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    field_name TEXT NOT NULL,
+                    list_id INTEGER NOT NULL DEFAULT -1
+                );
+                CREATE INDEX IF NOT EXISTS store_vectors_item_idx ON store_vectors (prefix, key);
+                CREATE INDEX IF NOT EXISTS store_vectors_list_idx ON store_vectors (list_id, prefix, key);
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            '''
+        )
+        meta = dict(self._conn.execute('SELECT name, value FROM store_meta').fetchall())
+        if 'dims' in meta and int(meta['dims']) != self.dims:
+            raise ValueError(f'本地记忆仓库的向量维度为 {meta["dims"]}，与配置的 {self.dims} 不一致')
+        self._conn.execute("INSERT OR IGNORE INTO store_meta (name, value) VALUES ('dims', ?)", (str(self.dims),))
+        self._conn.commit()
+        self._trained_count = int(meta.get('trained_count', 0))  # 上次训练 IVF 时的向量数
+
+        rows = self._conn.execute('SELECT row, list_id FROM store_vectors ORDER BY row').fetchall()
+        self._row_count = rows[-1][0] + 1 if rows else 0  # 使用过的行数，其中空出的行在 _free_rows 中
+        used = {row for row, _ in rows}
+        self._free_rows = [row for row in range(self._row_count) if row not in used]
+        self._vectors = None
+        self._open_vectors(max(self.min_capacity, self._row_count))
+        self._row_lists = np.full(len(self._vectors), -1, dtype=np.int32)  # 行 -> 聚类 ID，未分配为 -1
+        for row, list_id in rows:
+            self._row_lists[row] = list_id
+        centroid_path = os.path.join(path, self.centroid_file_name)
+        self._centroids = np.load(centroid_path) if os.path.exists(centroid_path) and self._trained_count else None
+
+    # ---------- BaseStore ----------
+    def batch(self, ops):
+        ops = list(ops)
+        puts, embed_requests, queries = self._prepare(ops)
+        document_vectors = (
+            self.embeddings.embed_documents([text for _, _, text in embed_requests]) if embed_requests else []
+        )
+        query_vectors = {query: self.embeddings.embed_query(query) for query in queries}
+        return self._execute(ops, puts, embed_requests, document_vectors, query_vectors)
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        puts, embed_requests, queries = self._prepare(ops)
+        document_vectors = (
+            await self.embeddings.aembed_documents([text for _, _, text in embed_requests]) if embed_requests else []
+        )
+        query_vectors = dict(
+            zip(queries, await asyncio.gather(*(self.embeddings.aembed_query(query) for query in queries)))
+        )
+        return await asyncio.to_thread(self._execute, ops, puts, embed_requests, document_vectors, query_vectors)
+
+    def run(self, fn):
+        '''在元数据库中运行 fn(连接)。持有锁，成功时提交，失败时回滚；供同一数据库中的其他表使用，如待办反思任务队列'''
+        with self._lock:
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            return result
+
+    async def arun(self, fn):
+        '''在线程中运行 run()，不阻塞事件循环'''
+        return await asyncio.to_thread(self.run, fn)
+
+    def close(self):
+        '''写回向量矩阵，关闭数据库。'''
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            self._conn.close()
+
+    # ---------- 批次 ----------
+    def _prepare(self, ops):
+        '''整理批次。返回 (去重后的写入 {(命名空间, 键): PutOp}，需要嵌入的 [((命名空间, 键), 字段名, 文本)]，去重后的查询文本)'''
+        puts = {}
+        for op in ops:
+            if isinstance(op, PutOp):
+                puts[(op.namespace, op.key)] = op  # 同一批次中同一条目只保留最后一次写入
+        embed_requests = []
+        for (namespace, key), op in puts.items():
+            if op.value is None or op.index is False:
+                continue
+            paths = self._fields if op.index is None else [(field, tokenize_path(field)) for field in op.index]
+            for path, field in paths:
+                texts = get_text_at_path(op.value, field)
+                if len(texts) > 1:
+                    embed_requests.extend(((namespace, key), f'{path}.{i}', text) for i, text in enumerate(texts))
+                elif texts:
+                    embed_requests.append(((namespace, key), path, texts[0]))
+        queries = list(dict.fromkeys(op.query for op in ops if isinstance(op, SearchOp) and op.query))
+        return puts, embed_requests, queries
+
+    def _execute(self, ops, puts, embed_requests, document_vectors, query_vectors):
+        '''执行批次。先读取再写入，与 postgres 记忆仓库相同'''
+        with self._lock:
+            results = []
+            for op in ops:
+                if isinstance(op, GetOp):
+                    results.append(self._get(op))
+                elif isinstance(op, SearchOp):
+                    results.append(self._search(op, query_vectors.get(op.query)))
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(op))
+                elif isinstance(op, PutOp):
+                    results.append(None)
+                else:
+                    raise ValueError(f'不支持的操作：{type(op)}')
+            if puts:
+                self._apply_puts(puts, embed_requests, document_vectors)
+            return results
+
+    # ---------- 写入 ----------
+    def _apply_puts(self, puts, embed_requests, document_vectors):
+        '''写入条目和向量。旧向量行空出复用，向量矩阵写回后再提交数据库；失败时回滚数据库，恢复向量和内存中的行分配'''
+        now = datetime.now(timezone.utc).isoformat()
+        vectors_by_item = {}
+        for (item, field_name, _), vector in zip(embed_requests, document_vectors):
+            vectors_by_item.setdefault(item, []).append((field_name, vector))
+
+        free_rows, row_count = list(self._free_rows), self._row_count
+        changed_rows = {}  # 本批次之前已有的行 -> (修改前的聚类 ID, 修改前的向量)
+
+        def remember(row):
+            if row < row_count and row not in changed_rows:
+                changed_rows[row] = (int(self._row_lists[row]), self._vectors[row].copy())
+
+        try:
+            for (namespace, key), op in puts.items():
+                prefix = '.'.join(namespace)
+                freed = [
+                    row
+                    for (row,) in self._conn.execute(
+                        'SELECT row FROM store_vectors WHERE prefix = ? AND key = ?', (prefix, key)
+                    ).fetchall()
+                ]
+                if freed:
+                    self._conn.execute('DELETE FROM store_vectors WHERE prefix = ? AND key = ?', (prefix, key))
+                    for row in freed:
+                        remember(row)
+                    self._row_lists[freed] = -1
+                    self._free_rows.extend(freed)
+                if op.value is None:
+                    self._conn.execute('DELETE FROM store WHERE prefix = ? AND key = ?', (prefix, key))
+                    continue
+                self._conn.execute(
+                    'INSERT INTO store (prefix, key, value, created_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (prefix, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at',
+                    (prefix, key, json.dumps(op.value, ensure_ascii=False), now, now),
+                )
+                vector_rows = []
+                for field_name, vector in vectors_by_item.get((namespace, key), []):
+                    row = self._allocate_row()
+                    remember(row)
+                    self._vectors[row] = self._prepare_vector(np.asarray(vector, dtype=np.float32))
+                    list_id = (
+                        -1
+                        if self._centroids is None
+                        else int(np.argmax(self._centroids @ self._normalize(self._vectors[row])))
+                    )
+                    self._row_lists[row] = list_id
+                    vector_rows.append((row, prefix, key, field_name, list_id))
+                self._conn.executemany(
+                    'INSERT INTO store_vectors (row, prefix, key, field_name, list_id) VALUES (?, ?, ?, ?, ?)',
+                    vector_rows,
+                )
+            self._vectors.flush()
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            for row, (list_id, vector) in changed_rows.items():
+                self._row_lists[row] = list_id
+                self._vectors[row] = vector
+            self._row_lists[row_count : self._row_count] = -1  # 本批次新增的行
+            self._free_rows, self._row_count = free_rows, row_count
+            raise
+
+        vector_count = self._row_count - len(self._free_rows)
+        if vector_count >= self._ivf_min_vectors and (
+            self._centroids is None or vector_count >= 2 * self._trained_count
+        ):
+            self._train_ivf()
+
+    def _allocate_row(self):
+        '''分配向量行。优先复用空出的行，向量矩阵写满时容量翻倍'''
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._row_count >= len(self._vectors):
+            self._open_vectors(len(self._vectors) * 2)
+            row_lists = np.full(len(self._vectors), -1, dtype=np.int32)
+            row_lists[: len(self._row_lists)] = self._row_lists
+            self._row_lists = row_lists
+        self._row_count += 1
+        return self._row_count - 1
+
+    def _open_vectors(self, capacity):
+        '''打开向量矩阵文件。文件小于 capacity 行时先扩大'''
+        path = os.path.join(self.path, self.vector_file_name)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None  # 先释放映射，Windows 上映射中的文件不能改变大小
+        size = capacity * self.dims * 4
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() < size:
+                file.truncate(size)
+            capacity = max(capacity, file.tell() // (self.dims * 4))
+        self._vectors = np.memmap(path, dtype=np.float32, mode='r+', shape=(capacity, self.dims))
+
+    def _prepare_vector(self, vector):
+        '''余弦距离时保存归一化向量，检索时直接点积'''
+        return self._normalize(vector) if self.distance_type == 'cosine' else vector
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    # ---------- IVF 索引 ----------
+    def _train_ivf(self, iterations=10, sample_per_list=64):
+        '''训练 IVF 索引。在抽样向量上运行球面 k-means，再把全部向量分配到最近的聚类'''
+        rows = np.array(
+            [row for (row,) in self._conn.execute('SELECT row FROM store_vectors ORDER BY row').fetchall()],
+            dtype=np.int64,
+        )
+        list_count = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(rows, min(len(rows), list_count * sample_per_list), replace=False))
+        sample = self._normalize(np.asarray(self._vectors[sample_rows]))
+        centroids = sample[rng.choice(len(sample), list_count, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            is_empty = ~sums.any(axis=1)  # 空聚类保留原中心
+            sums[is_empty] = centroids[is_empty]
+            centroids = self._normalize(sums)
+
+        list_ids = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), 65536):  # 分块计算，不把整个矩阵读入内存
+            chunk = rows[start : start + 65536]
+            list_ids[start : start + len(chunk)] = np.argmax(
+                self._normalize(np.asarray(self._vectors[chunk])) @ centroids.T, axis=1
+            )
+        try:
+            self._conn.executemany(
+                'UPDATE store_vectors SET list_id = ? WHERE row = ?', zip(list_ids.tolist(), rows.tolist())
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (name, value) VALUES ('trained_count', ?)", (str(len(rows)),)
+            )
+            np.save(os.path.join(self.path, self.centroid_file_name), centroids)
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._row_lists[rows] = list_ids  # 提交后再更新内存中的聚类分配
+        self._centroids = centroids
+        self._trained_count = len(rows)
+
+    # ---------- 读取 ----------
+    def _get(self, op):
+        row = self._conn.execute(
+            'SELECT value, created_at, updated_at FROM store WHERE prefix = ? AND key = ?',
+            ('.'.join(op.namespace), op.key),
+        ).fetchone()
+        if row is None:
+            return None
+        return self._create_item(Item, '.'.join(op.namespace), op.key, *row)
+
+    def _search(self, op, query_vector):
+        '''搜索条目。有查询时按向量相似度排序，同一条目取各字段的最高分；没有查询时按更新时间倒序'''
+        condition, parameters = self._prefix_condition(op.namespace_prefix)
+        if query_vector is None:
+            sql = f'SELECT prefix, key, value, created_at, updated_at FROM store WHERE {condition} ORDER BY updated_at DESC'
+            if not op.filter:
+                sql += ' LIMIT ? OFFSET ?'
+                parameters = (*parameters, op.limit, op.offset)
+            items = [self._create_item(SearchItem, *row) for row in self._conn.execute(sql, parameters).fetchall()]
+            if op.filter:
+                items = [item for item in items if self._is_match(item.value, op.filter)][
+                    op.offset : op.offset + op.limit
+                ]
+            return items
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        items = None
+        if op.filter:  # 先按条目过滤，再只计算通过过滤的条目的向量
+            vector_rows = self._conn.execute(
+                f'SELECT row, prefix, key FROM store_vectors WHERE {condition}', parameters
+            ).fetchall()
+            items = {
+                (row[0], row[1]): row
+                for row in self._conn.execute(
+                    f'SELECT prefix, key, value, created_at, updated_at FROM store WHERE {condition}', parameters
+                ).fetchall()
+                if self._is_match(json.loads(row[2]), op.filter)
+            }
+            vector_rows = [row for row in vector_rows if (row[1], row[2]) in items]
+            if self._centroids is not None and len(vector_rows) >= self._ivf_min_vectors:
+                probe = set(self._probe_lists(query).tolist())
+                vector_rows = [row for row in vector_rows if self._row_lists[row[0]] in probe]
+        elif (
+            self._centroids is not None
+            and self._conn.execute(f'SELECT count(*) FROM store_vectors WHERE {condition}', parameters).fetchone()[0]
+            >= self._ivf_min_vectors
+        ):  # 按 list_id 索引只读取探测的聚类中的向量行
+            probe = self._probe_lists(query).tolist()
+            vector_rows = self._conn.execute(
+                f'SELECT row, prefix, key FROM store_vectors '
+                f'WHERE list_id IN ({", ".join("?" * len(probe))}) AND {condition}',
+                (*probe, *parameters),
+            ).fetchall()
+        else:
+            vector_rows = self._conn.execute(
+                f'SELECT row, prefix, key FROM store_vectors WHERE {condition}', parameters
+            ).fetchall()
+        if not vector_rows:
+            return []
+
+        rows = np.array([row for row, _, _ in vector_rows], dtype=np.int64)
+        candidates = np.argsort(rows)  # 按行号顺序读取内存映射
+        scores = self._score(query, np.asarray(self._vectors[rows[candidates]]))
+
+        kept = []  # [(分数, 前缀, 键)]
+        seen = set()
+        for index in np.argsort(-scores):
+            _, prefix, key = vector_rows[candidates[index]]
+            if (prefix, key) in seen:
+                continue
+            seen.add((prefix, key))
+            kept.append((float(scores[index]), prefix, key))
+            if len(kept) >= op.offset + op.limit:
+                break
+        kept = kept[op.offset :]
+
+        if items is None and kept:
+            conditions = ' OR '.join(['(prefix = ? AND key = ?)'] * len(kept))
+            items = {
+                (row[0], row[1]): row
+                for row in self._conn.execute(
+                    f'SELECT prefix, key, value, created_at, updated_at FROM store WHERE {conditions}',
+                    [value for _, prefix, key in kept for value in (prefix, key)],
+                ).fetchall()
+            }
+        return [self._create_item(SearchItem, *items[(prefix, key)], score=score) for score, prefix, key in kept]
+
+    def _probe_lists(self, query):
+        '''与查询最近的 ivf_probe_count 个聚类'''
+        return np.argsort(-(self._centroids @ self._normalize(query)))[: self._ivf_probe_count]
+
+    def _score(self, query, vectors):
+        '''相似度分数，越大越相似'''
+        if self.distance_type == 'cosine':
+            return vectors @ self._normalize(query)
+        if self.distance_type == 'inner_product':
+            return vectors @ query
+        return -np.linalg.norm(vectors - query, axis=1)
+
+    def _list_namespaces(self, op):
+        namespaces = [
+            tuple(prefix.split('.'))
+            for (prefix,) in self._conn.execute('SELECT DISTINCT prefix FROM store').fetchall()
+        ]
+        if op.match_conditions:
+            namespaces = [
+                namespace
+                for namespace in namespaces
+                if all(_does_match(condition, namespace) for condition in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = {namespace[: op.max_depth] for namespace in namespaces}
+        return sorted(namespaces)[op.offset : op.offset + op.limit]
+
+    @staticmethod
+    def _prefix_condition(namespace_prefix):
+        '''命名空间前缀的 SQL 条件。前缀本身或以 "前缀." 开头的命名空间'''
+        if not namespace_prefix:
+            return '1 = 1', ()
+        prefix = '.'.join(namespace_prefix)
+        return '(prefix = ? OR substr(prefix, 1, ?) = ?)', (prefix, len(prefix) + 1, prefix + '.')
+
+    @staticmethod
+    def _is_match(value, filter):
+        return all(_compare_values(value.get(key), filter_value) for key, filter_value in filter.items())
+
+    @staticmethod
+    def _create_item(item_class, prefix, key, value, created_at, updated_at, **kwargs):
+        return item_class(
+            namespace=tuple(prefix.split('.')),
+            key=key,
+            value=json.loads(value) if isinstance(value, str) else value,
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+            **kwargs,
+        )
+
+
+class InstrumentedLocalVectorStore(InstrumentedStoreMixin, LocalVectorStore):
+    '''计时的本地记忆仓库'''
@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import traceback
+
+import anyio
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, Tool
+
+from ..utils import create_logger
+
+logger = create_logger(is_use_file_handler=True, log_path='agent.log')
+
+
+_UNSENT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+)  # 写入请求时连接已断开，请求未发出，服务器没有执行
+_CONNECTION_ERRORS = _UNSENT_ERRORS + (anyio.EndOfStream, ConnectionError)  # 会话连接已断开时调用工具抛出的异常
+
+
+def _is_connection_error(error):
+    '''判断异常是否为会话连接断开。'''
+    if isinstance(error, _CONNECTION_ERRORS):
+        return True
+    return isinstance(error, McpError) and error.error.code == CONNECTION_CLOSED
+
+
+def _is_idempotent_tool(tool):
+    '''判断工具是否声明为只读或幂等，重复执行没有副作用。'''
+    annotations = tool.annotations
+    return annotations is not None and bool(annotations.readOnlyHint or annotations.idempotentHint)
+
+
+class MCPServerSession:
+    '''MCP 服务器长连接会话。一个后台任务持有会话上下文（stdio 子进程只启动一次），工具调用复用该会话，空闲超过健康检查间隔时先 ping，连接断开时重连；
+    请求未发出就断开，或工具声明为只读/幂等时重试一次，否则服务器可能已执行，直接抛出异常
+
+    提供与 ClientSession 相同的 call_tool 接口，可直接传给 convert_mcp_tool_to_langchain_tool 作为会话
+    '''
+
+    def __init__(self, client, server_name, health_check_seconds=30.0, ping_timeout_seconds=5.0, metrics=None):
+        self._client = client
+        self.server_name = server_name
+        self._health_check_seconds = health_check_seconds  # 空闲超过该时长后，调用工具前先 ping 检查连接
+        self._ping_timeout_seconds = ping_timeout_seconds
+        self._metrics = metrics
+
+        self._session = None  # 当前 ClientSession
+        self._owner_task = None  # 持有会话上下文的后台任务，会话上下文必须在同一个任务中进入和退出
+        self._ready = None  # 会话已初始化或连接失败
+        self._closing = None  # 通知后台任务退出会话上下文
+        self._connect_error = None
+        self._connect_lock = asyncio.Lock()
+        self._last_ok_at = 0.0  # 最近一次成功通信的时间
+        self._generation = 0  # 连接代数，每次连接成功加一，并发调用遇到同一次断开时只重连一次
+        self.idempotent_tool_names = set()  # 声明为只读或幂等的工具，请求发出后断开也可重试
+
+    @property
+    def is_connected(self):
+        '''会话是否可用。'''
+        return self._session is not None and self._owner_task is not None and not self._owner_task.done()
+
+    async def get_session(self):
+        '''获取会话。未连接时连接，空闲过久时先做健康检查，检查失败则重连'''
+        session, _ = await self._get_session()
+        return session
+
+    async def _get_session(self):
+        '''获取会话和连接代数。'''
+        async with self._connect_lock:
+            if self.is_connected and time.monotonic() - self._last_ok_at > self._health_check_seconds:
+                if not await self._ping():
+                    logger.debug(f'<MCPServerSession.get_session> {self.server_name} 健康检查失败，重连')
+                    await self._disconnect()
+                    self._increment('agent_mcp_reconnects_total')
+            if not self.is_connected:
+                await self._connect()
+            return self._session, self._generation
+
+    async def call_tool(self, name, arguments, **kwargs):
+        '''调用工具。连接断开时重连，请求未发出或工具幂等时重试一次'''
+        session, generation = await self._get_session()
+        try:
+            result = await session.call_tool(name, arguments, **kwargs)
+        except Exception as error:
+            if not _is_connection_error(error):
+                raise
+            if not isinstance(error, _UNSENT_ERRORS) and name not in self.idempotent_tool_names:
+                logger.debug(
+                    f'<MCPServerSession.call_tool> {self.server_name} 请求发出后连接断开，服务器可能已执行，不重试 {name}'
+                )
+                await self._discard(generation)  # 下次调用时重连
+                raise
+            logger.debug(f'<MCPServerSession.call_tool> {self.server_name} 连接已断开，重连后重试 {name}')
+            await self.reconnect(generation)
+            result = await (await self.get_session()).call_tool(name, arguments, **kwargs)
+        self._last_ok_at = time.monotonic()
+        return result
+
+    async def list_tools(self):
+        '''列出全部工具。按游标翻页'''
+        session = await self.get_session()
+        tools = []
+        cursor = None
+        while True:
+            result = await session.list_tools(cursor=cursor)
+            tools.extend(result.tools)
+            cursor = result.nextCursor
+            if not cursor:
+                break
+        self._last_ok_at = time.monotonic()
+        return tools
+
+    async def reconnect(self, generation=None):
+        '''重连。传入调用时的连接代数时，若其他调用已经重连过则不再断开新会话'''
+        async with self._connect_lock:
+            if generation is not None and generation != self._generation:
+                if not self.is_connected:
+                    await self._connect()
+                return
+            await self._disconnect()
+            self._increment('agent_mcp_reconnects_total')
+            await self._connect()
+
+    async def _discard(self, generation):
+        '''断开出错的会话，下次获取会话时重连。其他调用已经重连过时不断开新会话'''
+        async with self._connect_lock:
+            if generation == self._generation and self._owner_task is not None:
+                await self._disconnect()
+                self._increment('agent_mcp_reconnects_total')
+
+    async def close(self):
+        '''关闭会话。'''
+        async with self._connect_lock:
+            await self._disconnect()
+
+    async def _connect(self):
+        '''连接。启动后台任务进入会话上下文，等待会话初始化完成'''
+        logger.debug(f'<MCPServerSession._connect> 连接 MCP 服务器 {self.server_name}')
+        started_at = time.perf_counter()
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._connect_error = None
+        self._owner_task = asyncio.create_task(self._hold_session())
+        await self._ready.wait()
+        if self._connect_error is not None:
+            error, self._connect_error = self._connect_error, None
+            raise error
+        self._generation += 1
+        self._last_ok_at = time.monotonic()
+        if self._metrics is not None:
+            self._metrics.observe(
+                'agent_mcp_connect_duration_seconds', time.perf_counter() - started_at, server=self.server_name
+            )
+
+    async def _hold_session(self):
+        '''持有会话上下文，直到被通知关闭或连接断开。'''
+        try:
+            async with self._client.session(self.server_name) as session:
+                self._session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as error:
+            if not self._ready.is_set():
+                self._connect_error = error
+            else:
+                logger.debug(
+                    f'<MCPServerSession._hold_session> {self.server_name} 会话异常退出\n' + traceback.format_exc()
+                )
+        finally:
+            self._session = None
+            self._ready.set()
+
+    async def _disconnect(self):
+        '''断开。通知后台任务退出会话上下文，关闭 stdio 子进程'''
+        if self._owner_task is None:
+            return
+        logger.debug(f'<MCPServerSession._disconnect> 断开 MCP 服务器 {self.server_name}')
+        self._closing.set()
+        try:
+            await self._owner_task
+        except asyncio.CancelledError:
+            pass
+        self._owner_task = None
+        self._session = None
+
+    async def _ping(self):
+        '''健康检查。'''
+        try:
+            await asyncio.wait_for(self._session.send_ping(), self._ping_timeout_seconds)
+        except Exception:
+            return False
+        self._last_ok_at = time.monotonic()
+        return True
+
+    def _increment(self, name):
+        if self._metrics is not None:
+            self._metrics.increment(name, server=self.server_name)
+
+
+class MCPSessionPool:
+    '''MCP 会话池。每个服务器一个长连接会话，工具复用会话调用；工具 schema 缓存到磁盘，缓存命中时无需启动服务器即可加载工具
+
+    与 MultiServerMCPClient.get_tools() 的区别：后者每次列出工具和每次调用工具都会新建会话（stdio 传输即新建子进程）
+    '''
+
+    def __init__(
+        self, connections, schema_cache_path=None, health_check_seconds=30.0, ping_timeout_seconds=5.0, metrics=None
+    ):
+        self._connections = connections
+        self._client = MultiServerMCPClient(connections)
+        self._schema_cache_path = schema_cache_path  # 工具 schema 缓存文件路径，为空时不缓存
+        self._sessions = {
+            server_name: MCPServerSession(
+                self._client,
+                server_name,
+                health_check_seconds=health_check_seconds,
+                ping_timeout_seconds=ping_timeout_seconds,
+                metrics=metrics,
+            )
+            for server_name in connections
+        }
+
+    def session(self, server_name):
+        '''获取服务器会话。'''
+        return self._sessions[server_name]
+
+    def load_cached_tools(self):
+        '''从缓存加载工具。任一服务器缓存缺失或连接配置已变化时返回 None'''
+        cache = self._read_schema_cache()
+        schemas = {}
+        for server_name in self._sessions:
+            entry = cache.get(server_name)
+            if not entry or entry.get('key') != self._connection_key(server_name):
+                return None
+            schemas[server_name] = [Tool.model_validate(tool) for tool in entry['tools']]
+        return self._create_tools(schemas)
+
+    async def load_tools(self):
+        '''连接所有服务器并列出工具，更新缓存。返回 (工具列表，schema 是否与缓存不同)'''
+        server_names = list(self._sessions)
+        results = await asyncio.gather(*(self._sessions[server_name].list_tools() for server_name in server_names))
+        schemas = dict(zip(server_names, results))
+
+        cache = self._read_schema_cache()
+        changed = False
+        for server_name, tools in schemas.items():
+            entry = {
+                'key': self._connection_key(server_name),
+                'tools': [tool.model_dump(mode='json', by_alias=True, exclude_none=True) for tool in tools],
+            }
+            if cache.get(server_name) != entry:
+                cache[server_name] = entry
+                changed = True
+        if changed:
+            self._write_schema_cache(cache)
+        return self._create_tools(schemas), changed
+
+    async def close(self):
+        '''关闭所有会话。'''
+        await asyncio.gather(*(session.close() for session in self._sessions.values()), return_exceptions=True)
+
+    def _create_tools(self, schemas):
+        '''创建 LangChain 工具。工具通过长连接会话调用，记录各会话中可安全重试的工具'''
+        for server_name, tools in schemas.items():
+            self._sessions[server_name].idempotent_tool_names = {
+                tool.name for tool in tools if _is_idempotent_tool(tool)
+            }
+        return [
+            convert_mcp_tool_to_langchain_tool(self._sessions[server_name], tool)
+            for server_name, tools in schemas.items()
+            for tool in tools
+        ]
+
+    def _connection_key(self, server_name):
+        '''连接配置摘要。连接配置变化时缓存失效'''
+        connection = json.dumps(self._connections[server_name], sort_keys=True, default=str)
+        return hashlib.sha256(connection.encode('utf-8')).hexdigest()
+
+    def _read_schema_cache(self):
+        if not self._schema_cache_path or not os.path.exists(self._schema_cache_path):
+            return {}
+        try:
+            with open(self._schema_cache_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            logger.debug('<MCPSessionPool._read_schema_cache> 工具 schema 缓存损坏，忽略\n' + traceback.format_exc())
+            return {}
+
+    def _write_schema_cache(self, cache):
+        '''写入缓存。先写临时文件再替换，避免读到写了一半的文件'''
+        if not self._schema_cache_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self._schema_cache_path))
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = self._schema_cache_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(cache, file, ensure_ascii=False, indent=2)
+        os.replace(temporary_path, self._schema_cache_path)
@@ -0,0 +1,149 @@
+import asyncio
+import sys
+import threading
+
+from langgraph.store.base import BaseStore, PutOp
+from langgraph.store.postgres import AsyncPostgresStore
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from .metrics import InstrumentedStoreMixin
+
+
+class InstrumentedAsyncPostgresStore(InstrumentedStoreMixin, AsyncPostgresStore):
+    '''计时的异步 postgres 记忆仓库'''
+
+
+class MemoryStoreEventLoop:
+    '''记忆仓库事件循环。连接池和记忆仓库都属于该事件循环
+
+    psycopg 异步连接不支持 Windows 默认的 ProactorEventLoop，而 MCP stdio 子进程又需要 ProactorEventLoop，
+    Windows 上在独立线程中运行 SelectorEventLoop；其他平台直接使用调用方的事件循环
+    '''
+
+    def __init__(self, is_own_thread=None):
+        self._loop = None
+        self._thread = None
+        if sys.platform == 'win32' if is_own_thread is None else is_own_thread:
+            self._loop = asyncio.SelectorEventLoop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name='memory_store_loop', daemon=True)
+            self._thread.start()
+
+    async def run(self, coroutine):
+        '''在记忆仓库事件循环中运行协程。调用方被取消时同时取消协程'''
+        if self._loop is None:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self._loop))
+
+    def close(self):
+        '''停止事件循环线程。'''
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+
+class EventLoopBoundStore(BaseStore):
+    '''绑定记忆仓库事件循环的记忆仓库。异步方法在记忆仓库事件循环中运行；同步方法由 AsyncPostgresStore 提交到该事件循环，只能在事件循环之外的线程中调用
+
+    只含写入的批次先攒批：write_batch_seconds 内到达的写入（反思一次写入的多条记忆各自调用 put()）合并为一次 abatch()，
+    嵌入模型一次嵌入全部文本，store 和 store_vectors 各一条多行 INSERT；攒满 max_write_batch_size 条时立即写入
+    '''
+
+    def __init__(
+        self,
+        store: AsyncPostgresStore,
+        event_loop: MemoryStoreEventLoop,
+        write_batch_seconds: float = 0.0,
+        max_write_batch_size: int = 64,
+    ):
+        self.store = store
+        self.event_loop = event_loop
+        self._write_batch_seconds = write_batch_seconds  # 写入攒批的等待时间，为 0 时不攒批
+        self._max_write_batch_size = max_write_batch_size
+        self._pending_writes = []  # 待写入的 (操作列表, Future)，只在记忆仓库事件循环中访问
+        self._pending_write_count = 0
+        self._flush_handle = None
+        self._write_tasks = set()  # 正在写入的任务，保留引用
+
+    @property
+    def conn(self):
+        '''异步连接池。'''
+        return self.store.conn
+
+    async def run(self, coroutine):
+        '''在记忆仓库事件循环中运行协程。直接通过连接池执行的 SQL 用它调用'''
+        return await self.event_loop.run(coroutine)
+
+    def batch(self, ops):
+        ops = list(ops)
+        if not self._is_write_batch(ops):
+            return self.store.batch(ops)
+        return asyncio.run_coroutine_threadsafe(self._abatch_writes(ops), self.store.loop).result()
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        if not self._is_write_batch(ops):
+            return await self.event_loop.run(self.store.abatch(ops))
+        return await self.event_loop.run(self._abatch_writes(ops))
+
+    def _is_write_batch(self, ops):
+        return self._write_batch_seconds > 0 and bool(ops) and all(isinstance(op, PutOp) for op in ops)
+
+    async def _abatch_writes(self, ops):
+        '''攒批写入。在记忆仓库事件循环中运行，等待所在批次写入完成'''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_writes.append((ops, future))
+        self._pending_write_count += len(ops)
+        if self._pending_write_count >= self._max_write_batch_size:
+            self._flush_writes()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._write_batch_seconds, self._flush_writes)
+        await asyncio.shield(future)  # 调用方取消时批次照常写入
+        return [None] * len(ops)
+
+    def _flush_writes(self):
+        '''取出待写入的批次，在后台任务中一次写入'''
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending_writes, self._pending_write_count = self._pending_writes, [], 0
+        if pending:
+            task = asyncio.create_task(self._write(pending))
+            self._write_tasks.add(task)
+            task.add_done_callback(self._write_tasks.discard)
+
+    async def _write(self, pending):
+        ops = [
+            op for batch_ops, _ in pending for op in batch_ops
+        ]  # 同一 (命名空间, 键) 的多次写入由 AsyncPostgresStore 保留最后一次
+        try:
+            await self.store.abatch(ops)
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for _, future in pending:
+                if not future.done():
+                    future.set_result(None)
+
+
+def create_memory_connection_pool(config):
+    '''创建记忆仓库异步连接池。不立即打开，由调用方 await pool.open()
+
+    连接参数与 AsyncPostgresStore.from_conn_string() 相同（自动提交，字典行），连接池大小，获取连接超时和预备语句阈值由配置决定
+    '''
+    return AsyncConnectionPool(
+        config.postgres_connection_string,
+        min_size=config.postgres_pool_min_size,
+        max_size=config.postgres_pool_max_size,
+        timeout=config.postgres_pool_timeout_seconds,
+        kwargs={'autocommit': True, 'prepare_threshold': config.postgres_prepare_threshold, 'row_factory': dict_row},
+        name='memory_store',  # 指标中的连接池名
+        open=False,
+    )
@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from .checkpoint import DeltaAsyncSqliteSaver
+
+
+class MetricsRegistry:
+    '''指标注册表。进程内记录直方图（耗时等分布）和计数器（Token 数等累计值），支持快照，Prometheus 文本和 JSON 导出'''
+
+    def __init__(self, max_samples=2048):
+        self._max_samples = max_samples  # 每个序列保留的最近样本数，用于计算分位数
+        self._histograms = {}  # (名字，标签) -> {'count', 'sum', 'min', 'max', 'samples'}
+        self._counters = defaultdict(float)  # (名字，标签) -> 累计值
+        self._lock = threading.Lock()  # 检查点和回调可能在不同线程中记录
+
+    def observe(self, name, value, **labels):
+        '''记录一个直方图样本。'''
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {
+                    'count': 0,
+                    'sum': 0.0,
+                    'min': value,
+                    'max': value,
+                    'samples': deque(maxlen=self._max_samples),
+                }
+                self._histograms[key] = histogram
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['min'] = min(histogram['min'], value)
+            histogram['max'] = max(histogram['max'], value)
+            histogram['samples'].append(value)
+
+    def increment(self, name, value=1, **labels):
+        '''增加计数器。'''
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def samples(self, name, **labels):
+        '''获取直方图最近的样本。'''
+        histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+        return list(histogram['samples']) if histogram else []
+
+    def reset(self):
+        '''清空所有指标。'''
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        '''快照。返回 {'histograms': [...], 'counters': [...]}，分位数根据最近样本计算'''
+        with self._lock:
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': h['count'],
+                    'sum': h['sum'],
+                    'mean': h['sum'] / h['count'],
+                    'min': h['min'],
+                    'max': h['max'],
+                    'p50': percentile(h['samples'], 50),
+                    'p90': percentile(h['samples'], 90),
+                    'p99': percentile(h['samples'], 99),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {'histograms': histograms, 'counters': counters}
+
+    def to_json(self):
+        '''导出为 JSON 文本。'''
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        '''导出为 Prometheus 文本格式。直方图导出为 summary，计数器导出为 counter'''
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        for h in snapshot['histograms']:
+            if h['name'] not in declared:
+                declared.add(h['name'])
+                lines.append(f'# TYPE {h["name"]} summary')
+            for quantile, key in (('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99')):
+                labels = _format_labels({**h['labels'], 'quantile': quantile})
+                lines.append(f'{h["name"]}{labels} {h[key]}')
+            lines.append(f'{h["name"]}_sum{_format_labels(h["labels"])} {h["sum"]}')
+            lines.append(f'{h["name"]}_count{_format_labels(h["labels"])} {h["count"]}')
+        for c in snapshot['counters']:
+            if c['name'] not in declared:
+                declared.add(c['name'])
+                lines.append(f'# TYPE {c["name"]} counter')
+            lines.append(f'{c["name"]}{_format_labels(c["labels"])} {c["value"]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, format='prometheus'):
+        '''导出到文件。format 为 'prometheus' 或 'json'，先写临时文件再替换，避免读到写了一半的文件'''
+        text = self.to_json() if format == 'json' else self.to_prometheus()
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temporary_path, path)
+
+
+def percentile(values, p):
+    '''分位数，线性插值'''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def _format_labels(labels):
+    '''格式化 Prometheus 标签。'''
+    if not labels:
+        return ''
+    escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for k, v in labels.items()}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped.items()) + '}'
+
+
+class MetricsCallbackHandler(AsyncCallbackHandler):
+    '''
+    指标回调。记录到指标注册表：
+    agent_node_duration_seconds{node}：节点耗时，包括主图节点和 ReAct 子图的 chat_node，tool_node
+    agent_llm_duration_seconds{node}，agent_llm_time_to_first_token_seconds{node}：LLM 调用耗时和首 Token 延迟（流式调用时）
+    agent_llm_input_tokens_total{node}，agent_llm_output_tokens_total{node}：LLM 输入输出 Token 数（模型返回 usage_metadata 时）
+    agent_tool_duration_seconds{tool}：工具调用耗时
+    '''
+
+    def __init__(self, metrics: MetricsRegistry):
+        self._metrics = metrics
+        self._starts = {}  # run_id -> (类别，标签值，开始时间)
+        self._first_token_run_ids = set()  # 已记录首 Token 延迟的 LLM 调用
+
+    async def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs
+    ):
+        name = kwargs.get('name')
+        if metadata and name and name == metadata.get('langgraph_node'):  # 只记录节点本身，忽略节点内部的链
+            self._starts[run_id] = ('node', name, time.perf_counter())
+
+    async def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id)
+
+    async def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id)
+
+    async def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs
+    ):
+        node = (metadata or {}).get('langgraph_node', '')
+        self._starts[run_id] = ('llm', node, time.perf_counter())
+
+    async def on_llm_new_token(self, token, *, run_id, parent_run_id=None, **kwargs):
+        start = self._starts.get(run_id)
+        if start and run_id not in self._first_token_run_ids:
+            self._first_token_run_ids.add(run_id)
+            self._metrics.observe(
+                'agent_llm_time_to_first_token_seconds', time.perf_counter() - start[2], node=start[1]
+            )
+
+    async def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        start = self._starts.get(run_id)
+        if start:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                    if usage:
+                        self._metrics.increment(
+                            'agent_llm_input_tokens_total', usage.get('input_tokens', 0), node=start[1]
+                        )
+                        self._metrics.increment(
+                            'agent_llm_output_tokens_total', usage.get('output_tokens', 0), node=start[1]
+                        )
+        self._end(run_id)
+
+    async def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._starts[run_id] = ('tool', serialized.get('name'), time.perf_counter())
+
+    async def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id)
+
+    async def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id)
+
+    def _end(self, run_id):
+        start = self._starts.pop(run_id, None)
+        self._first_token_run_ids.discard(run_id)
+        if not start:
+            return
+        kind, label, started_at = start
+        duration = time.perf_counter() - started_at
+        if kind == 'node':
+            self._metrics.observe('agent_node_duration_seconds', duration, node=label)
+        elif kind == 'llm':
+            self._metrics.observe('agent_llm_duration_seconds', duration, node=label)
+        else:
+            self._metrics.observe('agent_tool_duration_seconds', duration, tool=label)
+
+
+class InstrumentedCheckpointerMixin:
+    '''检查点计时混入。记录 agent_checkpoint_write_duration_seconds{kind}，kind 为 aput（完整检查点）或 aput_writes（中间写入）'''
+
+    def __init__(self, *args, metrics: MetricsRegistry | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    async def aput(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().aput(*args, **kwargs)
+        finally:
+            if self.metrics:
+                self.metrics.observe(
+                    'agent_checkpoint_write_duration_seconds', time.perf_counter() - start, kind='aput'
+                )
+
+    async def aput_writes(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().aput_writes(*args, **kwargs)
+        finally:
+            if self.metrics:
+                self.metrics.observe(
+                    'agent_checkpoint_write_duration_seconds', time.perf_counter() - start, kind='aput_writes'
+                )
+
+
+class InstrumentedStoreMixin:
+    '''记忆仓库计时混入。记录 agent_memory_store_batch_duration_seconds{op} 和 agent_memory_store_batch_size{op}，op 为批次中的操作类型，混合批次为 mixed'''
+
+    def __init__(self, *args, metrics: MetricsRegistry | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        start = time.perf_counter()
+        try:
+            return await super().abatch(ops)
+        finally:
+            if self.metrics and ops:
+                op_names = {type(op).__name__ for op in ops}
+                op = op_names.pop() if len(op_names) == 1 else 'mixed'
+                self.metrics.observe('agent_memory_store_batch_duration_seconds', time.perf_counter() - start, op=op)
+                self.metrics.observe('agent_memory_store_batch_size', len(ops), op=op)
+
+
+def record_connection_pool_stats(metrics, pool, pool_name):
+    '''记录连接池统计。psycopg_pool 的累计统计（请求数，排队数，等待毫秒数，新建连接数等）取出增量计入计数器，
+    当前连接数，空闲连接数和等待中的请求数作为样本记入直方图 agent_postgres_pool_connections{pool, state}'''
+    stats = pool.pop_stats()  # pop_stats() 返回统计并清零累计值
+    for state in ('pool_size', 'pool_available', 'requests_waiting'):
+        metrics.observe('agent_postgres_pool_connections', stats.pop(state, 0), pool=pool_name, state=state)
+    for name in ('pool_min', 'pool_max'):
+        stats.pop(name, None)
+    for name, value in stats.items():
+        metrics.increment(f'agent_postgres_pool_{name}_total', value, pool=pool_name)
+
+
+class InstrumentedAsyncSqliteSaver(InstrumentedCheckpointerMixin, AsyncSqliteSaver):
+    '''计时的异步 SQLite 文件检查点保存器'''
+
+
+class InstrumentedDeltaAsyncSqliteSaver(InstrumentedCheckpointerMixin, DeltaAsyncSqliteSaver):
+    '''计时的增量异步 SQLite 文件检查点保存器'''
+
+
+class InstrumentedInMemorySaver(InstrumentedCheckpointerMixin, InMemorySaver):
+    '''计时的内存检查点保存器'''
@@ -1,8 +1,8 @@
-from PySide6.QtCore import Qt, QThread, QTimer, Slot
+from PySide6.QtCore import QPersistentModelIndex, Qt, QThread, QTimer, Slot
 from PySide6.QtWidgets import QHBoxLayout, QMessageBox, QVBoxLayout, QWidget
 
 from ..core import Backend
-from .views import ActivityBar, ChatBubble, MainContent, Panel, Sidebar
+from .views import ActivityBar, MainContent, Panel, Sidebar
 from .widgets import Splitter
 
 
@@ -13,7 +13,7 @@ class MainWindow(QWidget):
         super().__init__()
         self.config = config
 
-        self.current_ai_message_bubble: ChatBubble | None = None
+        self.current_ai_message_bubble: QPersistentModelIndex | None = None  # 正在输出的 AI Message 气泡
         self.current_sidebar_index = 0
         self.last_sidebar_size = None
         self.last_panel_size = None
@@ -83,10 +83,15 @@ class MainWindow(QWidget):
         self.mcp_host.input_unready_signal.connect(self.backend_unready)
         self.mcp_host.ai_message_chunk_signal.connect(self.add_ai_message_bubble)
         self.mcp_host.ai_message_chunk_finish_signal.connect(self.ai_message_chunk_finish)
+        self.mcp_host.ai_message_chunk_reset_signal.connect(self.reset_ai_message_bubble)
         self.mcp_host.graph_state_update_signal.connect(self.panel.add_graph_state)
+        self.mcp_host.metrics_update_signal.connect(self.panel.update_metrics)
 
         self.mcp_host.load_chat_signal.connect(self.load_chat_history)
+        self.mcp_host.prepend_chat_signal.connect(self.main_content.prepend_chat_bubbles)
         self.mcp_host.update_chat_history_signal.connect(self.sidebar.update_chat_history_list)
+        self.mcp_host.append_chat_history_signal.connect(self.sidebar.append_chat_history_list)
+        self.mcp_host.chat_history_item_changed_signal.connect(self.sidebar.update_chat_history_item)
 
         self.thread.started.connect(self.mcp_host.start)
         self.thread.started.connect(self.new_chat)
@@ -99,12 +104,14 @@ class MainWindow(QWidget):
 
         self.sidebar.new_chat_clicked.connect(self.new_chat)
         self.sidebar.history_selected.connect(self.load_selected_chat_history)
+        self.sidebar.chat_history_fetch_more_requested.connect(self.mcp_host.load_more_chat_history)
 
         self.sidebar.gpt_sovits_toggled.connect(self.mcp_host.activate_gpt_sovits)
         self.sidebar.mcp_server_toggled.connect(self.mcp_host.activate_mcp_client)
         self.sidebar.llm_changed.connect(self.mcp_host.activate_llm)
 
         self.main_content.transmit_input.connect(self.add_user_message_bubble)
+        self.main_content.older_chat_messages_requested.connect(self.mcp_host.load_older_chat_messages)
         self.main_content.panel_slide_switch_toggled.connect(self.switch_panel)
 
     # --- 槽函数 ---
@@ -126,14 +133,21 @@ class MainWindow(QWidget):
     @Slot(str)
     def add_ai_message_bubble(self, chunk):
         '''添加 AI Messgae 气泡'''
-        if not self.current_ai_message_bubble:
+        if self.current_ai_message_bubble is None:
             self.current_ai_message_bubble = self.main_content.add_chat_bubble('', is_user=False)
-        if self.current_ai_message_bubble:
-            self.current_ai_message_bubble.add_text(chunk)
+        if self.current_ai_message_bubble is not None:
+            self.main_content.add_chat_bubble_text(self.current_ai_message_bubble, chunk)
+
+    @Slot()
+    def reset_ai_message_bubble(self):
+        '''重置 AI Message 气泡'''
+        if self.current_ai_message_bubble is not None:
+            self.main_content.set_chat_bubble_text(self.current_ai_message_bubble, '')
 
     @Slot()
     def ai_message_chunk_finish(self):
         '''AI Message Chunk 结束'''
+        self.main_content.flush_chat_bubble_text()
         self.current_ai_message_bubble = None
         self.main_content.set_input_text_edit_enabled_and_focus(True)
 
@@ -169,6 +183,7 @@ class MainWindow(QWidget):
                 self.activity_bar.update_button_state(-1)
         elif widget is self.panel:
             self.main_content.set_panel_slide_switch_state(widget_visibility)
+            self.panel.set_active(widget_visibility)
 
     @Slot(str)
     def add_user_message_bubble(self, text):
@@ -289,11 +304,10 @@ class MainWindow(QWidget):
     #     else:
     #         event.accept()
 
-    @Slot(list)
-    def load_chat_history(self, history):
-        self.main_content.clear_chat_bubbles()
-        for i in history:
-            self.main_content.add_chat_bubble(i['text'], i['is_user'])
+    @Slot(list, int)
+    def load_chat_history(self, history, start):
+        self.current_ai_message_bubble = None
+        self.main_content.load_chat_bubbles(history, start)
 
     @Slot()
     def new_chat(self):
@@ -0,0 +1,88 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt, Signal, Slot
+
+
+class ChatHistoryListModel(QAbstractListModel):
+    '''会话历史列表模型。按页追加，单条会话变化时只插入或移动该行，不重建整个列表'''
+
+    fetch_more_requested = Signal(str, str)  # 请求加载下一页，(最后一条的 updated_at, 最后一条的 thread_id)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items = []  # [{'thread_id', 'title', 'updated_at'}]，按 updated_at 降序
+        self._rows = {}  # thread_id -> 行号
+        self._has_more = False  # 数据库中是否还有未加载的会话
+        self._is_fetching = False  # 已请求下一页，等待返回
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._items[index.row()]
+        if role == Qt.DisplayRole:
+            return item['title']
+        if role == Qt.UserRole:
+            return item['thread_id']
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        '''视图滚动到底部时询问是否还有更多'''
+        return not parent.isValid() and self._has_more and not self._is_fetching and bool(self._items)
+
+    def fetchMore(self, parent=QModelIndex()):
+        '''请求下一页，数据异步返回后由 append_items 追加'''
+        if not self.canFetchMore(parent):
+            return
+        self._is_fetching = True
+        last_item = self._items[-1]
+        self.fetch_more_requested.emit(last_item['updated_at'], last_item['thread_id'])
+
+    @Slot(list, bool)
+    def reset_items(self, items, has_more):
+        '''重置为第一页'''
+        self.beginResetModel()
+        self._items = []
+        self._rows = {}
+        self._append(items)
+        self._has_more = has_more
+        self._is_fetching = False
+        self.endResetModel()
+
+    @Slot(list, bool)
+    def append_items(self, items, has_more):
+        '''追加下一页，跳过已因变化插入到顶部的会话'''
+        items = [item for item in items if item['thread_id'] not in self._rows]
+        if items:
+            self.beginInsertRows(QModelIndex(), len(self._items), len(self._items) + len(items) - 1)
+            self._append(items)
+            self.endInsertRows()
+        self._has_more = has_more
+        self._is_fetching = False
+
+    @Slot(dict)
+    def upsert_item(self, item):
+        '''会话新建或更新，移动或插入到顶部'''
+        row = self._rows.get(item['thread_id'])
+        if row is None:
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self._items.insert(0, item)
+            self.endInsertRows()
+        else:
+            if row > 0:
+                self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), 0)
+                self._items.insert(0, self._items.pop(row))
+                self.endMoveRows()
+            self._items[0] = item
+            self.dataChanged.emit(self.index(0), self.index(0))
+        self._update_rows(0, row + 1 if row is not None else len(self._items))
+
+    def _append(self, items):
+        start = len(self._items)
+        self._items.extend(items)
+        self._update_rows(start, len(self._items))
+
+    def _update_rows(self, start, end):
+        '''更新 [start, end) 行的行号索引'''
+        for row in range(start, end):
+            self._rows[self._items[row]['thread_id']] = row
@@ -0,0 +1,77 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QPersistentModelIndex, Qt, Signal
+
+
+class ChatMessageListModel(QAbstractListModel):
+    '''会话消息列表模型。只保存纯文本，由委托绘制；打开会话时只有最后一页，滚动到顶部时在前面插入更早的消息'''
+
+    IsUserRole = Qt.UserRole  # 是否为用户消息
+    older_messages_requested = Signal(int)  # 请求更早的消息，参数为已加载的第一条的序号
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages = []  # [{'text', 'is_user'}]
+        self._start = 0  # 已加载的第一条消息在会话中的序号，大于 0 时还有更早的消息
+        self._is_fetching = False  # 已请求更早的消息，等待返回
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message['text']
+        if role == self.IsUserRole:
+            return message['is_user']
+        return None
+
+    @property
+    def has_older(self):
+        '''是否还有未加载的更早消息'''
+        return self._start > 0
+
+    def request_older(self):
+        '''请求更早的消息，数据异步返回后由 prepend_messages 插入'''
+        if self.has_older and not self._is_fetching:
+            self._is_fetching = True
+            self.older_messages_requested.emit(self._start)
+
+    def reset_messages(self, messages, start=0):
+        '''重置为会话的最后一页'''
+        self.beginResetModel()
+        self._messages = [{'text': m['text'], 'is_user': m['is_user']} for m in messages]
+        self._start = start
+        self._is_fetching = False
+        self.endResetModel()
+
+    def prepend_messages(self, messages, start):
+        '''在前面插入更早的消息'''
+        self._is_fetching = False
+        if not messages or start >= self._start:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = [{'text': m['text'], 'is_user': m['is_user']} for m in messages]
+        self._start = start
+        self.endInsertRows()
+
+    def append_message(self, text, is_user):
+        '''在末尾追加消息，返回持久索引，前面插入更早的消息后仍指向该消息'''
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append({'text': text, 'is_user': is_user})
+        self.endInsertRows()
+        return QPersistentModelIndex(self.index(row))
+
+    def append_text(self, index, text):
+        '''在消息末尾追加文本'''
+        if index.isValid():
+            message = self._messages[index.row()]
+            self.set_text(index, message['text'] + text)
+
+    def set_text(self, index, text):
+        '''设置消息文本'''
+        if index.isValid():
+            self._messages[index.row()]['text'] = text
+            model_index = self.index(index.row())
+            self.dataChanged.emit(model_index, model_index)
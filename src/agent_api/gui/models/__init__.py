@@ -0,0 +1,2 @@
+from .ChatHistoryListModel import ChatHistoryListModel
+from .ChatMessageListModel import ChatMessageListModel
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+from PySide6.QtCore import QPointF, QRectF, QSize, Qt
+from PySide6.QtGui import QColor, QTextLayout, QTextOption
+from PySide6.QtWidgets import QStyle, QStyledItemDelegate
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    '''对话气泡委托。代替每条消息一个 QWidget，只绘制可见的消息；文本排版按 (文本, 宽度) 缓存，滚动和重绘时不重新排版'''
+
+    margin = 9  # 气泡与视图边缘的距离
+    spacing = 4  # 气泡之间的距离
+    padding = 8  # 气泡内边距
+    radius = 10  # 气泡圆角
+    max_width_ratio = 0.8  # 气泡最大宽度占视图宽度的比例
+    max_cached_layouts = 512  # 缓存的排版数，超出时淘汰最久未用的
+    colors = {
+        True: (QColor('#0078FF'), QColor('white')),  # 用户消息 (背景, 文字)
+        False: (QColor('#E5E5EA'), QColor('black')),  # AI 消息 (背景, 文字)
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._layouts = OrderedDict()  # (文本, 字体, 宽度) -> (QTextLayout, 文本宽度, 文本高度)
+
+    def sizeHint(self, option, index):
+        _, _, text_height = self._get_layout(index.data(Qt.DisplayRole) or '', option.font, self._text_width(option))
+        return QSize(option.rect.width(), int(text_height) + 2 * self.padding + self.spacing)
+
+    def paint(self, painter, option, index):
+        text = index.data(Qt.DisplayRole) or ''
+        is_user = bool(index.data(Qt.UserRole))
+        layout, text_width, text_height = self._get_layout(text, option.font, self._text_width(option))
+        bubble_width = text_width + 2 * self.padding
+        bubble_height = text_height + 2 * self.padding
+        rect = option.rect
+        x = rect.right() - self.margin - bubble_width if is_user else rect.left() + self.margin
+        bubble_rect = QRectF(x, rect.top() + self.spacing / 2, bubble_width, bubble_height)
+
+        background_color, text_color = self.colors[is_user]
+        painter.save()
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+        painter.setPen(option.palette.highlight().color() if option.state & QStyle.State_Selected else Qt.NoPen)
+        painter.setBrush(background_color)
+        painter.drawRoundedRect(bubble_rect, self.radius, self.radius)
+        painter.setPen(text_color)
+        layout.draw(painter, QPointF(bubble_rect.left() + self.padding, bubble_rect.top() + self.padding))
+        painter.restore()
+
+    def clear_cache(self):
+        '''清空排版缓存'''
+        self._layouts.clear()
+
+    def _text_width(self, option):
+        '''文本可用宽度'''
+        view_width = self.parent().viewport().width() if self.parent() else option.rect.width()
+        return max(int(view_width * self.max_width_ratio) - 2 * (self.margin + self.padding), 1)
+
+    def _get_layout(self, text, font, width):
+        '''获取排版，未缓存时排版并缓存'''
+        key = (text, font.key(), width)
+        cached = self._layouts.get(key)
+        if cached is not None:
+            self._layouts.move_to_end(key)
+            return cached
+
+        layout = QTextLayout(text.replace('\n', '\u2028'), font)  # QTextLayout 只在行分隔符处换行
+        text_option = QTextOption()
+        text_option.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(text_option)
+        text_width = text_height = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            line.setPosition(QPointF(0, text_height))
+            text_height += line.height()
+            text_width = max(text_width, line.naturalTextWidth())
+        layout.endLayout()
+
+        cached = (layout, text_width, text_height)
+        self._layouts[key] = cached
+        while len(self._layouts) > self.max_cached_layouts:
+            self._layouts.popitem(last=False)
+        return cached
@@ -1,11 +1,13 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QListWidget, QListWidgetItem
-from PySide6.QtCore import Signal, Qt, Slot
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QListView
+from PySide6.QtCore import Signal, Qt, Slot, QModelIndex
+from ..models import ChatHistoryListModel
 
 
 class ChatHistoryListView(QWidget):
     '''会话历史列表页面'''
     new_chat_clicked = Signal() # 新会话点击
     history_selected = Signal(str) # 历史选择
+    fetch_more_requested = Signal(str, str) # 请求加载下一页
 
 
     def __init__(self):
@@ -14,24 +16,35 @@ class ChatHistoryListView(QWidget):
         layout.setContentsMargins(5, 5, 5, 5)
 
         new_chat_button = QPushButton('新会话')
-        self.chat_history_list = QListWidget()
+        self.chat_history_model = ChatHistoryListModel(self)
+        self.chat_history_list = QListView()
+        self.chat_history_list.setModel(self.chat_history_model)
+        self.chat_history_list.setUniformItemSizes(True) # 行高一致，视图不必逐行计算尺寸
+        self.chat_history_list.setEditTriggers(QListView.NoEditTriggers)
         layout.addWidget(new_chat_button)
         layout.addWidget(self.chat_history_list)
 
         new_chat_button.clicked.connect(self.new_chat_clicked.emit)
-        self.chat_history_list.itemClicked.connect(self.chat_history_select)
+        self.chat_history_list.clicked.connect(self.chat_history_select)
+        self.chat_history_model.fetch_more_requested.connect(self.fetch_more_requested.emit)
 
-    
-    @Slot(QListWidgetItem)
-    def chat_history_select(self, item):
-        thread_id = item.data(Qt.UserRole)
+
+    @Slot(QModelIndex)
+    def chat_history_select(self, index):
+        thread_id = index.data(Qt.UserRole)
         self.history_selected.emit(thread_id)
 
 
-    @Slot(list)
-    def update_chat_history_list(self, history_list):
-        self.chat_history_list.clear()
-        for i in history_list:
-            item = QListWidgetItem(i['title'])
-            item.setData(Qt.UserRole, i['thread_id'])
-            self.chat_history_list.addItem(item)
\ No newline at end of file
+    @Slot(list, bool)
+    def update_chat_history_list(self, history_list, has_more=False):
+        self.chat_history_model.reset_items(history_list, has_more)
+
+
+    @Slot(list, bool)
+    def append_chat_history_list(self, history_list, has_more):
+        self.chat_history_model.append_items(history_list, has_more)
+
+
+    @Slot(dict)
+    def update_chat_history_item(self, item):
+        self.chat_history_model.upsert_item(item)
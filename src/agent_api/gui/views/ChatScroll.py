@@ -1,32 +1,133 @@
-from PySide6.QtWidgets import QScrollArea, QWidget, QVBoxLayout
-from PySide6.QtCore import Slot
-from .ChatBubble import ChatBubble
+from PySide6.QtWidgets import QListView, QAbstractItemView, QApplication
+from PySide6.QtCore import Slot, Qt, QTimer
+from PySide6.QtGui import QKeySequence
+from ..models import ChatMessageListModel
+from .ChatBubbleDelegate import ChatBubbleDelegate
+
+
+class ChatScroll(QListView):
+    '''对话滚动区。消息由模型保存，委托只绘制可见的消息'''
+    load_older_threshold = 200 # 距离顶部小于该像素数时加载更早的消息
+    flush_interval_ms = 33 # 流式文本刷新间隔，约 30 Hz，期间到达的片段合并后一次写入
 
 
-class ChatScroll(QScrollArea):
-    '''对话滚动区'''
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setWidgetResizable(True)
-        self.setStyleSheet("QScrollArea { border: 2px solid #D3D3D3; }")
+        self.setStyleSheet("QListView { border: 2px solid #D3D3D3; }")
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust) # 宽度变化时重新排版
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        self.chat_message_model = ChatMessageListModel(self)
+        self.chat_bubble_delegate = ChatBubbleDelegate(self)
+        self.setModel(self.chat_message_model)
+        self.setItemDelegate(self.chat_bubble_delegate)
 
-        container = QWidget()
-        self.container_layout = QVBoxLayout(container)
-        self.container_layout.addStretch()
-        self.setWidget(container)
+        self._is_at_bottom = True # 是否停留在底部，新内容到达时跟随滚动
+        self._anchor_distance = None # 在前面插入更早消息前距离底部的像素数，插入后恢复，保持可见内容不动
+        self._pending_chat_bubble = None # 有待写入片段的对话气泡
+        self._pending_texts = [] # 待写入的文本片段
 
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(self.flush_interval_ms)
+        self._flush_timer.timeout.connect(self.flush_chat_bubble_text)
+
+        self.chat_message_model.dataChanged.connect(self._message_changed)
         self.verticalScrollBar().rangeChanged.connect(self.scroll_to_bottom)
+        self.verticalScrollBar().valueChanged.connect(self._scrolled)
 
 
     @Slot(int, int)
     def scroll_to_bottom(self, min_value, max_value):
-        '''滚动到底部'''
-        self.verticalScrollBar().setValue(max_value)
+        '''滚动到底部，向上翻页后保持原位置，用户向上查看时不跟随'''
+        if self._anchor_distance is not None:
+            self.verticalScrollBar().setValue(max_value - self._anchor_distance)
+            self._anchor_distance = None
+        elif self._is_at_bottom:
+            self.verticalScrollBar().setValue(max_value)
+        if max_value == 0:
+            self.chat_message_model.request_older() # 内容不足一屏时继续加载
 
 
     @Slot(str, bool)
     def add_chat_bubble(self, text, is_user):
-        '''添加对话气泡'''
-        chat_bubble = ChatBubble(text, is_user)
-        self.container_layout.insertWidget(self.container_layout.count() - 1, chat_bubble)
-        return chat_bubble
\ No newline at end of file
+        '''添加对话气泡，返回持久索引'''
+        self._is_at_bottom = True
+        return self.chat_message_model.append_message(text, is_user)
+
+
+    def add_chat_bubble_text(self, chat_bubble, text):
+        '''对话气泡增加文本，先放入缓冲，由定时器合并后写入，每个刷新间隔最多排版和重绘一次'''
+        if self._pending_chat_bubble is not None and self._pending_chat_bubble != chat_bubble:
+            self.flush_chat_bubble_text()
+        self._pending_chat_bubble = chat_bubble
+        self._pending_texts.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+
+    def set_chat_bubble_text(self, chat_bubble, text):
+        '''设置对话气泡文本，丢弃该气泡未写入的片段'''
+        if self._pending_chat_bubble == chat_bubble:
+            self._discard_pending_text()
+        self.chat_message_model.set_text(chat_bubble, text)
+
+
+    @Slot()
+    def flush_chat_bubble_text(self):
+        '''把缓冲的片段合并后写入对话气泡'''
+        self._flush_timer.stop()
+        if self._pending_texts:
+            self.chat_message_model.append_text(self._pending_chat_bubble, ''.join(self._pending_texts))
+        self._pending_chat_bubble = None
+        self._pending_texts = []
+
+
+    @Slot(list, int)
+    def reset_chat_bubbles(self, messages, start=0):
+        '''重置对话气泡为会话的最后一页'''
+        self._is_at_bottom = True
+        self._anchor_distance = None
+        self._discard_pending_text()
+        self.chat_bubble_delegate.clear_cache()
+        self.chat_message_model.reset_messages(messages, start)
+
+
+    @Slot(list, int)
+    def prepend_chat_bubbles(self, messages, start):
+        '''在前面插入更早的对话气泡'''
+        scroll_bar = self.verticalScrollBar()
+        self._anchor_distance = scroll_bar.maximum() - scroll_bar.value()
+        self.chat_message_model.prepend_messages(messages, start)
+
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy): # 复制选中的消息
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            texts = [self.chat_message_model.index(row).data(Qt.DisplayRole) for row in rows]
+            QApplication.clipboard().setText('\n\n'.join(texts))
+            return
+        super().keyPressEvent(event)
+
+
+    def _discard_pending_text(self):
+        '''丢弃未写入的片段'''
+        self._flush_timer.stop()
+        self._pending_chat_bubble = None
+        self._pending_texts = []
+
+
+    @Slot()
+    def _message_changed(self):
+        '''消息文本变化后行高可能变化，重新排版'''
+        self.scheduleDelayedItemsLayout()
+
+
+    @Slot(int)
+    def _scrolled(self, value):
+        self._is_at_bottom = value >= self.verticalScrollBar().maximum() - 2
+        if value < self.load_older_threshold:
+            self.chat_message_model.request_older()
@@ -9,6 +9,7 @@ class MainContent(QWidget):
     '''主内容区，对话滚动区，功能栏，输入栏'''
     panel_slide_switch_toggled = Signal(bool) # 面板滑动开关切换
     transmit_input = Signal(str) # 传递输入
+    older_chat_messages_requested = Signal(int) # 请求更早的对话消息
     
 
     def __init__(self, parent=None):
@@ -27,6 +28,7 @@ class MainContent(QWidget):
 
         self.function_bar.panel_slide_switch_toggled.connect(lambda toggled: self.panel_slide_switch_toggled.emit(toggled))
         self.input_bar.transmit_input.connect(lambda input: self.transmit_input.emit(input))
+        self.chat_scroll.chat_message_model.older_messages_requested.connect(self.older_chat_messages_requested.emit)
 
 
     @Slot(str, bool)
@@ -35,6 +37,33 @@ class MainContent(QWidget):
         return self.chat_scroll.add_chat_bubble(text, is_user)
 
 
+    def add_chat_bubble_text(self, chat_bubble, text):
+        '''对话气泡增加文本'''
+        self.chat_scroll.add_chat_bubble_text(chat_bubble, text)
+
+
+    def set_chat_bubble_text(self, chat_bubble, text):
+        '''设置对话气泡文本'''
+        self.chat_scroll.set_chat_bubble_text(chat_bubble, text)
+
+
+    def flush_chat_bubble_text(self):
+        '''立即写入对话气泡缓冲的文本'''
+        self.chat_scroll.flush_chat_bubble_text()
+
+
+    @Slot(list, int)
+    def load_chat_bubbles(self, messages, start=0):
+        '''加载会话的最后一页对话气泡'''
+        self.chat_scroll.reset_chat_bubbles(messages, start)
+
+
+    @Slot(list, int)
+    def prepend_chat_bubbles(self, messages, start):
+        '''在前面插入更早的对话气泡'''
+        self.chat_scroll.prepend_chat_bubbles(messages, start)
+
+
     @Slot(bool)
     def set_panel_slide_switch_state(self, state):
         '''设置面板滑动开关状态'''
@@ -53,9 +82,4 @@ class MainContent(QWidget):
 
 
     def clear_chat_bubbles(self):
-        while self.chat_scroll.container_layout.count() > 1:
-            item = self.chat_scroll.container_layout.takeAt(0)
-            if item:
-                widget = item.widget()
-                if widget:
-                    widget.deleteLater()
\ No newline at end of file
+        self.chat_scroll.reset_chat_bubbles([])
\ No newline at end of file
@@ -1,27 +1,197 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QPlainTextEdit
-from PySide6.QtCore import Slot
+from collections import deque
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QPlainTextEdit, QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox
+from PySide6.QtCore import Slot, QTimer
+from ...core.graph_state import format_graph_state_event
 
 
 class Panel(QWidget):
-    '''面板'''
+    '''面板，图状态页，节点耗时页，指标页'''
+    METRICS_HEADERS = ['指标', '标签', '次数/值', '均值(ms)', 'p50(ms)', 'p90(ms)', 'p99(ms)']
+    NODE_TIMING_HEADERS = ['节点', '次数', '均值(ms)', '最近(ms)', '最大(ms)']
+    flush_interval_ms = 33 # 图状态刷新间隔，约 30 Hz，期间到达的图状态合并后一次追加
+    max_graph_state_events = 500 # 保留的图状态事件数，超出时丢弃最早的
+
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setMinimumWidth(234)
         layout = QVBoxLayout(self)
         layout.setContentsMargins(5, 5, 5, 5)
 
+        self.tab_widget = QTabWidget()
+        layout.addWidget(self.tab_widget)
+
+        self.graph_state_page = QWidget()
+        graph_state_layout = QVBoxLayout(self.graph_state_page)
+        graph_state_layout.setContentsMargins(0, 0, 0, 0)
+        self.node_filter_combo_box = QComboBox()
+        self.node_filter_combo_box.addItem('全部节点', None)
         self.graph_state_plain_text_edit = QPlainTextEdit()
         self.graph_state_plain_text_edit.setReadOnly(True)
-        layout.addWidget(self.graph_state_plain_text_edit)
+        self.graph_state_plain_text_edit.setMaximumBlockCount(self.max_graph_state_events) # 每个事件一个文本块，超出时自动删除最早的
+        graph_state_layout.addWidget(self.node_filter_combo_box)
+        graph_state_layout.addWidget(self.graph_state_plain_text_edit)
+        self.tab_widget.addTab(self.graph_state_page, '图状态')
 
+        self.node_timing_table_widget = QTableWidget(0, len(self.NODE_TIMING_HEADERS))
+        self.node_timing_table_widget.setHorizontalHeaderLabels(self.NODE_TIMING_HEADERS)
+        self.node_timing_table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.node_timing_table_widget.verticalHeader().setVisible(False)
+        self.node_timing_table_widget.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.tab_widget.addTab(self.node_timing_table_widget, '节点耗时')
 
-    @Slot(str)
-    def add_graph_state(self, state):
-        '''添加图状态'''
-        self.graph_state_plain_text_edit.appendPlainText(state)
-        self.graph_state_plain_text_edit.verticalScrollBar().setValue(self.graph_state_plain_text_edit.verticalScrollBar().maximum())
+        self.metrics_table_widget = QTableWidget(0, len(self.METRICS_HEADERS))
+        self.metrics_table_widget.setHorizontalHeaderLabels(self.METRICS_HEADERS)
+        self.metrics_table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.metrics_table_widget.verticalHeader().setVisible(False)
+        self.metrics_table_widget.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.tab_widget.addTab(self.metrics_table_widget, '指标')
+
+        self._graph_state_events = deque(maxlen=self.max_graph_state_events) # 图状态事件环形缓冲
+        self._pending_graph_states = [] # 已到达但未显示的图状态事件
+        self._is_graph_state_dirty = False # 显示内容已过期，需要从环形缓冲重新渲染
+        self._node_timings = {} # 节点 -> {'count', 'total', 'last', 'max'}，单位秒
+        self._is_node_timing_dirty = False
+        self._is_active = True # 面板是否展开，折叠时不渲染
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(self.flush_interval_ms)
+        self._flush_timer.timeout.connect(self.flush_graph_states)
+
+        self.tab_widget.currentChanged.connect(self._schedule_render)
+        self.node_filter_combo_box.currentIndexChanged.connect(self._node_filter_changed)
+
+
+    @Slot(object)
+    def add_graph_state(self, event):
+        '''添加图状态事件，放入环形缓冲，面板显示时由定时器合并后渲染'''
+        self._graph_state_events.append(event)
+        if event['kind'] == 'node':
+            timing = self._node_timings.setdefault(event['node'], {'count': 0, 'total': 0.0, 'last': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += event['duration_seconds']
+            timing['last'] = event['duration_seconds']
+            timing['max'] = max(timing['max'], event['duration_seconds'])
+            self._is_node_timing_dirty = True
+        if self.node_filter_combo_box.findData(event['node']) < 0:
+            self.node_filter_combo_box.addItem(event['node'], event['node'])
+
+        if not self._is_graph_state_dirty:
+            self._pending_graph_states.append(event)
+            if len(self._pending_graph_states) > self.max_graph_state_events: # 长时间未显示，改为显示时从环形缓冲重新渲染
+                self._pending_graph_states = []
+                self._is_graph_state_dirty = True
+        self._schedule_render()
+
+
+    @Slot()
+    def flush_graph_states(self):
+        '''渲染当前页，面板不可见时跳过，显示时再渲染'''
+        self._flush_timer.stop()
+        if not self._is_showing():
+            return
+        current_widget = self.tab_widget.currentWidget()
+        if current_widget is self.graph_state_page:
+            self._render_graph_states()
+        elif current_widget is self.node_timing_table_widget and self._is_node_timing_dirty:
+            self._render_node_timings()
+
+
+    @Slot(bool)
+    def set_active(self, active):
+        '''设置面板是否展开'''
+        self._is_active = active
+        self._schedule_render()
+
+
+    @Slot(dict)
+    def update_metrics(self, snapshot):
+        '''更新指标，直方图显示耗时分布，计数器显示累计值'''
+        rows = []
+        for h in snapshot.get('histograms', []):
+            rows.append([
+                h['name'], self._format_labels(h['labels']), str(h['count']),
+                f'{h["mean"] * 1000:.1f}', f'{h["p50"] * 1000:.1f}', f'{h["p90"] * 1000:.1f}', f'{h["p99"] * 1000:.1f}',
+            ])
+        for c in snapshot.get('counters', []):
+            rows.append([c['name'], self._format_labels(c['labels']), f'{c["value"]:g}', '', '', '', ''])
+
+        self.metrics_table_widget.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.metrics_table_widget.setItem(row, column, QTableWidgetItem(value))
+
+
+    def _format_labels(self, labels):
+        '''格式化标签'''
+        return ', '.join(f'{k}={v}' for k, v in labels.items())
 
 
     def clear_state_log(self):
         '''清空图状态日志'''
-        self.graph_state_plain_text_edit.clear()
\ No newline at end of file
+        self._flush_timer.stop()
+        self._graph_state_events.clear()
+        self._pending_graph_states = []
+        self._is_graph_state_dirty = False
+        self._node_timings = {}
+        self._is_node_timing_dirty = True
+        self.graph_state_plain_text_edit.clear()
+        self._schedule_render()
+
+
+    def _render_graph_states(self):
+        '''渲染图状态，内容未过期时只追加新事件，最早的事件由文本框的最大块数丢弃；切换节点过滤或长时间未显示时从环形缓冲重新渲染'''
+        node_filter = self.node_filter_combo_box.currentData()
+        if self._is_graph_state_dirty:
+            events = [e for e in self._graph_state_events if node_filter is None or e['node'] == node_filter]
+            self.graph_state_plain_text_edit.setPlainText('\n'.join(self._format_graph_state_block(e) for e in events))
+            self._pending_graph_states = []
+            self._is_graph_state_dirty = False
+        else:
+            events = [e for e in self._pending_graph_states if node_filter is None or e['node'] == node_filter]
+            self._pending_graph_states = []
+            if not events:
+                return
+            self.graph_state_plain_text_edit.appendPlainText('\n'.join(self._format_graph_state_block(e) for e in events))
+        self.graph_state_plain_text_edit.verticalScrollBar().setValue(self.graph_state_plain_text_edit.verticalScrollBar().maximum())
+
+
+    def _format_graph_state_block(self, event):
+        '''格式化图状态事件为一个文本块，事件内换行用行分隔符，最大块数按事件计'''
+        return format_graph_state_event(event).replace('\n', '\u2028')
+
+
+    def _render_node_timings(self):
+        '''渲染节点耗时'''
+        rows = [
+            [node, str(t['count']), f'{t["total"] / t["count"] * 1000:.1f}', f'{t["last"] * 1000:.1f}', f'{t["max"] * 1000:.1f}']
+            for node, t in sorted(self._node_timings.items(), key=lambda item: item[1]['total'], reverse=True)
+        ]
+        self.node_timing_table_widget.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.node_timing_table_widget.setItem(row, column, QTableWidgetItem(value))
+        self._is_node_timing_dirty = False
+
+
+    def _is_showing(self):
+        '''面板是否可见'''
+        return self._is_active and self.isVisible()
+
+
+    @Slot()
+    def _schedule_render(self):
+        if self._is_showing() and not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+
+    @Slot(int)
+    def _node_filter_changed(self, index):
+        self._is_graph_state_dirty = True
+        self._schedule_render()
+
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._schedule_render()
\ No newline at end of file
@@ -1,5 +1,5 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QStackedWidget, QListWidgetItem
-from PySide6.QtCore import Signal, Slot
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QStackedWidget
+from PySide6.QtCore import Signal, Slot, QModelIndex
 from .ChatHistoryListView import ChatHistoryListView
 from .SetView import SetView
 
@@ -8,6 +8,7 @@ class Sidebar(QWidget):
     '''侧边栏'''
     new_chat_clicked = Signal() # 新会话点击
     history_selected = Signal(str) # 历史选择
+    chat_history_fetch_more_requested = Signal(str, str) # 请求加载更多会话历史
     gpt_sovits_toggled = Signal(bool) # GPT_SoVITS 切换
     mcp_server_toggled = Signal(bool) # MCP 服务器切换
     llm_changed = Signal(str, str) # LLM 更改
@@ -34,6 +35,7 @@ class Sidebar(QWidget):
 
         self.chat_history_list_view.new_chat_clicked.connect(self.new_chat_clicked.emit)
         self.chat_history_list_view.history_selected.connect(self.history_selected.emit)
+        self.chat_history_list_view.fetch_more_requested.connect(self.chat_history_fetch_more_requested.emit)
 
 
 
@@ -48,14 +50,24 @@ class Sidebar(QWidget):
 
 
 
-    @Slot(QListWidgetItem)
-    def chat_history_select(self, item):
-        self.chat_history_list_view.chat_history_select(item)
+    @Slot(QModelIndex)
+    def chat_history_select(self, index):
+        self.chat_history_list_view.chat_history_select(index)
 
 
-    @Slot(list)
-    def update_chat_history_list(self, history_list):
-        self.chat_history_list_view.update_chat_history_list(history_list)
+    @Slot(list, bool)
+    def update_chat_history_list(self, history_list, has_more=False):
+        self.chat_history_list_view.update_chat_history_list(history_list, has_more)
+
+
+    @Slot(list, bool)
+    def append_chat_history_list(self, history_list, has_more):
+        self.chat_history_list_view.append_chat_history_list(history_list, has_more)
+
+
+    @Slot(dict)
+    def update_chat_history_item(self, item):
+        self.chat_history_list_view.update_chat_history_item(item)
 
 
 
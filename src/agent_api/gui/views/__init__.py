@@ -1,5 +1,5 @@
 from .ActivityBar import ActivityBar
-from .ChatBubble import ChatBubble
+from .ChatBubbleDelegate import ChatBubbleDelegate
 from .ChatScroll import ChatScroll
 from .FunctionBar import FunctionBar
 from .InputBar import InputBar
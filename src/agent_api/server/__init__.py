@@ -0,0 +1 @@
+from .agent_server import AgentServer
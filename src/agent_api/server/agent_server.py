@@ -0,0 +1,218 @@
+import asyncio
+import json
+import traceback
+import uuid
+
+from aiohttp import WSMsgType, web
+
+from ..core.agent import Agent
+from ..utils import create_logger
+
+logger = create_logger(is_use_file_handler=True, log_path='agent_server.log')
+
+
+class AgentServer:
+    '''
+    无界面智能体服务器。不依赖 PySide6，通过 WebSocket 直接驱动 Agent，支持多个客户端并发。
+    GET /metrics 返回 Prometheus 文本格式的指标，GET /metrics.json 返回 JSON 格式的指标。
+    客户端 -> 服务器，JSON 消息：
+        {'type': 'user_message_input', 'input': str, 'thread_id': str | None, 'graph_state_output': bool}
+        thread_id 为空时新建会话，graph_state_output 为真时图状态更新附带节点输出，默认只发送节点名，路径和耗时
+        {'type': 'load_chat', 'thread_id': str, 'before': int | None, 'limit': int | None}  取序号 before 之前的 limit 条消息，
+        before 为空时取最后一页，limit 为 0 时取全部
+        {'type': 'update_chat_history'}
+        {'type': 'load_more_chat_history', 'before': [updated_at, thread_id]}  before 为已加载的最后一条
+        {'type': 'activate_llm', 'platform': str, 'model': str}
+        {'type': 'activate_mcp_client', 'activation': bool}
+    服务器 -> 客户端，JSON 消息：
+        请求相关：thread_created，ai_message_chunk，ai_message_chunk_reset，ai_message_chunk_finish，graph_state_update，
+        turn_finish，load_chat，chat_history_page，error
+        广播：occur_error，graph_ready，input_ready，input_unready，update_chat_history_list，chat_history_item_changed
+    '''
+
+    def __init__(self, config, host='127.0.0.1', port=8765, platform=None, model=None):
+        self._agent = Agent(config)
+        self._agent.add_listener(self)
+
+        self._host = host
+        self._port = port
+        self._platform = platform  # 启动时激活的 LLM 平台
+        self._model = model  # 启动时激活的 LLM
+
+        self._clients = set()  # 已连接的 WebSocket 客户端
+        self._tasks = set()  # 运行中的任务，保持引用防止被回收
+        self._runner = None
+
+    # ---------- 启动与关闭 ----------
+    async def serve_forever(self):
+        '''启动服务器并一直运行，直到被取消'''
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.close()
+
+    async def start(self):
+        '''启动。并发初始化图和激活 LLM，启动 WebSocket 服务'''
+        logger.debug('<start> 启动')
+        startup_tasks = [self._agent.init_graph()]
+        if self._platform and self._model:
+            startup_tasks.append(self._agent.activate_llm(self._platform, self._model))
+        await asyncio.gather(*startup_tasks)  # 两者谁后完成谁编译图，记忆仓库在 Agent 后台初始化
+
+        app = web.Application()
+        app.router.add_get('/ws', self._handle_websocket)
+        app.router.add_get('/metrics', self._handle_metrics)
+        app.router.add_get('/metrics.json', self._handle_metrics_json)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        logger.debug(f'<start> 监听 ws://{self._host}:{self._port}/ws')
+
+    async def close(self):
+        '''关闭。断开所有客户端，取消运行中的任务，清理 Agent'''
+        logger.debug('<close> 关闭')
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for ws in list(self._clients):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        await self._agent.clean()
+
+    # ---------- 连接 ----------
+    async def _handle_websocket(self, request):
+        '''处理 WebSocket 连接。每条消息作为独立任务运行，同一客户端可以同时运行多个会话'''
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.add(ws)
+        logger.debug(f'<_handle_websocket> 客户端连接，当前 {len(self._clients)} 个')
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    self._create_task(self._dispatch(ws, message.data))
+                elif message.type == WSMsgType.ERROR:
+                    logger.error(f'<_handle_websocket> 连接异常：{ws.exception()}')
+        finally:
+            self._clients.discard(ws)
+            logger.debug(f'<_handle_websocket> 客户端断开，当前 {len(self._clients)} 个')
+        return ws
+
+    async def _handle_metrics(self, request):
+        '''处理指标请求。返回 Prometheus 文本格式'''
+        return web.Response(text=self._agent.metrics.to_prometheus(), content_type='text/plain')
+
+    async def _handle_metrics_json(self, request):
+        '''处理指标请求。返回 JSON 格式'''
+        return web.json_response(self._agent.metrics.snapshot())
+
+    async def _dispatch(self, ws, data):
+        '''分发请求。'''
+        try:
+            request = json.loads(data)
+            request_type = request.get('type')
+            if request_type == 'user_message_input':
+                thread_id = request.get('thread_id')
+                if not thread_id:
+                    thread_id = str(uuid.uuid4())
+                    await self._send(ws, {'type': 'thread_created', 'thread_id': thread_id})
+                callbacks = self._create_callbacks(ws, thread_id, bool(request.get('graph_state_output')))
+                await self._agent.user_message_input(request['input'], callbacks, thread_id)
+                await self._send(ws, {'type': 'turn_finish', 'thread_id': thread_id})
+            elif request_type == 'load_chat':
+                history, start = await self._agent.get_chat_messages(
+                    request['thread_id'], request.get('before'), request.get('limit')
+                )
+                await self._send(
+                    ws, {'type': 'load_chat', 'thread_id': request['thread_id'], 'history': history, 'start': start}
+                )
+            elif request_type == 'update_chat_history':
+                await self._agent.update_chat_history()
+            elif request_type == 'load_more_chat_history':
+                history_list, has_more = await self._agent.get_chat_history_page(tuple(request['before']))
+                await self._send(
+                    ws, {'type': 'chat_history_page', 'chat_history_list': history_list, 'has_more': has_more}
+                )  # 只发送给发起请求的客户端，各客户端的滚动位置不同
+            elif request_type == 'activate_llm':
+                await self._agent.activate_llm(request.get('platform'), request.get('model'))
+            elif request_type == 'activate_mcp_client':
+                await self._agent.activate_mcp_client(bool(request.get('activation')))
+            else:
+                await self._send(ws, {'type': 'error', 'error': f'未知请求类型：{request_type}'})
+        except asyncio.CancelledError:
+            raise
+        except:
+            error = traceback.format_exc()
+            await self._send(ws, {'type': 'error', 'error': error})
+            logger.error('<_dispatch>\n' + error)
+
+    # ---------- 辅助 ----------
+    def _create_callbacks(self, ws, thread_id, is_send_graph_state_output=False):
+        '''创建回调。与 Backend 的回调同名，将运行输出发送给发起请求的客户端；节点输出只发送给选择接收的客户端'''
+
+        def create_send_callback(message_type, *keys):
+            async def send(*args):
+                await self._send(ws, {'type': message_type, 'thread_id': thread_id, **dict(zip(keys, args))})
+
+            return send
+
+        async def send_graph_state_update(event):
+            if event['kind'] == 'node' and not is_send_graph_state_output:  # 不序列化节点输出，本轮统计很小，照常发送
+                event = {key: event[key] for key in ('kind', 'node', 'path', 'duration_seconds')}
+            await self._send(ws, {'type': 'graph_state_update', 'thread_id': thread_id, 'event': event})
+
+        return {
+            'ai_message_chunk_signal': create_send_callback('ai_message_chunk', 'chunk'),
+            'ai_message_chunk_finish_signal': create_send_callback('ai_message_chunk_finish'),
+            'ai_message_chunk_reset_signal': create_send_callback('ai_message_chunk_reset'),
+            'graph_state_update_signal': send_graph_state_update,
+        }
+
+    async def _send(self, ws, message):
+        '''发送消息。客户端已断开时忽略'''
+        if not ws.closed:
+            try:
+                await ws.send_json(message, dumps=lambda obj: json.dumps(obj, ensure_ascii=False, default=str))
+            except ConnectionResetError:
+                pass
+
+    def _broadcast_to_clients(self, message):
+        '''广播消息到所有客户端。'''
+        for ws in list(self._clients):
+            self._create_task(self._send(ws, message))
+
+    def _create_task(self, coroutine):
+        '''创建任务并保持引用。'''
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # ---------- 监听与广播 ----------
+    def occur_error_signal_monitor(self, occur_error: str):
+        '''报错监听。'''
+        self._broadcast_to_clients({'type': 'occur_error', 'error': occur_error})
+
+    def graph_ready_signal_monitor(self):
+        '''图准备监听'''
+        self._broadcast_to_clients({'type': 'graph_ready'})
+
+    def input_ready_signal_monitor(self):
+        '''输入准备监听'''
+        self._broadcast_to_clients({'type': 'input_ready'})
+
+    def input_unready_signal_monitor(self):
+        '''输入未准备监听'''
+        self._broadcast_to_clients({'type': 'input_unready'})
+
+    def update_chat_history_list_signal_monitor(self, chat_history_list: list, has_more: bool):
+        '''更新对话历史列表监听'''
+        self._broadcast_to_clients(
+            {'type': 'update_chat_history_list', 'chat_history_list': chat_history_list, 'has_more': has_more}
+        )
+
+    def chat_history_item_changed_signal_monitor(self, chat_history_item: dict):
+        '''对话历史条目变化监听'''
+        self._broadcast_to_clients({'type': 'chat_history_item_changed', 'chat_history_item': chat_history_item})
@@ -1 +1,2 @@
 from .log import create_logger
+from .startup_profile import StartupProfiler
@@ -0,0 +1,104 @@
+import importlib.abc
+import sys
+import time
+
+
+class _TimedLoader:
+    '''计时加载器。代理原加载器，记录 exec_module() 的耗时'''
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter_import()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit_import(module.__name__)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    '''计时查找器。用其余查找器找到模块后，把加载器换成计时加载器'''
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    '''启动耗时分析器。记录每个模块的导入耗时（累计耗时包含其导入的子模块，自身耗时不包含）和各启动阶段的时间点
+
+    与 python -X importtime 相同的口径，但不需要解释器参数，并且可以和启动阶段一起输出
+    '''
+
+    def __init__(self):
+        self._started_at = time.perf_counter()
+        self._finder = None
+        self._stack = []  # 正在导入的模块的 [开始时间, 子模块耗时]
+        self._imports = {}  # 模块名 -> (累计耗时, 自身耗时)
+        self._phases = []  # [(阶段, 距启动的时间)]
+
+    def install(self):
+        '''开始记录导入耗时。应在导入其他模块之前调用'''
+        if self._finder is None:
+            self._finder = _TimedFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        '''停止记录导入耗时。'''
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def mark(self, phase):
+        '''记录启动阶段。'''
+        self._phases.append((phase, time.perf_counter() - self._started_at))
+
+    def report(self, top=30, file=None):
+        '''输出报告。启动阶段，导入耗时按自身耗时降序排列，再按顶层包汇总累计耗时'''
+        file = file or sys.stderr
+        print('========== 启动阶段 ==========', file=file)
+        last = 0.0
+        for phase, at in self._phases:
+            print(f'{at * 1000:10.1f} ms  (+{(at - last) * 1000:8.1f} ms)  {phase}', file=file)
+            last = at
+
+        print(f'========== 导入耗时，自身耗时前 {top} ==========', file=file)
+        print(f'{"自身(ms)":>10}  {"累计(ms)":>10}  模块', file=file)
+        for name, (cumulative, own) in sorted(self._imports.items(), key=lambda item: item[1][1], reverse=True)[:top]:
+            print(f'{own * 1000:10.1f}  {cumulative * 1000:10.1f}  {name}', file=file)
+
+        packages = {}
+        for name, (_, own) in self._imports.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + own
+        print(f'========== 导入耗时，按顶层包汇总前 {top} ==========', file=file)
+        for package, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f'{own * 1000:10.1f}  {package}', file=file)
+
+    def _enter_import(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _exit_import(self, name):
+        started_at, children = self._stack.pop()
+        cumulative = time.perf_counter() - started_at
+        self._imports[name] = (cumulative, cumulative - children)
+        if self._stack:
+            self._stack[-1][1] += cumulative
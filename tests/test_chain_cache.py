@@ -0,0 +1,51 @@
+'''
+链缓存测试。同一个 LLM 只创建一次链，不同的 LLM 和不同的链分别缓存，clear_chain_cache() 后重新创建。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.agent_api.core.graph.assist import assist
+from src.agent_api.core.graph.assist.assist import clear_chain_cache, create_chat_chain, create_summary_chain
+
+
+class ChainCacheTest(unittest.TestCase):
+    def setUp(self):
+        clear_chain_cache()
+        self.addCleanup(clear_chain_cache)
+        self.llm = FakeListChatModel(responses=['a'])
+
+    def test_same_llm_reuses_chain(self):
+        first = asyncio.run(create_chat_chain(self.llm))
+        self.assertIs(asyncio.run(create_chat_chain(self.llm)), first)
+        self.assertIs(first.last, self.llm)
+
+    def test_chains_and_llms_cached_separately(self):
+        other_llm = FakeListChatModel(responses=['b'])
+        chat_chain = asyncio.run(create_chat_chain(self.llm))
+        self.assertIsNot(asyncio.run(create_summary_chain(self.llm)), chat_chain)
+        other_chain = asyncio.run(create_chat_chain(other_llm))
+        self.assertIsNot(other_chain, chat_chain)
+        self.assertIs(other_chain.last, other_llm)
+        self.assertEqual(len(assist._chain_cache), 3)
+
+    def test_clear_invalidates(self):
+        first = asyncio.run(create_chat_chain(self.llm))
+        clear_chain_cache()
+        self.assertEqual(assist._chain_cache, {})
+
+        rebuilt = asyncio.run(create_chat_chain(self.llm))
+        self.assertIsNot(rebuilt, first)
+        self.assertIs(asyncio.run(create_chat_chain(self.llm)), rebuilt)
+
+    def test_cache_keeps_llm_alive(self):
+        asyncio.run(create_chat_chain(self.llm))
+        cached_llm, _ = assist._chain_cache[('create_chat_chain', id(self.llm))]
+        self.assertIs(cached_llm, self.llm)  # 缓存持有 LLM，失效前 id() 不会被新的 LLM 复用
+
+
+if __name__ == '__main__':
+    unittest.main()
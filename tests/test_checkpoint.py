@@ -0,0 +1,156 @@
+'''
+增量检查点保存器测试。用只有一个节点的消息图逐轮写入，比较还原的消息与写入的消息。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import START, MessagesState, StateGraph
+
+from src.agent_api.core.checkpoint import DeltaAsyncSqliteSaver
+
+
+def create_graph_builder():
+    '''每轮在用户消息后追加一条回复，回复 ID 由轮数决定'''
+
+    async def reply(state):
+        return {'messages': [AIMessage(f'reply {len(state["messages"]) // 2}', id=f'ai-{len(state["messages"])}')]}
+
+    graph_builder = StateGraph(MessagesState)
+    graph_builder.add_node('reply', reply)
+    graph_builder.add_edge(START, 'reply')
+    return graph_builder
+
+
+def thread_config(thread_id='thread'):
+    return {'configurable': {'thread_id': thread_id}}
+
+
+async def run_turns(saver, turns, start=0, thread_id='thread'):
+    graph = create_graph_builder().compile(checkpointer=saver)
+    for turn in range(start, start + turns):
+        await graph.ainvoke(
+            {'messages': [HumanMessage(f'question {turn}', id=f'human-{turn}')]}, thread_config(thread_id)
+        )
+    return graph
+
+
+def expected_texts(turns):
+    return [text for turn in range(turns) for text in (f'question {turn}', f'reply {turn}')]
+
+
+class DeltaAsyncSqliteSaverTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._directory.name, 'checkpoints.db')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    async def read_texts(self, saver, thread_id='thread'):
+        checkpoint_tuple = await saver.aget_tuple(thread_config(thread_id))
+        return [message.text() for message in checkpoint_tuple.checkpoint['channel_values']['messages']]
+
+    async def reference_types(self, saver):
+        async with saver.conn.execute(
+            "SELECT type, count(*) FROM checkpoint_blobs WHERE channel = 'messages' GROUP BY type"
+        ) as cursor:
+            return dict(await cursor.fetchall())
+
+    def test_round_trip_beyond_reference_chain(self):
+        turns = DeltaAsyncSqliteSaver.max_reference_chain + 8
+
+        async def run():
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                graph = await run_turns(saver, turns)
+                state = await graph.aget_state(thread_config())
+                self.assertEqual([m.text() for m in state.values['messages']], expected_texts(turns))
+                self.assertEqual(await self.read_texts(saver), expected_texts(turns))
+
+                reference_types = await self.reference_types(saver)
+                self.assertGreaterEqual(reference_types['message_refs'], 2)  # 链长达到上限后重新存完整列表
+                self.assertGreater(reference_types['message_refs_delta'], turns)
+
+                async with saver.conn.execute('SELECT count(*) FROM checkpoint_messages') as cursor:
+                    self.assertEqual((await cursor.fetchone())[0], 2 * turns)  # 每条消息只写入一次
+
+                history = [checkpoint_tuple async for checkpoint_tuple in saver.alist(thread_config(), limit=5)]
+                lengths = [len(t.checkpoint['channel_values']['messages']) for t in history]
+                self.assertEqual(lengths, [2 * turns, 2 * turns - 1, 2 * turns - 2, 2 * turns - 2, 2 * turns - 3])
+
+        self.run_async(run())
+
+    def test_reopen_with_cold_cache(self):
+        async def run():
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                await run_turns(saver, 5)
+
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                self.assertEqual(len(saver._persisted), 0)
+                self.assertEqual(await self.read_texts(saver), expected_texts(5))
+                await run_turns(saver, 3, start=5)
+                self.assertEqual(await self.read_texts(saver), expected_texts(8))
+
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                self.assertEqual(await self.read_texts(saver), expected_texts(8))
+                async with saver.conn.execute("SELECT count(*) FROM checkpoint_messages") as cursor:
+                    self.assertEqual((await cursor.fetchone())[0], 16)  # 重新打开后读取过的消息不重复写入
+
+        self.run_async(run())
+
+    def test_replaced_message_restores_latest_version(self):
+        async def run():
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                graph = await run_turns(saver, 2)
+                await graph.aupdate_state(thread_config(), {'messages': [AIMessage('edited', id='ai-1')]})
+
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                texts = await self.read_texts(saver)
+                self.assertEqual(texts, ['question 0', 'edited', 'question 1', 'reply 1'])
+
+        self.run_async(run())
+
+    def test_reads_legacy_checkpoints(self):
+        async def run():
+            async with AsyncSqliteSaver.from_conn_string(self.db_path) as saver:  # 旧格式，检查点行内联 channel_values
+                await run_turns(saver, 3)
+
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                self.assertEqual(await self.read_texts(saver), expected_texts(3))
+                history = [checkpoint_tuple async for checkpoint_tuple in saver.alist(thread_config())]
+                self.assertTrue(all('messages' in t.checkpoint['channel_values'] for t in history[:-1]))
+
+                await run_turns(saver, 2, start=3)  # 下次写入时按新格式补存
+                self.assertEqual(await self.read_texts(saver), expected_texts(5))
+                reference_types = await self.reference_types(saver)
+                self.assertIn('message_refs', reference_types)
+
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                self.assertEqual(await self.read_texts(saver), expected_texts(5))
+
+        self.run_async(run())
+
+    def test_threads_are_isolated(self):
+        async def run():
+            async with DeltaAsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+                await asyncio.gather(run_turns(saver, 4, thread_id='a'), run_turns(saver, 2, thread_id='b'))
+                self.assertEqual(await self.read_texts(saver, 'a'), expected_texts(4))
+                self.assertEqual(await self.read_texts(saver, 'b'), expected_texts(2))
+
+                await saver.adelete_thread('a')
+                self.assertIsNone(await saver.aget_tuple(thread_config('a')))
+                self.assertEqual(await self.read_texts(saver, 'b'), expected_texts(2))
+
+        self.run_async(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
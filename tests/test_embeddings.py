@@ -0,0 +1,81 @@
+'''
+嵌入缓存测试。同一批中相同文本只嵌入一次，未命中的文本按批调用嵌入模型，查询按规范化文本缓存，最近最少使用的先淘汰。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from src.agent_api.core.embeddings import CachedEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    '''假嵌入模型。向量为文本长度，记录每次调用的文本'''
+
+    def __init__(self):
+        self.document_batches = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.document_batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text))]
+
+
+class CachedEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = RecordingEmbeddings()
+        self.cached = CachedEmbeddings(self.embeddings, max_size=100, batch_size=3)
+
+    def test_documents_deduplicated_within_batch(self):
+        vectors = self.cached.embed_documents(['a', 'bb', 'a', 'ccc', 'bb'])
+        self.assertEqual(vectors, [[1.0], [2.0], [1.0], [3.0], [2.0]])  # 按输入顺序返回，重复文本也有向量
+        self.assertEqual(self.embeddings.document_batches, [['a', 'bb', 'ccc']])
+
+    def test_only_missing_documents_embedded_in_batches(self):
+        self.cached.embed_documents(['a', 'bb'])
+        texts = ['a', 'bb'] + [f'text {i}' for i in range(7)]
+        vectors = self.cached.embed_documents(texts)
+        self.assertEqual(vectors, [[float(len(text))] for text in texts])
+        self.assertEqual([len(batch) for batch in self.embeddings.document_batches], [2, 3, 3, 1])  # 命中的不再嵌入
+
+    def test_async_documents(self):
+        vectors = asyncio.run(self.cached.aembed_documents(['a', 'a', 'bb', 'ccc', 'dddd']))
+        self.assertEqual(vectors, [[1.0], [1.0], [2.0], [3.0], [4.0]])
+        self.assertEqual(self.embeddings.document_batches, [['a', 'bb', 'ccc'], ['dddd']])
+        self.assertEqual(asyncio.run(self.cached.aembed_documents(['dddd'])), [[4.0]])
+        self.assertEqual(len(self.embeddings.document_batches), 2)
+
+    def test_queries_share_cache_by_normalized_text(self):
+        self.assertEqual(self.cached.embed_query('Hello  World'), [12.0])  # 嵌入原文
+        self.assertEqual(self.cached.embed_query(' hello world\n'), [12.0])
+        self.assertEqual(asyncio.run(self.cached.aembed_query('HELLO WORLD')), [12.0])
+        self.assertEqual(self.embeddings.queries, ['Hello  World'])
+
+    def test_queries_and_documents_cached_separately(self):
+        self.cached.embed_query('a')
+        self.cached.embed_documents(['a'])
+        self.assertEqual((self.embeddings.queries, self.embeddings.document_batches), (['a'], [['a']]))
+
+    def test_least_recently_used_evicted(self):
+        cached = CachedEmbeddings(self.embeddings, max_size=2)
+        cached.embed_documents(['a', 'bb'])
+        cached.embed_documents(['a'])  # 命中后成为最近使用
+        cached.embed_documents(['ccc'])  # 淘汰 bb
+        cached.embed_documents(['a', 'bb'])
+        self.assertEqual(self.embeddings.document_batches, [['a', 'bb'], ['ccc'], ['bb']])
+
+    def test_zero_max_size_disables_cache(self):
+        cached = CachedEmbeddings(self.embeddings, max_size=0)
+        cached.embed_documents(['a', 'a'])
+        cached.embed_documents(['a'])
+        self.assertEqual(self.embeddings.document_batches, [['a'], ['a']])  # 同一批中仍去重
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''
+意图路由测试。本地范例分类器和回退到 LLM 意图分类器的条件，LLM 意图分类器用 mock 替代。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import unittest
+from enum import Enum
+from types import SimpleNamespace
+from unittest import mock
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent_api.core.graph import graph
+from src.agent_api.core.graph.assist.assist import classify_intent_by_exemplars
+from src.agent_api.core.graph.type import IntentClassification
+
+
+class Route(str, Enum):
+    Chat = 'chat'
+    Search = 'search'
+    Code = 'code'
+
+
+EXEMPLARS = {
+    Route.Chat: ['你好，我们聊聊天吧', '今天心情不错'],
+    Route.Search: ['帮我搜索一下相关资料', '查一下最新的新闻'],
+    Route.Code: ['帮我写一段 Python 代码', '这个函数为什么报错'],
+}
+
+
+def state_of(text):
+    return SimpleNamespace(messages=[HumanMessage(text), AIMessage('上一轮的回复')])
+
+
+class ClassifyIntentByExemplarsTest(unittest.TestCase):
+    def test_returns_best_intent_and_margin(self):
+        intent, confidence = classify_intent_by_exemplars('帮我搜索一下相关资料', EXEMPLARS)
+        self.assertEqual(intent, Route.Search)
+        self.assertGreater(confidence, 0.5)
+
+    def test_ambiguous_text_has_low_confidence(self):
+        intent, confidence = classify_intent_by_exemplars('帮我', EXEMPLARS)  # 搜索和代码范例都包含 "帮我"
+        self.assertLess(confidence, 0.1)
+
+    def test_empty_text(self):
+        self.assertEqual(classify_intent_by_exemplars('  ', EXEMPLARS), (None, 0.0))
+
+
+class IntentRouterTest(unittest.TestCase):
+    def route(self, text, **kwargs):
+        llm_classifier = mock.AsyncMock(return_value=Route.Code)
+        with mock.patch.object(graph, 'intent_classifier_node', llm_classifier):
+            router = graph.create_intent_router(llm=None, **kwargs)
+            return asyncio.run(router(state_of(text))), llm_classifier.await_count
+
+    def test_single_route_skips_classification(self):
+        self.assertEqual(
+            self.route('任何问题', confidence_threshold=0.3), (IntentClassification.ReactGraphAdapterNode, 0)
+        )
+
+    def test_confident_exemplar_match_skips_llm(self):
+        self.assertEqual(
+            self.route('帮我搜索一下相关资料', confidence_threshold=0.3, routes=Route, exemplars=EXEMPLARS),
+            (Route.Search, 0),
+        )
+
+    def test_low_confidence_falls_back_to_llm(self):
+        self.assertEqual(
+            self.route('帮我', confidence_threshold=0.3, routes=Route, exemplars=EXEMPLARS), (Route.Code, 1)
+        )
+
+    def test_no_threshold_always_uses_llm(self):
+        self.assertEqual(self.route('帮我搜索一下相关资料', routes=Route, exemplars=EXEMPLARS), (Route.Code, 1))
+
+    def test_route_without_exemplars_falls_back_to_llm(self):
+        exemplars = {Route.Chat: EXEMPLARS[Route.Chat], Route.Search: EXEMPLARS[Route.Search]}  # 代码路由没有范例
+        self.assertEqual(
+            self.route('帮我搜索一下相关资料', confidence_threshold=0.3, routes=Route, exemplars=exemplars),
+            (Route.Code, 1),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
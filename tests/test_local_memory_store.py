@@ -0,0 +1,181 @@
+'''
+本地记忆仓库测试。不需要 postgres 服务和嵌入模型，用文本直接给出向量的假嵌入模型。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import PutOp
+
+from src.agent_api.core.local_memory_store import LocalVectorStore
+
+DIMS = 4
+
+
+class VectorTextEmbeddings(Embeddings):
+    '''假嵌入模型。文本为逗号分隔的向量分量，如 "1,0,0,0"，记录调用次数'''
+
+    def __init__(self):
+        self.document_calls = 0
+
+    def embed_documents(self, texts):
+        self.document_calls += 1
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(x) for x in text.split(',')]
+
+
+def vector_text(vector):
+    return ','.join(f'{x:.6f}' for x in vector)
+
+
+class LocalVectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = self._directory.name
+        self.embeddings = VectorTextEmbeddings()
+        self.store = self.open_store()
+
+    def tearDown(self):
+        self.store.close()
+        self._directory.cleanup()
+
+    def open_store(self, **kwargs):
+        index = {'embed': self.embeddings, 'dims': DIMS, 'fields': ['text']}
+        return LocalVectorStore(self.path, index=index, **kwargs)
+
+    def vector_count(self, store):
+        return store.run(lambda conn: conn.execute('SELECT count(*) FROM store_vectors').fetchone()[0])
+
+    def test_put_get_search_round_trip(self):
+        namespace = ('memories', 'user')
+        self.store.put(namespace, 'x', {'text': '1,0,0,0', 'kind': 'a'})
+        self.store.put(namespace, 'y', {'text': '0,1,0,0', 'kind': 'b'})
+        self.store.put(('memories', 'other'), 'z', {'text': '1,0,0,0', 'kind': 'a'})
+
+        self.assertEqual(self.store.get(namespace, 'x').value, {'text': '1,0,0,0', 'kind': 'a'})
+        self.assertIsNone(self.store.get(namespace, 'missing'))
+
+        results = self.store.search(namespace, query='0.9,0.1,0,0', limit=2)
+        self.assertEqual([item.key for item in results], ['x', 'y'])
+        self.assertGreater(results[0].score, results[1].score)
+
+        filtered = self.store.search(namespace, query='1,0,0,0', filter={'kind': 'b'})
+        self.assertEqual([item.key for item in filtered], ['y'])
+        self.assertEqual(len(self.store.search(('memories',), limit=10)), 3)
+        self.assertEqual(
+            self.store.list_namespaces(prefix=('memories',)), [('memories', 'other'), ('memories', 'user')]
+        )
+
+    def test_batch_embeds_once(self):
+        namespace = ('memories', 'user')
+        self.store.batch(
+            [PutOp(namespace, f'k{i}', {'text': vector_text(np.eye(DIMS)[i % DIMS] + i)}) for i in range(10)]
+        )
+        self.assertEqual(self.embeddings.document_calls, 1)
+        self.assertEqual(self.vector_count(self.store), 10)
+
+    def test_delete_reuses_rows(self):
+        namespace = ('memories', 'user')
+        for key, text in (('a', '1,0,0,0'), ('b', '0,1,0,0'), ('c', '0,0,1,0')):
+            self.store.put(namespace, key, {'text': text})
+        self.store.delete(namespace, 'b')
+        self.assertIsNone(self.store.get(namespace, 'b'))
+        self.assertEqual(len(self.store._free_rows), 1)
+
+        self.store.put(namespace, 'd', {'text': '0,0,0,1'})
+        self.assertEqual(self.store._free_rows, [])
+        self.assertEqual(self.store._row_count, 3)  # 删除空出的行被复用，不再占用新行
+        self.assertEqual(self.store.search(namespace, query='0,0,0,1', limit=1)[0].key, 'd')
+
+        self.store.put(namespace, 'a', {'text': '0,1,0,0'})  # 更新时旧向量行也被复用
+        self.assertEqual(self.store._row_count, 3)
+        self.assertEqual(self.store.search(namespace, query='0,1,0,0', limit=1)[0].key, 'a')
+
+    def test_ivf_train_and_probe(self):
+        self.store.close()
+        self.store = self.open_store(ivf_min_vectors=64, ivf_probe_count=1)
+        namespace = ('memories', 'user')
+        rng = np.random.default_rng(0)
+        centers = np.eye(DIMS)
+        vectors = [centers[i % DIMS] + rng.normal(scale=0.05, size=DIMS) for i in range(200)]
+        self.store.batch([PutOp(namespace, f'k{i}', {'text': vector_text(v)}) for i, v in enumerate(vectors)])
+
+        self.assertIsNotNone(self.store._centroids)
+        self.assertEqual(self.store._trained_count, 200)
+        self.assertTrue(os.path.exists(os.path.join(self.path, LocalVectorStore.centroid_file_name)))
+        self.assertTrue((self.store._row_lists[:200] >= 0).all())
+
+        for i in (0, 1, 2, 3, 57):  # 只探测一个聚类时仍能找到查询向量本身
+            results = self.store.search(namespace, query=vector_text(vectors[i]), limit=1)
+            self.assertEqual(results[0].key, f'k{i}')
+
+        self.store.put(namespace, 'new', {'text': '0,0,0,1'})  # 训练后的写入直接分配到最近的聚类
+        new_row = self.store.run(
+            lambda conn: conn.execute("SELECT row, list_id FROM store_vectors WHERE key = 'new'").fetchone()
+        )
+        self.assertGreaterEqual(new_row[1], 0)
+        self.assertEqual(self.store._row_lists[new_row[0]], new_row[1])
+
+    def test_failed_batch_rolls_back(self):
+        namespace = ('memories', 'user')
+        for key, text in (('a', '1,0,0,0'), ('b', '0,1,0,0'), ('c', '0,0,1,0')):
+            self.store.put(namespace, key, {'text': text})
+        self.store.delete(namespace, 'c')
+        state = (list(self.store._free_rows), self.store._row_count, self.store._row_lists[:4].tolist())
+
+        with self.assertRaises(ValueError):  # 最后一条的向量维度不对，写入时失败
+            self.store.batch(
+                [
+                    PutOp(namespace, 'a', {'text': '0,0,0,1'}),  # 空出并复用 a 的行
+                    PutOp(namespace, 'd', {'text': '0,0,1,0'}),
+                    PutOp(namespace, 'e', {'text': '1,1'}),
+                ]
+            )
+        self.assertEqual((self.store._free_rows, self.store._row_count, self.store._row_lists[:4].tolist()), state)
+        self.assertEqual(self.store.get(namespace, 'a').value, {'text': '1,0,0,0'})
+        self.assertIsNone(self.store.get(namespace, 'd'))
+        self.assertEqual(self.store.search(namespace, query='1,0,0,0', limit=1)[0].key, 'a')  # 向量也已恢复
+        self.assertEqual(self.vector_count(self.store), 2)
+
+        self.store.put(namespace, 'd', {'text': '0,0,1,0'})  # 回滚后仍可正常写入
+        self.assertEqual(self.store.search(namespace, query='0,0,1,0', limit=1)[0].key, 'd')
+
+    def test_reopen_from_disk(self):
+        namespace = ('memories', 'user')
+        self.store.put(namespace, 'x', {'text': '1,0,0,0'})
+        self.store.put(namespace, 'y', {'text': '0,1,0,0'})
+        self.store.delete(namespace, 'x')
+        self.store.close()
+
+        self.store = self.open_store()
+        self.assertEqual(self.store.get(namespace, 'y').value, {'text': '0,1,0,0'})
+        self.assertEqual(self.store.search(namespace, query='0,1,0,0', limit=1)[0].key, 'y')
+        self.assertEqual(self.store._free_rows, [0])  # 空出的行在重新打开后仍可复用
+
+        self.store.close()
+        with self.assertRaises(ValueError):  # 向量维度与已有数据不一致
+            LocalVectorStore(self.path, index={'embed': self.embeddings, 'dims': DIMS + 1})
+        self.store = self.open_store()
+
+    def test_async_methods(self):
+        async def run():
+            namespace = ('memories', 'user')
+            await self.store.aput(namespace, 'x', {'text': '1,0,0,0'})
+            await self.store.aput(namespace, 'y', {'text': '0,1,0,0'})
+            results = await self.store.asearch(namespace, query='0,1,0,0', limit=1)
+            return (await self.store.aget(namespace, 'x')).value, [item.key for item in results]
+
+        value, keys = asyncio.run(run())
+        self.assertEqual(value, {'text': '1,0,0,0'})
+        self.assertEqual(keys, ['y'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+'''
+待办反思任务队列测试。三种实现（记忆仓库命名空间，本地 SQLite 表，postgres 表）共用同一组语义测试：
+防抖推迟执行时间但不晚于第一次提交时的截止时间，认领按到期时间排序，认领令牌，可见性超时，释放和确认。
+另测试持久化执行器关闭时对正在运行的反思的处理。
+postgres 测试需要设置环境变量 TEST_POSTGRES_CONNECTION_STRING，指向可清空的测试数据库，未设置时跳过。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.store.memory import InMemoryStore
+
+from src.agent_api.core.graph.assist.reflection_persistence import (
+    PENDING_REFLECTION_TASKS_NAMESPACE,
+    PersistenceExecutor,
+    SqliteReflectionQueue,
+    StoreReflectionQueue,
+)
+from src.agent_api.core.local_memory_store import LocalVectorStore
+
+from .test_local_memory_store import DIMS, VectorTextEmbeddings
+
+POSTGRES_CONNECTION_STRING = os.environ.get('TEST_POSTGRES_CONNECTION_STRING')
+
+
+class ReflectionQueueSemantics:
+    '''各队列实现共用的语义测试。子类在 asyncSetUp() 中创建 self.queue'''
+
+    async def claim_keys(self, limit=10, visibility_timeout_seconds=60, exclude_keys=()):
+        claims = await self.queue.claim(limit, visibility_timeout_seconds, list(exclude_keys))
+        return [key for key, _, _, _, _ in claims], claims
+
+    async def test_debounce_postpones_execution(self):
+        now = time.time()
+        await self.queue.enqueue([('k', {'v': 1}, now - 1, now + 100)])
+        await self.queue.enqueue([('k', {'v': 2}, now + 50, now + 150)])  # 防抖窗口内再次提交，推迟执行
+        self.assertEqual((await self.claim_keys())[0], [])
+
+    async def test_debounce_is_capped_by_first_deadline(self):
+        now = time.time()
+        await self.queue.enqueue([('k', {'v': 1}, now + 50, now - 1)])  # 第一次提交的截止时间已到
+        await self.queue.enqueue([('k', {'v': 2}, now + 60, now + 200)])
+        keys, claims = await self.claim_keys()
+        self.assertEqual(keys, ['k'])
+        self.assertEqual(claims[0][1], {'v': 2})  # 任务内容为最后一次提交的
+        self.assertLessEqual(claims[0][4], now)  # 到期时间为原截止时间
+
+    async def test_claim_order_limit_and_exclude(self):
+        now = time.time()
+        await self.queue.enqueue(
+            [
+                ('late', {'v': 1}, now - 1, now + 100),
+                ('early', {'v': 2}, now - 5, now + 100),
+                ('middle', {'v': 3}, now - 3, now + 100),
+                ('future', {'v': 4}, now + 100, now + 100),
+            ]
+        )
+        self.assertEqual((await self.claim_keys(limit=2))[0], ['early', 'middle'])
+        self.assertEqual((await self.claim_keys(exclude_keys=['late']))[0], [])  # 已认领的不再认领，排除的不认领
+        self.assertEqual((await self.claim_keys())[0], ['late'])
+
+    async def test_resubmit_while_claimed_clears_claim(self):
+        now = time.time()
+        await self.queue.enqueue([('k', {'v': 1}, now - 1, now + 100)])
+        _, [first] = await self.claim_keys()
+        await self.queue.enqueue([('k', {'v': 2}, now - 1, now + 100)])  # 运行期间被重新提交
+
+        await self.queue.ack([('k', first[3])])  # 旧令牌确认不删除新提交的任务
+        _, [second] = await self.claim_keys()
+        self.assertEqual((second[1], second[2]), ({'v': 2}, 1))
+        await self.queue.ack([('k', second[3])])
+        self.assertEqual(await self.queue.stats(100), (0, None))
+
+    async def test_visibility_timeout_and_release(self):
+        now = time.time()
+        await self.queue.enqueue([('a', {'v': 1}, now - 1, now + 100), ('b', {'v': 2}, now - 1, now + 100)])
+        _, claims = await self.claim_keys(visibility_timeout_seconds=0)  # 认领后立即超时，模拟进程崩溃
+        self.assertEqual([attempts for _, _, attempts, _, _ in claims], [1, 1])
+
+        _, claims = await self.claim_keys(visibility_timeout_seconds=60)
+        self.assertEqual(sorted((key, attempts) for key, _, attempts, _, _ in claims), [('a', 2), ('b', 2)])
+
+        await self.queue.release([(key, claim_token) for key, _, _, claim_token, _ in claims])  # 释放不计入尝试次数
+        _, claims = await self.claim_keys()
+        self.assertEqual(sorted((key, attempts) for key, _, attempts, _, _ in claims), [('a', 2), ('b', 2)])
+
+    async def test_stats(self):
+        now = time.time()
+        await self.queue.enqueue([('due', {'v': 1}, now - 5, now + 100), ('future', {'v': 2}, now + 100, now + 100)])
+        depth, oldest_due_at = await self.queue.stats(100)
+        self.assertEqual(depth, 2)
+        self.assertAlmostEqual(oldest_due_at, now - 5, places=3)
+
+
+class StoreReflectionQueueTest(ReflectionQueueSemantics, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.queue = StoreReflectionQueue(InMemoryStore())
+
+
+class SqliteReflectionQueueTest(ReflectionQueueSemantics, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.store = LocalVectorStore(self._directory.name, index={'embed': VectorTextEmbeddings(), 'dims': DIMS})
+        self.queue = SqliteReflectionQueue(self.store)
+
+    async def asyncTearDown(self):
+        self.store.close()
+        self._directory.cleanup()
+
+    async def test_migrates_store_namespace_tasks(self):
+        now = time.time()
+        value = {'v': 1, 'execute_at': now - 1, 'deadline': now + 100, 'attempts': 0, 'claim_token': None}
+        await self.store.aput((PENDING_REFLECTION_TASKS_NAMESPACE,), 'k', value, index=False)  # 旧版本的队列项
+
+        keys, claims = await self.claim_keys()
+        self.assertEqual((keys, claims[0][1]), (['k'], {'v': 1}))
+        self.assertEqual(await self.store.asearch((PENDING_REFLECTION_TASKS_NAMESPACE,)), [])
+
+
+@unittest.skipUnless(POSTGRES_CONNECTION_STRING, '未设置 TEST_POSTGRES_CONNECTION_STRING')
+class PostgresReflectionQueueTest(ReflectionQueueSemantics, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        from langgraph.store.postgres import AsyncPostgresStore
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        from src.agent_api.core.graph.assist.reflection_persistence import PostgresReflectionQueue
+        from src.agent_api.core.memory_store import EventLoopBoundStore, MemoryStoreEventLoop
+
+        self.pool = AsyncConnectionPool(
+            POSTGRES_CONNECTION_STRING, kwargs={'autocommit': True, 'row_factory': dict_row}, open=False
+        )
+        await self.pool.open()
+        await PostgresReflectionQueue.setup(self.pool)
+        async with self.pool.connection() as conn:
+            await conn.execute(f'DELETE FROM {PENDING_REFLECTION_TASKS_NAMESPACE}')
+        store = EventLoopBoundStore(AsyncPostgresStore(self.pool), MemoryStoreEventLoop(is_own_thread=False))
+        self.queue = PostgresReflectionQueue(store)
+
+    async def asyncTearDown(self):
+        async with self.pool.connection() as conn:
+            await conn.execute(f'DELETE FROM {PENDING_REFLECTION_TASKS_NAMESPACE}')
+        await self.pool.close()
+
+
+class PersistenceExecutorCloseTest(unittest.TestCase):
+    '''关闭时等待正在运行的反思：按时结束的确认，超时的释放回队列，事件循环关闭后结束的不再确认'''
+
+    def setUp(self):
+        self.store = InMemoryStore()
+        self.release_stuck = threading.Event()
+        self.started = []
+
+        def reflect(payload):
+            self.started.append(payload['name'])
+            if payload['name'] == 'stuck':
+                self.release_stuck.wait(5)
+            else:
+                time.sleep(0.1)
+
+        self.reflector = RunnableLambda(reflect)
+        self.reflector.namespace = ('memories', 'user')
+
+    def tearDown(self):
+        self.release_stuck.set()
+
+    def test_aclose_waits_then_releases(self):
+        async def run():
+            executor = PersistenceExecutor(
+                self.reflector, self.store, worker_count=2, close_timeout_seconds=0.5, poll_seconds=0.05
+            )
+            config = {'configurable': {'langgraph_user_id': 'user', 'thread_id': 'thread'}}
+            await executor.asubmit_many(
+                [
+                    ({'name': name}, {'configurable': {**config['configurable'], 'thread_id': name}}, 0)
+                    for name in ('fast', 'stuck')
+                ]
+            )
+            executor.start()
+            while len(self.started) < 2:
+                await asyncio.sleep(0.01)
+            await executor.aclose()
+            return executor
+
+        with self.assertNoLogs('concurrent.futures', level='ERROR'):
+            executor = asyncio.run(run())
+            self.release_stuck.set()  # 事件循环关闭后才结束
+            executor.shutdown(wait=True)
+
+        async def remaining():
+            return await StoreReflectionQueue(self.store).claim(10, 60, [])
+
+        claims = asyncio.run(remaining())
+        self.assertEqual(
+            [(key, task['payload'], attempts) for key, task, attempts, _, _ in claims],
+            [('user: stuck', {'name': 'stuck'}, 1)],
+        )  # 按时结束的已确认，超时的已释放
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+'''
+工具节点测试。并发执行，单次超时，本轮截止时间，工具自身的超时和不存在的工具。
+运行：python -m unittest discover tests
+'''
+
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from src.agent_api.core.graph.node import tool_node
+
+
+async def slow(query: str = '') -> str:
+    await asyncio.sleep(5)
+    return 'slow'
+
+
+async def fast(query: str = '') -> str:
+    await asyncio.sleep(0.05)
+    return 'fast'
+
+
+async def upstream_timeout(query: str = '') -> str:
+    raise TimeoutError('upstream timed out')
+
+
+TOOLS = [
+    StructuredTool.from_function(coroutine=function, name=function.__name__, description=function.__name__)
+    for function in (slow, fast, upstream_timeout)
+]
+
+
+def run_tool_node(names, turn_started_at=None, max_concurrent_tool_calls=4, tool_timeout_seconds=0.3, turn=None):
+    '''运行工具节点，返回 (ToolMessage 列表, 耗时)'''
+    tool_calls = [{'name': name, 'args': {}, 'id': f'call_{i}'} for i, name in enumerate(names)]
+    state = SimpleNamespace(
+        messages=[AIMessage('', tool_calls=tool_calls)], turn_started_at=turn_started_at or time.time()
+    )
+    started_at = time.perf_counter()
+    result = asyncio.run(
+        tool_node(
+            state,
+            {},
+            TOOLS,
+            max_concurrent_tool_calls=max_concurrent_tool_calls,
+            tool_timeout_seconds=tool_timeout_seconds,
+            tool_turn_timeout_seconds=turn,
+        )
+    )
+    return result['messages'], time.perf_counter() - started_at
+
+
+class ToolNodeTest(unittest.TestCase):
+    def test_calls_run_concurrently(self):
+        messages, duration = run_tool_node(['fast'] * 4)
+        self.assertEqual([m.content for m in messages], ['fast'] * 4)
+        self.assertEqual([m.tool_call_id for m in messages], [f'call_{i}' for i in range(4)])  # 按调用顺序返回
+        self.assertLess(duration, 0.18)  # 依次执行需要 0.2 秒
+        self.assertTrue(all(m.response_metadata['duration_seconds'] > 0 for m in messages))
+
+    def test_concurrency_limit(self):
+        _, duration = run_tool_node(['fast'] * 4, max_concurrent_tool_calls=2)
+        self.assertGreaterEqual(duration, 0.1)  # 两批依次执行
+
+    def test_per_call_timeout(self):
+        messages, duration = run_tool_node(['slow', 'fast'])
+        self.assertEqual(messages[0].status, 'error')
+        self.assertIn('超时', messages[0].content)
+        self.assertEqual(messages[1].content, 'fast')  # 其他调用不受影响
+        self.assertLess(duration, 1.0)
+
+    def test_turn_deadline(self):
+        messages, duration = run_tool_node(['fast'], turn_started_at=time.time() - 10, turn=5)  # 本轮已超时
+        self.assertEqual(messages[0].status, 'error')
+        self.assertIn('超时（0.0 秒）', messages[0].content)
+        self.assertLess(duration, 0.05)
+
+        messages, _ = run_tool_node(['slow'], turn_started_at=time.time() - 4.9, tool_timeout_seconds=30, turn=5)
+        self.assertIn('超时', messages[0].content)  # 截止时间早于单次超时
+
+    def test_tool_timeout_error_is_a_tool_error(self):
+        messages, _ = run_tool_node(['upstream_timeout'])
+        self.assertEqual(messages[0].status, 'error')
+        self.assertNotIn('超时', messages[0].content)
+        self.assertIn('upstream timed out', messages[0].content)
+
+    def test_missing_tool(self):
+        messages, _ = run_tool_node(['missing'])
+        self.assertEqual(messages[0].status, 'error')
+        self.assertIn('工具 missing 不存在', messages[0].content)
+
+
+if __name__ == '__main__':
+    unittest.main()